@@ -0,0 +1 @@
+__author__ = 'Maxim Dutkin (max@dutkin.ru)'
@@ -0,0 +1,48 @@
+__author__ = 'Maxim Dutkin (max@dutkin.ru)'
+
+
+# Compares inserting and updating of rows one by one (`DataMixin.create` / `set_and_save`, one transaction per row)
+# with batched `DataMixin.create_many` / `update_many` (one transaction for all rows). One by one variants are
+# measured on `SLOW_ROWS` rows and extrapolated to `ROWS`, otherwise benchmark takes minutes. Run it with:
+#
+#   python -m example.benchmarks.bulk_insert
+
+import time
+from example.tests.helpers import make_sqlite_session, BenchItem
+
+
+ROWS = 100000
+SLOW_ROWS = 2000
+
+
+def measure(func) -> float:
+    started = time.perf_counter()
+    func()
+    return time.perf_counter() - started
+
+
+def main():
+    session = make_sqlite_session(0)
+    rows = [{'name': 'item %s' % i, 'value': i} for i in range(ROWS)]
+
+    one_by_one = measure(lambda: [BenchItem.create(**row) for row in rows[:SLOW_ROWS]]) * ROWS / SLOW_ROWS
+    session.query(BenchItem).delete()
+    session.commit()
+    session.expunge_all()
+    bulk = measure(lambda: BenchItem.create_many(rows))
+    assert BenchItem.q.count() == ROWS
+    print('insert of %s rows: create() %8.0f ms (extrapolated), create_many() %6.0f ms'
+          % (ROWS, one_by_one * 1000, bulk * 1000))
+
+    items = BenchItem.all(id=('<=', SLOW_ROWS))
+    one_by_one = measure(lambda: [item.set_and_save(value=-item.value) for item in items]) * ROWS / SLOW_ROWS
+    session.expunge_all()
+    updates = [{'id': i + 1, 'value': i * 2} for i in range(ROWS)]
+    bulk = measure(lambda: BenchItem.update_many(updates))
+    assert BenchItem.load_by_pk(ROWS).value == (ROWS - 1) * 2
+    print('update of %s rows: set_and_save() %8.0f ms (extrapolated), update_many() %6.0f ms'
+          % (ROWS, one_by_one * 1000, bulk * 1000))
+
+
+if __name__ == '__main__':
+    main()
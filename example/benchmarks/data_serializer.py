@@ -0,0 +1,96 @@
+__author__ = 'Maxim Dutkin (max@dutkin.ru)'
+
+
+# Compares serialization of 10k rows with nested relations (item -> owner, item -> tags) by former recursive
+# `DataMixin.data` implementation and by cached serializer plans (`data` and `data_many`). Relations are loaded
+# before measuring, so only Python side is compared. Run it with:
+#
+#   python -m example.benchmarks.data_serializer
+
+import timeit
+from sqlalchemy.orm import class_mapper, joinedload, selectinload
+from example.tests.helpers import make_sqlite_session, BenchItem
+
+
+ROWS = 10000
+
+
+def legacy_data(model, *_except_fields, **kwargs):
+    """
+    `DataMixin.data` before serializer plans
+    """
+    _max_level = kwargs.get('max_level', 2)
+
+    def model_to_dict(obj, ignore_fields=list(), back_relationships=set(), max_level=2,
+                      current_level=0):
+        current_level += 1
+        ignore_in_cur_iteration = list()
+        for field in ignore_fields:
+            final_exclusion = len(field) == 1
+            if final_exclusion:
+                ignore_in_cur_iteration.append(field[0])
+
+        serialized_data = dict()
+        for c in obj.__table__.columns:
+            if c.key not in ignore_in_cur_iteration:
+                serialized_data[c.key] = getattr(obj, c.key)
+        relationships = class_mapper(obj.__class__).relationships
+        visitable_relationships = [(name, rel) for name, rel in relationships.items() if
+                                   name not in back_relationships and name not in _except_fields]
+
+        for name, relation in visitable_relationships:
+            ignore_in_next_iteration = list()
+
+            if name in ignore_in_cur_iteration:
+                continue
+
+            for i in ignore_fields:
+                if len(i) > 1 and name == i[0]:
+                    ignore_in_next_iteration.append(i[1:])
+
+            if relation.backref:
+                if type(relation.backref) == str:
+                    back_relationships.add(relation.backref)
+                elif type(relation.backref) == tuple:
+                    back_relationships.add(relation.backref[0])
+            relationship_children = getattr(obj, name)
+            if relationship_children is not None:
+                if relation.uselist and current_level != max_level:
+                    children = []
+                    for child in [c for c in relationship_children]:
+                        if current_level < max_level:
+                            children.append(model_to_dict(child, ignore_in_next_iteration, back_relationships,
+                                                          max_level, current_level))
+                    serialized_data[name] = children
+                else:
+                    if current_level < max_level:
+                        serialized_data[name] = model_to_dict(relationship_children, ignore_in_next_iteration,
+                                                              back_relationships, max_level, current_level)
+        return serialized_data
+
+    normalized_except_fields = [f.split('>') for f in _except_fields]
+    return model_to_dict(model, ignore_fields=normalized_except_fields, max_level=_max_level)
+
+
+def main():
+    make_sqlite_session(ROWS, tags_per_item=3, owners=100)
+    items = BenchItem.q.options(joinedload(BenchItem.owner), selectinload(BenchItem.tags)).all()
+    except_fields = ('created', 'tags>item_id')
+    for max_level in (2, 3):
+        expected = [legacy_data(item, *except_fields, max_level=max_level) for item in items]
+        assert expected == [item.data(*except_fields, max_level=max_level) for item in items]
+        assert expected == BenchItem.data_many(items, *except_fields, max_level=max_level)
+
+        cases = [
+            ('legacy data()', lambda: [legacy_data(item, *except_fields, max_level=max_level) for item in items]),
+            ('data()', lambda: [item.data(*except_fields, max_level=max_level) for item in items]),
+            ('data_many()', lambda: BenchItem.data_many(items, *except_fields, max_level=max_level)),
+        ]
+        print('%s rows with owner and 3 tags, max_level=%s' % (ROWS, max_level))
+        for name, case in cases:
+            elapsed = min(timeit.repeat(case, number=1, repeat=5))
+            print('  %-14s %8.1f ms' % (name, elapsed * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+__author__ = 'Maxim Dutkin (max@dutkin.ru)'
+
+
+# Compares IOLoop responsiveness while concurrent "requests" run slow DB queries through blocking DataMixin methods
+# and through their async versions (`aload_by_params`, etc.), which run queries in M2Core thread pool. Every query
+# sleeps `QUERY_MS` inside SQLite. Run it with:
+#
+#   python -m example.benchmarks.db_async_executor
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import func
+from tornado.ioloop import IOLoop
+from tornado import gen
+from m2core.bases.base_model import EnchantedMixin
+from example.tests.helpers import make_sqlite_session, BenchItem
+
+
+REQUESTS = 50
+QUERY_MS = 20
+TICK_MS = 5
+
+
+def slow_query(value: int):
+    return BenchItem.q.filter(BenchItem.value == value, func.sleep_ms(QUERY_MS) == 0).first()
+
+
+async def blocking_request(i: int):
+    return slow_query(i)
+
+
+async def async_request(i: int):
+    return await BenchItem._run_async(slow_query, i)
+
+
+async def measure(request):
+    lags = []
+    done = False
+
+    async def ticker():
+        while not done:
+            start = time.perf_counter()
+            await gen.sleep(TICK_MS / 1000.0)
+            lags.append((time.perf_counter() - start) * 1000 - TICK_MS)
+
+    ticker_future = gen.convert_yielded(ticker())
+    await gen.sleep(0)
+    start = time.perf_counter()
+    results = await gen.multi([request(i) for i in range(REQUESTS)])
+    elapsed = time.perf_counter() - start
+    done = True
+    await ticker_future
+
+    assert all(r is not None for r in results)
+    lags.sort()
+    return elapsed, max(lags) if lags else 0, lags[len(lags) // 2] if lags else 0
+
+
+def main():
+    make_sqlite_session(REQUESTS)
+    EnchantedMixin.set_executor(ThreadPoolExecutor(10))
+    print('%s concurrent requests, %s ms per query' % (REQUESTS, QUERY_MS))
+    for name, request in (('blocking', blocking_request), ('executor', async_request)):
+        elapsed, max_lag, p50_lag = IOLoop.current().run_sync(lambda: measure(request))
+        print('%-8s  total %7.1f ms  IOLoop lag p50 %7.1f ms  max %7.1f ms' %
+              (name, elapsed * 1000, p50_lag, max_lag))
+
+
+if __name__ == '__main__':
+    main()
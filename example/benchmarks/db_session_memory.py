@@ -0,0 +1,70 @@
+__author__ = 'Maxim Dutkin (max@dutkin.ru)'
+
+
+# Emulates lifecycle of 100k requests (`BaseHandler.__init__` -> handler -> `on_finish`) with `thread` and `request`
+# DB session scopes, sessions are configured like in M2Core (no autoflush). Every request loads a row, and every 100th
+# request fails between `add` and `commit`, leaving pending object in it's session. Prints number of live Python
+# objects and objects held by sessions every 20k requests. Run it with:
+#
+#   python -m example.benchmarks.db_session_memory [requests]
+
+import gc
+import sys
+import time
+import asyncio
+from sqlalchemy.orm import sessionmaker, scoped_session
+from m2core.bases.base_model import EnchantedMixin
+from m2core.db import request_scope
+from example.tests.helpers import make_sqlite_session, BenchItem
+
+
+ROWS = 1000
+
+
+async def handle(session: scoped_session, scope_mode: str, i: int):
+    scope = request_scope.enter_scope() if scope_mode == 'request' else None
+    session.expire_all()
+    try:
+        item = BenchItem.load_by_pk(i % ROWS + 1)
+        assert item is not None
+        if i % 100 == 0:
+            session.add(BenchItem(name='failed %s' % i, value=i))
+            raise RuntimeError('request failed before commit')
+    except RuntimeError:
+        pass
+    finally:
+        if scope is not None:
+            request_scope.remove_scope(session, scope)
+
+
+def held_objects(session: scoped_session) -> int:
+    sessions = session.registry.registry.values() if isinstance(session.registry.registry, dict) else [session()]
+    return sum(len(s.identity_map) + len(s.new) for s in sessions)
+
+
+async def run(session: scoped_session, scope_mode: str, requests: int):
+    start = time.perf_counter()
+    for i in range(1, requests + 1):
+        # every request runs in it's own task, like in Tornado
+        await asyncio.ensure_future(handle(session, scope_mode, i))
+        if i % 20000 == 0 or i == requests:
+            gc.collect()
+            print('%-8s  %7s requests  %6.1f s  live objects %8s  held by sessions %6s' %
+                  (scope_mode, i, time.perf_counter() - start, len(gc.get_objects()), held_objects(session)))
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    engine = make_sqlite_session(ROWS).bind
+    for scope_mode in ('thread', 'request'):
+        session = scoped_session(
+            sessionmaker(bind=engine, autoflush=False),
+            scopefunc=request_scope.scope_func if scope_mode == 'request' else None
+        )
+        EnchantedMixin.set_db_session(session)
+        asyncio.run(run(session, scope_mode, requests))
+        session.remove()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+__author__ = 'Maxim Dutkin (max@dutkin.ru)'
+
+
+# Measures cost of request instrumentation: `phase` block outside of request (no timings) and inside of it, and
+# `Instrumentation.finish` of request with 5 phases (histograms update). Run it with:
+#
+#   python -m example.benchmarks.instrumentation_overhead
+
+import contextvars
+import timeit
+from m2core.utils.instrumentation import Instrumentation, phase
+
+
+NUMBER = 200000
+PHASES = ('redis', 'db', 'permissions', 'validation', 'serialize')
+
+
+def enter_phase():
+    with phase('db'):
+        pass
+
+
+def request():
+    timings = Instrumentation.start()
+    for name in PHASES:
+        with phase(name):
+            pass
+    Instrumentation.finish(timings, '/users/:{id:int}', 'GET', 200, 0.001)
+
+
+def main():
+    idle = min(timeit.repeat(enter_phase, number=NUMBER, repeat=3)) / NUMBER
+    print('phase outside of request      %6.3f us' % (idle * 1000000))
+
+    def timed():
+        Instrumentation.start()
+        return min(timeit.repeat(enter_phase, number=NUMBER, repeat=3)) / NUMBER
+    print('phase inside of request       %6.3f us' % (contextvars.Context().run(timed) * 1000000))
+
+    cost = min(timeit.repeat(lambda: contextvars.Context().run(request), number=NUMBER // 10, repeat=3)) / (NUMBER // 10)
+    print('request with %s phases + finish %6.3f us' % (len(PHASES), cost * 1000000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+__author__ = 'Maxim Dutkin (max@dutkin.ru)'
+
+
+# Compares JSON backends of `BaseHandler.write_json` on large `DataMixin.data()` payloads: stdlib `json` with
+# indentation (default settings), compact stdlib `json` and compact `orjson`. Run it with:
+#
+#   python -m example.benchmarks.json_encoders
+
+import json
+import timeit
+from m2core.db.sqlalchemy_json import AlchemyJSONEncoder, encode_json
+from example.tests.helpers import make_sqlite_session, BenchItem
+
+
+ROWS = 20000
+
+
+def main():
+    make_sqlite_session(ROWS)
+    items = BenchItem.all()
+    response = {'meta': {'code': 200, 'msg': 'OK'}, 'data': [item.data() for item in items]}
+    models = {'meta': {'code': 200, 'msg': 'OK'}, 'data': items}
+
+    def legacy():
+        return json.dumps(response, indent=2, cls=AlchemyJSONEncoder).replace('</', '<\\/')
+
+    cases = [
+        ('legacy json.dumps + replace', legacy),
+        ('json, indent 2', lambda: encode_json(response, 2, 'json')),
+        ('json, compact', lambda: encode_json(response, 0, 'json')),
+        ('orjson, indent 2', lambda: encode_json(response, 2, 'orjson')),
+        ('orjson, compact', lambda: encode_json(response, 0, 'orjson')),
+        ('orjson, compact, models', lambda: encode_json(models, 0, 'orjson')),
+    ]
+    print('%s rows of `data()` dicts' % ROWS)
+    for name, case in cases:
+        elapsed = min(timeit.repeat(case, number=1, repeat=5))
+        print('%-28s %8.1f ms  %8.1f KiB' % (name, elapsed * 1000, len(case()) / 1024))
+
+
+if __name__ == '__main__':
+    main()
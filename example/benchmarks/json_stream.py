@@ -0,0 +1,88 @@
+__author__ = 'Maxim Dutkin (max@dutkin.ru)'
+
+
+# Exports all rows of a big table over HTTP with `write_json(data=[row.data() for row in Model.all()])` and with
+# `write_json_stream(Model.iter_all(), serialize=...)`, measuring time to first byte, total time and peak RSS of
+# process. Each mode runs in it's own process, so peak memory doesn't leak between them. Run it with:
+#
+#   python -m example.benchmarks.json_stream [rows]
+
+import os
+import sys
+import time
+import tempfile
+import resource
+import subprocess
+from tornado.httpclient import AsyncHTTPClient
+from tornado.ioloop import IOLoop
+from tornado.testing import bind_unused_port
+from tornado.httpserver import HTTPServer
+from example.tests.helpers import make_sqlite_session, BenchItem
+
+
+
+
+def run_mode(mode: str, rows: int):
+    cfg = tempfile.NamedTemporaryFile('w', suffix='.py', delete=False)
+    cfg.write("locale = 'C.UTF-8'\n")
+    cfg.close()
+    from m2core.common.options import options
+    options.parse_cli_options = False
+    options.config_name = cfg.name
+    options.json_indent = 0
+    from m2core import M2Core
+    from m2core.bases import BaseHandler
+    from m2core.common import PermissionsEnum
+
+    class Export(BaseHandler):
+        async def get(self, *args, **kwargs):
+            if mode == 'stream':
+                await self.write_json_stream(BenchItem.iter_all(), serialize=lambda item: item.data(max_level=1))
+            else:
+                self.write_json(data=BenchItem.data_many(BenchItem.all(), max_level=1))
+
+    m2core = M2Core()
+    os.unlink(cfg.name)
+    m2core.route(r'/export', Export, get=PermissionsEnum.SKIP)
+    app = m2core.run_for_test()
+    session = make_sqlite_session(rows)
+    # rows are inserted, measure memory of export only
+    session.remove()
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    sock, port = bind_unused_port()
+    server = HTTPServer(app)
+    server.add_sockets([sock])
+    first_byte = []
+    received = [0]
+
+    def on_chunk(chunk):
+        if not first_byte:
+            first_byte.append(time.perf_counter())
+        received[0] += len(chunk)
+
+    async def fetch():
+        start = time.perf_counter()
+        await AsyncHTTPClient().fetch('http://127.0.0.1:%s/export' % port, streaming_callback=on_chunk,
+                                      request_timeout=3600)
+        return start
+
+    start = IOLoop.current().run_sync(fetch)
+    total = time.perf_counter() - start
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print('%-7s  first byte %8.1f ms  total %7.2f s  %7.1f MiB sent  peak RSS +%6.1f MiB' %
+          (mode, (first_byte[0] - start) * 1000, total, received[0] / 2 ** 20, (rss - rss_before) / 1024))
+
+
+def main():
+    if len(sys.argv) > 2 and sys.argv[1] in ('buffer', 'stream'):
+        run_mode(sys.argv[1], int(sys.argv[2]))
+        return
+    rows = sys.argv[1] if len(sys.argv) > 1 else '1000000'
+    print('%s rows' % rows)
+    for mode in ('buffer', 'stream'):
+        subprocess.run([sys.executable, '-m', 'example.benchmarks.json_stream', mode, rows], check=True)
+
+
+if __name__ == '__main__':
+    main()
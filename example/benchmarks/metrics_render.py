@@ -0,0 +1,52 @@
+__author__ = 'Maxim Dutkin (max@dutkin.ru)'
+
+
+# Measures cost of metrics: counting of one finished request (`Instrumentation.finish` with `Metrics` subscriber)
+# and rendering of `/metrics` for 8 processes with 100 routes (2 methods, 5 phases each), including push and
+# fetch of snapshots on fakeredis. Run it with:
+#
+#   python -m example.benchmarks.metrics_render
+
+import timeit
+import fakeredis
+from m2core.data_schemes.redis_system_scheme import redis_scheme
+from m2core.utils.instrumentation import Instrumentation, RequestTimings
+from m2core.utils.metrics import Metrics
+
+
+WORKERS = 8
+ROUTES = 100
+PHASES = ('redis', 'db', 'permissions', 'validation', 'serialize')
+
+
+def finish_request(route: str, method: str):
+    timings = RequestTimings()
+    for i, name in enumerate(PHASES):
+        timings.add(name, 0.0001 * (i + 1))
+    Instrumentation.finish(timings, route, method, 200, 0.002)
+
+
+def main():
+    r = fakeredis.FakeStrictRedis(decode_responses=True)
+    workers = [Metrics(None, r, redis_scheme) for _ in range(WORKERS)]
+    for i, metrics in enumerate(workers):
+        metrics.worker_id = 'host:%s' % i
+    Instrumentation.subscribe(workers[0].on_request)
+
+    cost = min(timeit.repeat(lambda: finish_request('/items/:{id:int}', 'GET'), number=10000, repeat=3)) / 10000
+    print('request accounting            %8.1f us' % (cost * 1000000))
+
+    for i in range(ROUTES):
+        for method in ('GET', 'POST'):
+            finish_request('/route%s/:{id:int}' % i, method)
+    for metrics in workers[1:]:
+        metrics.requests.update(workers[0].requests)
+        metrics.push()
+
+    text = workers[0].render()
+    cost = min(timeit.repeat(workers[0].render, number=20, repeat=3)) / 20
+    print('render %s workers x %s routes %8.1f ms, %s lines' % (WORKERS, ROUTES, cost * 1000, len(text.splitlines())))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+__author__ = 'Maxim Dutkin (max@dutkin.ru)'
+
+
+# Compares `DataMixin.load_by_pk` of the same rows as handlers do it: identity map is expired before every lookup
+# (`expire_on_connect`), without cache and with `__cache__` setting of model (`local` storage and `redis` storage
+# on fakeredis, which shows serialization cost without network). SQLite in memory is much faster than PostgreSQL
+# over network, so real gain of cache is bigger. Run it with:
+#
+#   python -m example.benchmarks.model_cache
+
+import timeit
+import fakeredis
+from m2core.bases.base_model import EnchantedMixin
+from m2core.data_schemes.redis_system_scheme import redis_scheme
+from m2core.utils.model_cache import ModelCache
+from example.tests.helpers import make_sqlite_session, BenchItem
+
+
+ROWS = 10000
+LOOKUPS = 1000
+
+
+def lookups(session):
+    for pk in range(1, LOOKUPS + 1):
+        session.expire_all()
+        BenchItem.load_by_pk(pk)
+
+
+def main():
+    session = make_sqlite_session(ROWS)
+    print('%s lookups by primary key, identity map expired before each one' % LOOKUPS)
+    caches = (
+        ('no cache', None),
+        ('local', ModelCache('local')),
+        ('redis', ModelCache('redis', redis_connector=fakeredis.FakeStrictRedis(decode_responses=True),
+                             redis_scheme=redis_scheme)),
+    )
+    for name, cache in caches:
+        EnchantedMixin.set_model_cache(cache)
+        BenchItem.__cache__ = cache is not None
+        # the first pass fills cache
+        lookups(session)
+        cost = min(timeit.repeat(lambda: lookups(session), number=1, repeat=3)) / LOOKUPS
+        print('  %-10s %8.1f us per lookup' % (name, cost * 1000000))
+        if cache is not None:
+            print('             hit ratio %.2f' % cache.stats()['tables']['bench_items']['hit_ratio'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+__author__ = 'Maxim Dutkin (max@dutkin.ru)'
+
+
+# Compares evaluation of deep permission rule trees by walking `Permission`/`And`/`Or`/`Not` objects and by
+# functions compiled with `compile_rule` over permission bitmasks. Run it with:
+#
+#   python -m example.benchmarks.permission_rules
+
+import random
+import timeit
+from m2core.common.permissions import Permission, PermissionsEnum, compile_rule
+
+
+PERMISSIONS = 2000
+USER_PERMISSIONS = 500
+RULES = 100
+CHECKS = 2000
+
+
+def random_rule(permissions: list, depth: int) -> Permission:
+    if depth == 0:
+        return random.choice(permissions)
+    left = random_rule(permissions, depth - 1)
+    right = random_rule(permissions, depth - 1)
+    rule = random.choice((left & right, left | right))
+    return ~rule if random.random() < 0.2 else rule
+
+
+def main():
+    random.seed(1)
+    permissions = [Permission('permission %s' % i) for i in range(PERMISSIONS)]
+    users = [frozenset(random.sample(permissions, USER_PERMISSIONS)) for _ in range(10)]
+    print('%s permissions, users have %s of them, %s random rules per depth' % (PERMISSIONS, USER_PERMISSIONS, RULES))
+    for depth in (2, 4, 6, 8):
+        rules = [random_rule(permissions, depth) for _ in range(RULES)]
+        compiled = [compile_rule(rule) for rule in rules]
+        checks = [(random.randrange(RULES), random.choice(users)) for _ in range(CHECKS)]
+        for i, user in checks:
+            assert rules[i](user) == compiled[i](PermissionsEnum.mask(user))
+
+        tree = min(timeit.repeat(lambda: [rules[i](user) for i, user in checks], number=1, repeat=5))
+        bits = min(timeit.repeat(lambda: [compiled[i](PermissionsEnum.mask(user)) for i, user in checks],
+                                 number=1, repeat=5))
+        print('depth %s  tree walk %6.2f us/check  compiled %6.2f us/check  x%.1f' %
+              (depth, tree / CHECKS * 1e6, bits / CHECKS * 1e6, tree / bits))
+
+
+if __name__ == '__main__':
+    main()
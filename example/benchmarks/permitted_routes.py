@@ -0,0 +1,59 @@
+__author__ = 'Maxim Dutkin (max@dutkin.ru)'
+
+
+# Compares listing of routes permitted for a user (what `EvilRoutesHandler` returns) by calling every rule of every
+# route and by `Rules.permitted_routes` with memoized decision table. Run it with:
+#
+#   python -m example.benchmarks.permitted_routes
+
+import random
+import timeit
+from tornado.web import RequestHandler
+from m2core.common import Rules, Permission
+
+
+ROUTES = 3000
+PERMISSIONS = 300
+ROLES = 20
+
+
+class Handler(RequestHandler):
+    def get(self):
+        pass
+
+    def post(self):
+        pass
+
+
+def main():
+    random.seed(1)
+    permissions = [Permission('permission %s' % i) for i in range(PERMISSIONS)]
+    rules = Rules(lambda: {'validator': None, 'docs': {}, 'permissions': {}, 'compiled': {}, 'group': None})
+    for i in range(ROUTES):
+        a, b, c = random.sample(permissions, 3)
+        rules.add_meta('/route%s' % i, Handler, None, {'get': a | b, 'post': a & b & ~c})
+    # users share a few roles, so there are only a few distinct permission sets
+    roles = [frozenset(random.sample(permissions, 60)) for _ in range(ROLES)]
+    users = [random.choice(roles) for _ in range(200)]
+
+    def walk():
+        for user in users:
+            allowed = {}
+            for human_route, route in rules.items():
+                for method, p in route['permissions'].items():
+                    if p is not None and p(user):
+                        allowed.setdefault(human_route, []).append(method)
+
+    def table():
+        for user in users:
+            rules.permitted_routes(user)
+
+    walk_time = min(timeit.repeat(walk, number=1, repeat=3)) / len(users)
+    table_time = min(timeit.repeat(table, number=1, repeat=3)) / len(users)
+    print('%s routes, %s distinct permission sets' % (ROUTES, ROLES))
+    print('rule walk %8.1f us/user  decision table %8.1f us/user  x%.1f' %
+          (walk_time * 1e6, table_time * 1e6, walk_time / table_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+__author__ = 'Maxim Dutkin (max@dutkin.ru)'
+
+
+# Measures requests per second of CPU-bound endpoint served by 1, 2, 4... up to number of CPU cores M2Core worker
+# processes (`M2Core.run(workers=N)`). Server needs PostgreSQL and Redis from your config (`CONFIG_NAME` env var,
+# `config.py` by default), because master syncs permissions and roles before forking. Run it with:
+#
+#   python -m example.benchmarks.prefork_throughput [seconds]
+
+import os
+import sys
+import json
+import time
+import signal
+import subprocess
+import http.client
+from multiprocessing import Pool, cpu_count
+from m2core.common.options import options
+
+
+PORT = 18999
+CLIENTS = 16
+
+
+def serve(workers: int):
+    from m2core import M2Core
+    from m2core.bases import BaseHandler
+    from m2core.common.permissions import PermissionsEnum
+
+    class BusyHandler(BaseHandler):
+        def get(self, *args, **kwargs):
+            """Serializes a few kilobytes of JSON"""
+            data = [{'id': i, 'name': 'item %s' % i, 'tags': list(range(10))} for i in range(200)]
+            self.write_json(data=json.loads(json.dumps(data)))
+
+    options.server_port = PORT
+    options.debug = False
+    m2core = M2Core()
+    m2core.route(r'/busy', BusyHandler, get=PermissionsEnum.SKIP)
+    m2core.run(workers=workers)
+
+
+def client(seconds: float) -> int:
+    conn = http.client.HTTPConnection('127.0.0.1', PORT)
+    done = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        conn.request('GET', '/busy')
+        conn.getresponse().read()
+        done += 1
+    return done
+
+
+def wait_for_server(timeout: float=30):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', PORT, timeout=1)
+            conn.request('GET', '/busy')
+            conn.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('Server didn\'t start')
+
+
+def main():
+    if len(sys.argv) > 2 and sys.argv[1] == 'serve':
+        serve(int(sys.argv[2]))
+        return
+
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    workers = 1
+    baseline = None
+    while True:
+        server = subprocess.Popen([sys.executable, '-m', 'example.benchmarks.prefork_throughput', 'serve',
+                                   str(workers)], start_new_session=True)
+        try:
+            wait_for_server()
+            with Pool(CLIENTS) as pool:
+                total = sum(pool.map(client, [seconds] * CLIENTS))
+        finally:
+            os.killpg(server.pid, signal.SIGTERM)
+            server.wait()
+        rps = total / seconds
+        baseline = baseline or rps
+        print('%3s workers  %8.0f req/s  x%.2f' % (workers, rps, rps / baseline))
+        if workers >= cpu_count():
+            break
+        workers = min(workers * 2, cpu_count())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+__author__ = 'Maxim Dutkin (max@dutkin.ru)'
+
+
+# Measures slowdown of CPU bound code while `SamplingProfiler` samples process with different intervals, and cost of
+# one sample of deep stack. Run it with:
+#
+#   python -m example.benchmarks.profiler_overhead
+
+import sys
+import threading
+import timeit
+from m2core.utils.profiler import SamplingProfiler
+
+
+NUMBER = 20
+DEPTH = 40
+
+
+def work():
+    total = 0
+    for i in range(200000):
+        total += i * i
+    return total
+
+
+def deep(depth: int, done: threading.Event, ready: threading.Event):
+    if depth:
+        return deep(depth - 1, done, ready)
+    ready.set()
+    done.wait()
+
+
+def main():
+    base = min(timeit.repeat(work, number=NUMBER, repeat=3))
+    print('without profiler              %8.3f ms' % (base * 1000))
+    for interval in (0.01, 0.005, 0.001):
+        profiler = SamplingProfiler(interval)
+        profiler.start()
+        cost = min(timeit.repeat(work, number=NUMBER, repeat=3))
+        profiler.stop()
+        print('interval %5.3f sec            %8.3f ms (+%.1f%%)' % (interval, cost * 1000, (cost / base - 1) * 100))
+
+    done, ready = threading.Event(), threading.Event()
+    thread = threading.Thread(target=deep, args=(DEPTH, done, ready))
+    thread.start()
+    ready.wait()
+    profiler = SamplingProfiler()
+    frame = sys._current_frames()[thread.ident]
+    cost = min(timeit.repeat(lambda: profiler.collapse(frame, thread.ident), number=1000, repeat=3)) / 1000
+    done.set()
+    thread.join()
+    print('collapse of %s frames stack    %8.3f us' % (DEPTH, cost * 1000000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+__author__ = 'Maxim Dutkin (max@dutkin.ru)'
+
+
+# Compares request latency of authenticated requests resolved with blocking Redis client (`get_current_user`)
+# and with asyncio Redis client (`prepare`, `options.redis_async`) when Redis answers slowly. Redis is replaced
+# by a local stand-in server, which answers every command after `--delay` seconds. Run it with:
+#
+#   python -m example.benchmarks.redis_async_latency --concurrency=50 --delay=0.005
+
+import argparse
+import asyncio
+import os
+import socket
+import tempfile
+import threading
+import time
+from tornado.httpclient import AsyncHTTPClient
+from tornado.httpserver import HTTPServer
+from tornado.ioloop import IOLoop
+from tornado.netutil import bind_sockets
+from m2core import M2Core
+from m2core.bases import BaseHandler
+from m2core.common.options import options
+from m2core.common.permissions import PermissionsEnum
+from m2core.data_schemes.db_system_scheme import M2Permission
+
+
+class SlowRedisServer:
+    """
+    Tiny RESP server, which knows just enough commands to resolve user: GET returns user id for any key,
+    SMEMBERS returns empty set, HELLO agrees to any protocol version, everything else answers +OK. Each answer is delayed by `delay` seconds
+    """
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.port = None
+
+    async def handle(self, reader, writer):
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            args = []
+            for _ in range(int(line[1:])):
+                length = int((await reader.readline())[1:])
+                args.append((await reader.readexactly(length + 2))[:-2])
+            await asyncio.sleep(self.delay)
+            command = args[0].upper()
+            if command == b'GET':
+                writer.write(b'$1\r\n1\r\n')
+            elif command in (b'SMEMBERS', b'SUNION'):
+                writer.write(b'*0\r\n')
+            elif command == b'HELLO':
+                writer.write(b'%%1\r\n$5\r\nproto\r\n:%s\r\n' % args[1])
+            else:
+                writer.write(b'+OK\r\n')
+            await writer.drain()
+        writer.close()
+
+    def start(self):
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        self.port = sock.getsockname()[1]
+        loop = asyncio.new_event_loop()
+
+        def serve():
+            asyncio.set_event_loop(loop)
+            loop.run_until_complete(asyncio.start_server(self.handle, sock=sock))
+            loop.run_forever()
+
+        threading.Thread(target=serve, daemon=True).start()
+
+
+class WhoAmIHandler(BaseHandler):
+    def get(self, *args, **kwargs):
+        self.write_json(data=self.current_user['id'])
+
+
+def make_m2core(redis_port: int, redis_async: bool) -> M2Core:
+    config = tempfile.NamedTemporaryFile('w', suffix='.py', delete=False)
+    config.write('locale = "C.UTF-8"\nredis_port = %s\nredis_async = %s\n' % (redis_port, redis_async))
+    config.close()
+    options.parse_cli_options = False
+    options.config_name = config.name
+    m2core = M2Core()
+    os.unlink(config.name)
+    m2core.route(r'/whoami', WhoAmIHandler, get=PermissionsEnum.SKIP)
+    return m2core
+
+
+async def measure(port: int, concurrency: int, requests: int) -> list:
+    client = AsyncHTTPClient(max_clients=concurrency)
+    latencies = []
+
+    async def worker():
+        while len(latencies) < requests:
+            started = time.perf_counter()
+            await client.fetch('http://127.0.0.1:%s/whoami' % port, headers={'X-Access-Token': 'token'})
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return sorted(latencies)
+
+
+def run(concurrency: int, requests: int, delay: float):
+    redis_server = SlowRedisServer(delay)
+    redis_server.start()
+    # DB isn't needed for this benchmark
+    M2Permission.reset_index({})
+
+    print('%-10s %-10s %-10s %-10s' % ('mode', 'p50 ms', 'p99 ms', 'rps'))
+    for redis_async in (False, True):
+        m2core = make_m2core(redis_server.port, redis_async)
+        server = HTTPServer(m2core.run_for_test())
+        sockets = bind_sockets(0, '127.0.0.1')
+        server.add_sockets(sockets)
+        port = sockets[0].getsockname()[1]
+
+        started = time.perf_counter()
+        latencies = IOLoop.current().run_sync(lambda: measure(port, concurrency, requests))
+        elapsed = time.perf_counter() - started
+        server.stop()
+        print('%-10s %-10.2f %-10.2f %-10.0f' % ('async' if redis_async else 'blocking',
+                                                 latencies[len(latencies) // 2] * 1000,
+                                                 latencies[int(len(latencies) * 0.99)] * 1000,
+                                                 len(latencies) / elapsed))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--delay', type=float, default=0.005)
+    args = parser.parse_args()
+    run(args.concurrency, args.requests, args.delay)
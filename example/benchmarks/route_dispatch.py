@@ -0,0 +1,64 @@
+__author__ = 'Maxim Dutkin (max@dutkin.ru)'
+
+
+# Compares dispatch of requests to handlers among 1000 routes by Tornado (regular expressions of routes are matched
+# one by one) and by `RouteTree`. Only routing is measured - handlers aren't executed. Run it with:
+#
+#   python -m example.benchmarks.route_dispatch
+
+import timeit
+from tornado.httputil import HTTPServerRequest
+from tornado.routing import Rule, AnyMatches
+from tornado.web import Application
+from m2core.bases import BaseHandler
+from m2core.utils.route_tree import RouteTree
+from m2core.utils.url_parser import UrlParser
+
+
+RESOURCES = 250
+NUMBER = 2000
+
+
+class BenchHandler(BaseHandler):
+    pass
+
+
+def routes() -> list:
+    result = []
+    for i in range(RESOURCES):
+        result += [
+            '/api/v1/resource%s' % i,
+            '/api/v1/resource%s/:{id:int}' % i,
+            '/api/v1/resource%s/:{id:int}/items/:{slug:string}' % i,
+            '/api/v1/resource%s/:{id:int}/flags/:{flag:bool}' % i,
+        ]
+    return result
+
+
+def main():
+    parsers = [UrlParser(route) for route in routes()]
+    endpoints = [(parser.tornado_url(), BenchHandler, {}) for parser in parsers]
+    regex_app = Application(endpoints)
+    tree_app = Application([])
+    tree_app.wildcard_router.add_rules([
+        Rule(AnyMatches(), RouteTree(tree_app, endpoints, parsers, typed_handlers=(BaseHandler, )))
+    ])
+
+    print('%s routes' % len(parsers))
+    print('%-40s %12s %12s' % ('path', 'tornado us', 'tree us'))
+    for path in ('/api/v1/resource0/5', '/api/v1/resource125/5/items/abc', '/api/v1/resource249/5/flags/1',
+                 '/api/v1/unknown'):
+        request = HTTPServerRequest(uri=path)
+        regex_delegate = regex_app.find_handler(request)
+        tree_delegate = tree_app.find_handler(request)
+        assert regex_delegate.handler_class is tree_delegate.handler_class
+        assert regex_delegate.path_kwargs.keys() == tree_delegate.path_kwargs.keys()
+        timings = [
+            min(timeit.repeat(lambda: app.find_handler(request), number=NUMBER, repeat=3)) / NUMBER * 1e6
+            for app in (regex_app, tree_app)
+        ]
+        print('%-40s %12.2f %12.2f' % ((path, ) + tuple(timings)))
+
+
+if __name__ == '__main__':
+    main()
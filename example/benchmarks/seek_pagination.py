@@ -0,0 +1,39 @@
+__author__ = 'Maxim Dutkin (max@dutkin.ru)'
+
+
+# Compares fetching of a deep page (page 10000 by 20 rows from 300k rows, ordered by indexed `value`) by
+# `DataMixin.all` with `page` (LIMIT/OFFSET) and by `DataMixin.page_by_cursor` (keyset pagination). Run it with:
+#
+#   python -m example.benchmarks.seek_pagination
+
+import timeit
+from example.tests.helpers import make_sqlite_session, BenchItem
+
+
+ROWS = 300000
+PER_PAGE = 20
+PAGES = (1, 100, 1000, 10000)
+
+
+def main():
+    make_sqlite_session(ROWS)
+    print('%s rows, %s rows per page, order by `value asc`' % (ROWS, PER_PAGE))
+    for page in PAGES:
+        offset_rows = BenchItem.all(page=page, per_page=PER_PAGE, order_by='value asc')
+        # cursor pointing at the last row of the previous page, the same one client would get from previous request
+        cursor = None
+        if page > 1:
+            previous = BenchItem.all(page=page - 1, per_page=PER_PAGE, order_by='value asc')[-1]
+            cursor = BenchItem._encode_cursor('value asc', [previous.value, previous.id])
+        seek_rows, _ = BenchItem.page_by_cursor(cursor, per_page=PER_PAGE, order_by='value asc')
+        assert [r.id for r in offset_rows] == [r.id for r in seek_rows]
+
+        offset = min(timeit.repeat(lambda: BenchItem.all(page=page, per_page=PER_PAGE, order_by='value asc'),
+                                   number=10, repeat=3)) / 10
+        seek = min(timeit.repeat(lambda: BenchItem.page_by_cursor(cursor, per_page=PER_PAGE, order_by='value asc'),
+                                 number=10, repeat=3)) / 10
+        print('  page %-6s offset %8.2f ms   cursor %8.2f ms' % (page, offset * 1000, seek * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+__author__ = 'Maxim Dutkin (max@dutkin.ru)'
+
+
+# Counts Redis round trips per authenticated request for every `SessionHelper` resolver against in-memory
+# fake Redis (`pip install fakeredis[lua]`). Run it with:
+#
+#   python -m example.benchmarks.session_round_trips
+
+import time
+from m2core.data_schemes.redis_system_scheme import redis_scheme
+from m2core.utils.session_helper import SessionHelper
+from example.tests.helpers import CountingRedis
+
+
+class NamesSessionHelper(SessionHelper):
+    """
+    Leaves permissions as system names - we measure only Redis here, not DB
+    """
+    @staticmethod
+    def _load_permissions(permission_names) -> set:
+        return set(permission_names)
+
+
+def fill(r, roles_count: int, permissions_per_role: int) -> str:
+    token = 'bench_token'
+    user_id = 1
+    r.set(redis_scheme['ACCESS_TOKENS_BY_HASH']['prefix'] % token, user_id)
+    r.sadd(redis_scheme['USER_ROLES']['prefix'] % user_id, *range(1, roles_count + 1))
+    for role_id in range(1, roles_count + 1):
+        r.sadd(redis_scheme['ROLE_PERMISSIONS']['prefix'] % role_id,
+               *['PERM_%s_%s' % (role_id, i) for i in range(permissions_per_role)])
+    return token
+
+
+def run(requests: int=1000):
+    print('%-8s %-12s %-12s %-10s' % ('roles', 'resolver', 'trips/req', 'us/req'))
+    for roles_count in (1, 3, 10, 30):
+        r = CountingRedis(decode_responses=True)
+        token = fill(r, roles_count, 20)
+        expected = None
+        for resolver in SessionHelper.RESOLVERS:
+            # warm up, i.e. load Lua script
+            NamesSessionHelper(r, redis_scheme).resolve(token, resolver)
+            CountingRedis.round_trips = 0
+            started = time.perf_counter()
+            for _ in range(requests):
+                user = NamesSessionHelper(r, redis_scheme).resolve(token, resolver)
+            elapsed = time.perf_counter() - started
+            if expected is None:
+                expected = user
+            assert user == expected, 'resolver `%s` returned different result' % resolver
+            print('%-8s %-12s %-12.1f %-10.1f' % (roles_count, resolver, CountingRedis.round_trips / requests,
+                                                  elapsed / requests * 1e6))
+
+
+if __name__ == '__main__':
+    run()
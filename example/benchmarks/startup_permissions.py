@@ -0,0 +1,136 @@
+__author__ = 'Maxim Dutkin (max@dutkin.ru)'
+
+
+# Measures startup reconciliation of permissions and roles (`sync_permissions` + `dump_roles`) for 5000 platform
+# permissions and 200 roles, against former per-row implementation. Cold start - empty DB, warm start - everything
+# is already in DB. SQL statements and Redis round trips are counted. DB is temporary SQLite file and Redis is
+# in-memory fake Redis (`pip install fakeredis[lua]`), so real servers would add network latency to every round
+# trip. Run it with:
+#
+#   python -m example.benchmarks.startup_permissions
+
+import random
+import time
+from sqlalchemy import event
+from m2core.m2core import sync_permissions, dump_roles
+from m2core.common.options import options
+from m2core.common.permissions import Permission, PermissionsEnum
+from m2core.bases.base_model import EnchantedMixin
+from m2core.data_schemes.redis_system_scheme import redis_scheme
+from m2core.data_schemes.db_system_scheme import M2Role, M2Permission, M2RolePermission
+from m2core.utils.session_helper import SessionHelper
+from example.tests.helpers import make_sqlite_session, create_system_tables, CountingRedis
+
+
+PERMISSIONS = 5000
+ROLES = 200
+PERMISSIONS_PER_ROLE = 50
+
+BenchPermissions = type('BenchPermissions', (PermissionsEnum,), {
+    'PERMISSION_%s' % i: Permission('permission %s' % i, description='Bench permission %s' % i)
+    for i in range(PERMISSIONS)
+})
+
+
+def legacy_sync_permissions():
+    """
+    `sync_permissions` before set-based reconciliation
+    """
+    admin_role = M2Role.load_by_params(name=options.admin_role_name)
+    if not admin_role:
+        admin_role = M2Role.load_or_create(
+            name=options.admin_role_name,
+            description='Superuser role with all existing permissions'
+        )
+    default_role = M2Role.load_by_params(name=options.default_role_name)
+    if not default_role:
+        default_role = M2Role.create(
+            name=options.default_role_name,
+            description='Default user role'
+        )
+    permission = M2Permission.load_by_params(name=options.default_permission)
+    if not permission:
+        permission = M2Permission.create(name=options.default_permission, system_name=options.default_permission)
+    M2RolePermission.load_or_create(
+        role_id=default_role.get('id'),
+        permission_id=permission.get('id')
+    )
+    for p in PermissionsEnum.all_platform_permissions:
+        permission = M2Permission.load_by_params(system_name=p.sys_name)
+        if not permission:
+            permission = M2Permission.create(name=p.name, system_name=p.sys_name, description=p.description)
+            M2RolePermission.create(role_id=admin_role.get('id'), permission_id=permission.get('id'))
+        else:
+            M2RolePermission.load_or_create(role_id=admin_role.get('id'), permission_id=permission.get('id'))
+    M2Permission.refresh_index()
+
+
+def legacy_dump_roles():
+    """
+    `dump_roles` before set-based reconciliation: one query and SMEMBERS/SADD/SREM per role
+    """
+    r = M2Role.r['connector']
+    for role in M2Role.all():
+        permissions = role.get_role_permissions()
+        key = redis_scheme['ROLE_PERMISSIONS']['prefix'] % role.get('id')
+        existing_permissions = r.smembers(key)
+        for permission in permissions:
+            if permission not in existing_permissions:
+                r.sadd(key, permission)
+        for permission in existing_permissions:
+            if permission not in permissions:
+                r.srem(key, permission)
+
+
+def add_roles():
+    """
+    Adds roles with random permissions, so there are `ROLES` roles in total
+    """
+    # the same roles for every variant
+    random.seed(1)
+    permission_ids = [p.id for p in M2Permission.all(order_by='id asc')]
+    M2Role.create_many([{'name': 'role %s' % i} for i in range(ROLES - 2)])
+    M2RolePermission.create_many([
+        {'role_id': role.id, 'permission_id': permission_id}
+        for role in M2Role.all(order_by='id asc') if role.name.startswith('role ')
+        for permission_id in random.sample(permission_ids, PERMISSIONS_PER_ROLE)
+    ])
+
+
+def measure(func, statements: list) -> tuple:
+    statements[0] = 0
+    CountingRedis.round_trips = 0
+    started = time.perf_counter()
+    func()
+    return (time.perf_counter() - started) * 1000, statements[0], CountingRedis.round_trips
+
+
+def main():
+    print('%s permissions, %s roles by %s permissions' % (PERMISSIONS, ROLES, PERMISSIONS_PER_ROLE))
+    print('%-12s %-6s %-16s %10s %12s %12s' % ('variant', 'start', 'step', 'ms', 'statements', 'redis trips'))
+    results = dict()
+    for variant, sync, dump in (('legacy', legacy_sync_permissions, legacy_dump_roles),
+                                ('set-based', sync_permissions, dump_roles)):
+        session = make_sqlite_session(0)
+        create_system_tables(session)
+        statements = [0]
+        event.listen(session.bind, 'before_cursor_execute', lambda *args: statements.__setitem__(0, statements[0] + 1))
+        r = CountingRedis(decode_responses=True)
+        EnchantedMixin.set_redis_session({'connector': r, 'scheme': redis_scheme})
+        EnchantedMixin.set_sh(SessionHelper)
+
+        for start in ('cold', 'warm'):
+            for step, func in (('sync_permissions', sync), ('dump_roles', dump)):
+                print('%-12s %-6s %-16s %10.1f %12s %12s' % ((variant, start, step) + measure(func, statements)))
+            if start == 'cold':
+                add_roles()
+        results[variant] = {
+            role_id: r.smembers(redis_scheme['ROLE_PERMISSIONS']['prefix'] % role_id) for role_id, in
+            session.query(M2Role.id).all()
+        }
+        session.remove()
+    assert results['legacy'] == results['set-based']
+
+
+if __name__ == '__main__':
+    main()
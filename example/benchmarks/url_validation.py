@@ -0,0 +1,44 @@
+__author__ = 'Maxim Dutkin (max@dutkin.ru)'
+
+
+# Measures cost of url params validation per request: schema rebuilt on every request (former
+# `validate_url_params`), schema cached on `UrlParser` and `UrlParser.validate` with plain Python validators
+# for simple rules. Run it with:
+#
+#   python -m example.benchmarks.url_validation
+
+import timeit
+from voluptuous import Schema
+from m2core.utils.url_parser import UrlParser
+
+
+ROUTES = {
+    'simple': ('/users/:{id:int}/posts/:{slug}/:{draft:bool}', {'id': '42', 'slug': 'hello', 'draft': '0'}),
+    'with params': ('/users/:{id:int(0,[0-100])}/:{kind:string(0,[a;b;c])}', {'id': '42', 'kind': 'b'}),
+}
+NUMBER = 20000
+
+
+def rebuilt_schema(parser: UrlParser) -> Schema:
+    result = dict()
+    for attr in parser.url_attributes:
+        result.update(attr['instance'].validator())
+    return Schema(result)
+
+
+def main():
+    print('%-12s %14s %14s %14s' % ('route', 'rebuilt us', 'cached us', 'validate us'))
+    for name, (route, params) in ROUTES.items():
+        parser = UrlParser(route)
+        assert rebuilt_schema(parser)(params) == parser.validator_schema()(params) == parser.validate(params)
+        cases = (
+            lambda: rebuilt_schema(parser)(params),
+            lambda: parser.validator_schema()(params),
+            lambda: parser.validate(params),
+        )
+        timings = [min(timeit.repeat(case, number=NUMBER, repeat=3)) / NUMBER * 1e6 for case in cases]
+        print('%-12s %14.2f %14.2f %14.2f' % ((name, ) + tuple(timings)))
+
+
+if __name__ == '__main__':
+    main()
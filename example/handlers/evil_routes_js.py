@@ -1,6 +1,5 @@
 from m2core.bases.base_handler import BaseHandler, http_statuses
 from m2core.m2core import M2Core
-from collections import defaultdict
 from tornado import gen
 from json.decoder import JSONDecodeError
 from sqlalchemy import exc
@@ -21,9 +20,5 @@ class EvilRoutesHandler(BaseHandler):
         """Returns a list of all endpoints with its method where user is allowed to pass"""
         me = self.current_user
 
-        allowed_routes = defaultdict(list)
-        for human_route, route in M2Core.rules.items():
-            for method, p in route['permissions'].items():
-                if p is not None and p(me['permissions']):
-                    allowed_routes[human_route].append(method)
+        allowed_routes = M2Core.rules.permitted_routes(me['permissions'])
         self.write_json(data=allowed_routes)
@@ -0,0 +1,383 @@
+__author__ = 'Maxim Dutkin (max@dutkin.ru)'
+
+
+import asyncio
+import base64
+import datetime
+import decimal
+import unittest
+import uuid
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import Column, Integer, Numeric, String, ForeignKey
+from sqlalchemy.types import TypeDecorator
+from sqlalchemy.orm import sessionmaker, scoped_session, relationship
+from m2core.bases.base_model import BaseModel, EnchantedMixin
+from m2core.db import request_scope
+from m2core.utils.error import M2Error
+from m2core.utils.response_cache import ResponseCache
+from example.tests.helpers import make_sqlite_session, BenchItem
+
+
+class SiblingParent(BaseModel):
+    __tablename__ = 'sibling_parents'
+
+    id = Column(Integer, primary_key=True)
+
+    # backref `parent` of the first relation is a name of relation of the second relation's target
+    first = relationship('SiblingFirst', backref='parent')
+    second = relationship('SiblingSecond')
+
+
+class SiblingFirst(BaseModel):
+    __tablename__ = 'sibling_firsts'
+
+    id = Column(Integer, primary_key=True)
+    parent_id = Column(Integer, ForeignKey('sibling_parents.id'))
+
+
+class SiblingSecond(BaseModel):
+    __tablename__ = 'sibling_seconds'
+
+    id = Column(Integer, primary_key=True)
+    sibling_parent_id = Column(Integer, ForeignKey('sibling_parents.id'))
+    parent_id = Column(Integer, ForeignKey('sibling_firsts.id'))
+
+    parent = relationship('SiblingFirst')
+
+
+class StringUUID(TypeDecorator):
+    """
+    UUID stored as string, SQLite has no UUID type
+    """
+    impl = String(36)
+
+    @property
+    def python_type(self):
+        return uuid.UUID
+
+    def process_bind_param(self, value, dialect):
+        return str(value) if value is not None else None
+
+    def process_result_value(self, value, dialect):
+        return uuid.UUID(value) if value is not None else None
+
+
+class PricedItem(BaseModel):
+    __tablename__ = 'priced_items'
+
+    id = Column(StringUUID, primary_key=True)
+    price = Column(Numeric(10, 2), nullable=False)
+
+
+class DataMixinAsyncTest(unittest.TestCase):
+    def setUp(self):
+        self.prev_session = getattr(EnchantedMixin, '_db_session', None)
+        self.prev_executor = getattr(EnchantedMixin, '_executor', None)
+        self.session = make_sqlite_session(10)
+        self.executor = ThreadPoolExecutor(4)
+        EnchantedMixin.set_executor(self.executor)
+
+    def tearDown(self):
+        self.session.remove()
+        self.executor.shutdown()
+        EnchantedMixin.set_db_session(self.prev_session)
+        EnchantedMixin.set_executor(self.prev_executor)
+
+    def test_crud(self):
+        async def scenario():
+            item = await BenchItem.aload_by_pk(1)
+            self.assertEqual('item 0', item.get('name'))
+            self.assertEqual(1, await BenchItem.acount(name='item 1'))
+            self.assertEqual(3, len(await BenchItem.aall(page=1, per_page=3)))
+
+            created = await BenchItem.acreate(name='new', value=100)
+            created.set(value=101)
+            await created.asave()
+            loaded = await BenchItem.aload_by_params(name='new')
+            self.assertEqual(101, loaded.get('value'))
+            await loaded.adelete()
+            self.assertIsNone(await BenchItem.aload_by_params(name='new'))
+
+        asyncio.run(scenario())
+
+    def test_sync_and_async_calls(self):
+        async def scenario():
+            # instance loaded by async method is saved by sync one in session of task
+            item = await BenchItem.aload_by_pk(1)
+            item.set_and_save(value=100)
+            # and instance loaded by sync method is saved by async one in it's own session
+            other = BenchItem.load_by_pk(2)
+            other.set(value=200)
+            await other.asave()
+            await BenchItem.load_by_pk(3).adelete()
+
+        asyncio.run(scenario())
+        self.session.expire_all()
+        self.assertEqual(100, BenchItem.load_by_pk(1).get('value'))
+        self.assertEqual(200, BenchItem.load_by_pk(2).get('value'))
+        self.assertIsNone(BenchItem.load_by_pk(3))
+
+    def test_concurrent_calls(self):
+        session = scoped_session(sessionmaker(bind=self.session.bind), scopefunc=request_scope.scope_func)
+        EnchantedMixin.set_db_session(session)
+
+        async def request():
+            scope = request_scope.enter_scope()
+            try:
+                # tasks of `gather` share session of request
+                return await asyncio.gather(BenchItem.aload_by_pk(1), BenchItem.aload_by_pk(2),
+                                            return_exceptions=True)
+            finally:
+                request_scope.remove_scope(session, scope)
+
+        try:
+            first, second = asyncio.run(request())
+        finally:
+            session.remove()
+            EnchantedMixin.set_db_session(self.session)
+        self.assertEqual(1, first.get('id'))
+        self.assertIsInstance(second, M2Error)
+
+        async def sync_call_meanwhile():
+            item = BenchItem.load_by_pk(1)
+            saving = asyncio.ensure_future(item.asave())
+            await asyncio.sleep(0)
+            with self.assertRaises(M2Error):
+                item.save()
+            await saving
+
+        asyncio.run(sync_call_meanwhile())
+
+    def test_session_per_task(self):
+        async def session_of_task():
+            return BenchItem._task_session()
+
+        async def scenario():
+            first = asyncio.create_task(session_of_task())
+            second = asyncio.create_task(session_of_task())
+            return await first, await second
+
+        first, second = asyncio.run(scenario())
+        self.assertIsNot(first, second)
+        self.assertIsNot(self.session(), first)
+
+    def test_thread_session_is_kept(self):
+        executor = ThreadPoolExecutor(1)
+        EnchantedMixin.set_executor(executor)
+
+        async def scenario():
+            loop = asyncio.get_running_loop()
+            # thread pool job uses thread-local session of the worker thread
+            thread_session = await loop.run_in_executor(executor, self.session)
+            await BenchItem.aload_by_pk(1)
+            return thread_session, await loop.run_in_executor(executor, self.session)
+
+        try:
+            before, after = asyncio.run(scenario())
+            self.assertIs(before, after)
+        finally:
+            executor.submit(self.session.remove).result()
+            executor.shutdown()
+
+    def test_request_scope(self):
+        session = scoped_session(sessionmaker(bind=self.session.bind), scopefunc=request_scope.scope_func)
+        EnchantedMixin.set_db_session(session)
+
+        async def request():
+            scope = request_scope.enter_scope()
+            request_session = session()
+            item = await BenchItem.aload_by_pk(1)
+            # async methods use session of request, it stays in registry
+            self.assertIs(request_session, session())
+            self.assertIs(request_session, BenchItem.s.object_session(item))
+            item.set_and_save(value=100)
+            request_scope.remove_scope(session, scope)
+            return request_session
+
+        try:
+            asyncio.run(request())
+            self.assertEqual({}, {key: value for key, value in session.registry.registry.items()
+                                  if key[0] == 'request'})
+            self.assertEqual(100, BenchItem.load_by_pk(1).get('value'))
+        finally:
+            session.remove()
+
+    def test_outside_of_coroutine(self):
+        with self.assertRaises(Exception):
+            BenchItem._task_session()
+
+
+class DataMixinDataTest(unittest.TestCase):
+    def setUp(self):
+        self.prev_session = getattr(EnchantedMixin, '_db_session', None)
+        self.session = make_sqlite_session(3, tags_per_item=2, owners=1)
+
+    def tearDown(self):
+        self.session.remove()
+        EnchantedMixin.set_db_session(self.prev_session)
+
+    def test_data(self):
+        item = BenchItem.load_by_pk(1)
+        tags = [{'id': 1, 'item_id': 1, 'name': 'tag 0'}, {'id': 2, 'item_id': 1, 'name': 'tag 1'}]
+        expected = {
+            'id': 1, 'name': 'item 0', 'value': 0, 'created': item.created, 'owner_id': 1,
+            'owner': {'id': 1, 'name': 'owner 0'},
+            'tags': tags,
+        }
+        self.assertEqual(expected, item.data())
+        # backrefs `owner.items` and `tag.item` aren't visited
+        self.assertEqual(expected, item.data(max_level=3))
+        self.assertEqual(
+            {'id': 1, 'name': 'item 0', 'value': 0, 'owner_id': 1, 'tags': [{'id': 1, 'name': 'tag 0'},
+                                                                            {'id': 2, 'name': 'tag 1'}]},
+            item.data('created', 'owner', 'tags>item_id')
+        )
+        self.assertEqual({'id': 1, 'name': 'item 0', 'value': 0, 'created': item.created, 'owner_id': 1},
+                         item.data(max_level=1))
+
+    def test_data_siblings(self):
+        tables = [SiblingParent.__table__, SiblingFirst.__table__, SiblingSecond.__table__]
+        BaseModel.metadata.create_all(self.session.bind, tables=tables)
+        self.session.add(SiblingParent(id=1, first=[SiblingFirst(id=1)],
+                                       second=[SiblingSecond(id=1, parent=SiblingFirst(id=2))]))
+        self.session.commit()
+        self.assertEqual(
+            {'id': 1, 'first': [{'id': 1, 'parent_id': 1}],
+             'second': [{'id': 1, 'sibling_parent_id': 1, 'parent_id': 2, 'parent': {'id': 2, 'parent_id': None}}]},
+            SiblingParent.load_by_pk(1).data(max_level=3)
+        )
+
+    def test_iter_all(self):
+        rows = BenchItem.iter_all(per_chunk=2, value=('>=', 1))
+        self.assertEqual(['item 1', 'item 2'], [item.get('name') for item in rows])
+
+    def test_page_by_cursor(self):
+        for order_by in (None, 'created asc', 'value desc'):
+            expected = [item.get('id') for item in BenchItem.all(order_by=order_by or 'id asc')]
+            if order_by == 'created asc':
+                # items are created at the same moment, order is kept by primary key
+                BenchItem.q.update({'created': datetime.datetime(2018, 1, 1)})
+            pages = []
+            rows, cursor = BenchItem.page_by_cursor(per_page=2, order_by=order_by)
+            pages.append([item.get('id') for item in rows])
+            while cursor:
+                rows, cursor = BenchItem.page_by_cursor(cursor, per_page=2, order_by=order_by)
+                pages.append([item.get('id') for item in rows])
+            self.assertEqual([expected[:2], expected[2:]], pages, msg=f'Error with `{order_by}` order')
+
+        rows, first_cursor = BenchItem.page_by_cursor(per_page=1, value=('>=', 1))
+        self.assertEqual([2], [item.get('id') for item in rows])
+        rows, cursor = BenchItem.page_by_cursor(first_cursor, per_page=1, value=('>=', 1))
+        self.assertEqual(([3], None), ([item.get('id') for item in rows], cursor))
+
+        with self.assertRaises(M2Error):
+            BenchItem.page_by_cursor(first_cursor, order_by='value desc')
+        with self.assertRaises(M2Error):
+            BenchItem.page_by_cursor('garbage')
+
+    def test_malformed_cursor(self):
+        cursors = [
+            base64.urlsafe_b64encode(b'{"o":null,"v":5}').decode(),
+            base64.urlsafe_b64encode(b'[1]').decode(),
+            BenchItem._encode_cursor(None, ['1']),
+            BenchItem._encode_cursor(None, [True]),
+            BenchItem._encode_cursor(None, [[1]]),
+        ]
+        for cursor in cursors:
+            with self.assertRaises(M2Error, msg=f'Error in `{cursor}` cursor') as error:
+                BenchItem.page_by_cursor(cursor)
+            self.assertEqual('Malformed pagination cursor', error.exception.error_message)
+
+    def test_page_by_cursor_types(self):
+        BaseModel.metadata.create_all(self.session.bind, tables=[PricedItem.__table__])
+        ids = sorted(uuid.uuid4() for _ in range(3))
+        for i, pk in enumerate(ids):
+            self.session.add(PricedItem(id=pk, price=decimal.Decimal('%s.50' % (3 - i))))
+        self.session.commit()
+
+        for order_by, expected in ((None, ids), ('price asc', list(reversed(ids)))):
+            rows, cursor = PricedItem.page_by_cursor(per_page=2, order_by=order_by)
+            self.assertEqual(expected[:2], [item.get('id') for item in rows])
+            rows, cursor = PricedItem.page_by_cursor(cursor, per_page=2, order_by=order_by)
+            self.assertEqual((expected[2:], None), ([item.get('id') for item in rows], cursor))
+
+        for values in ([1.5, str(ids[0])], ['1.5', 1], ['x', str(ids[0])]):
+            with self.assertRaises(M2Error):
+                PricedItem.page_by_cursor(PricedItem._encode_cursor('price asc', values), order_by='price asc')
+
+    def test_bulk(self):
+        rows = [{'name': f'bulk {i}', 'value': 10 + i} for i in range(5)] + [{'name': 'bulk 5'}]
+        self.assertEqual(6, BenchItem.create_many(rows, batch_size=2))
+        # column defaults are applied to rows without values
+        self.assertEqual(list(range(10, 15)) + [0],
+                         [item.get('value') for item in BenchItem.all(id=('>', 3), order_by='id asc')])
+
+        self.assertEqual(2, BenchItem.update_many([{'id': 1, 'value': 100}, {'id': 2, 'value': 200, 'name': 'x'}]))
+        self.assertEqual([(100, 'item 0'), (200, 'x')],
+                         [(item.get('value'), item.get('name')) for item in BenchItem.all(id=('<', 3), order_by='id asc')])
+
+        with self.assertRaises(M2Error):
+            BenchItem.create_many([{'no_such_column': 1}])
+        with self.assertRaises(M2Error):
+            BenchItem.update_many([{'value': 1}])
+        with self.assertRaises(M2Error):
+            BenchItem.upsert_many(rows, ['id'])
+
+        from sqlalchemy.dialects import postgresql
+        # PostgreSQL gets batch of inserted rows as one multi-row statement
+        with mock.patch.object(self.session.bind.dialect, 'name', 'postgresql'), \
+                mock.patch.object(BenchItem, '_execute_bulk') as execute_bulk:
+            BenchItem.create_many(rows, batch_size=3)
+            statements = list(execute_bulk.call_args[0][0])
+        self.assertEqual([3, 2, 1], [len(statement.parameters) for statement, params in statements])
+        statement = BenchItem._upsert_statement(('id', 'value'), [{'id': 1, 'value': 1}, {'id': 2, 'value': 2}],
+                                                ['id'], None)
+        self.assertIn('ON CONFLICT (id) DO UPDATE SET value = excluded.value',
+                      str(statement.compile(dialect=postgresql.dialect())))
+        # batch is one multi-row statement
+        self.assertEqual(2, str(statement.compile(dialect=postgresql.dialect())).count('(%(id_m'))
+        statement = BenchItem._upsert_statement(('id',), [{'id': 1}], ['id'], None)
+        self.assertIn('ON CONFLICT (id) DO NOTHING', str(statement.compile(dialect=postgresql.dialect())))
+
+    def test_invalidate_responses(self):
+        prev_cache = EnchantedMixin.response_cache
+        prev_tags = ResponseCache.used_tags
+        cache = ResponseCache('local')
+        EnchantedMixin.set_response_cache(cache)
+        try:
+            # no cached response is made of table yet
+            BenchItem.load_by_pk(1).set_and_save(value=1)
+            self.assertEqual((0, ), cache.versions(('bench_items', )))
+
+            ResponseCache.use_tags(('bench_items', ))
+            versions = []
+            item = BenchItem.create(name='cached', value=1)
+            versions.append(cache.versions(('bench_items', )))
+            item.set_and_save(value=2)
+            versions.append(cache.versions(('bench_items', )))
+            BenchItem.update_many([{'id': item.id, 'value': 3}])
+            versions.append(cache.versions(('bench_items', )))
+            item.delete()
+            versions.append(cache.versions(('bench_items', )))
+            self.assertEqual([(1, ), (2, ), (3, ), (4, )], versions)
+            self.assertEqual((0, ), cache.versions(('bench_owners', )))
+
+            # versions are bumped only when changes are committed
+            BenchItem.load_by_pk(1).set(value=5).save(flush_only=True)
+            BenchItem.create_many([{'name': 'pending'}], commit=False)
+            self.assertEqual((4, ), cache.versions(('bench_items', )))
+            self.session.commit()
+            self.assertEqual((5, ), cache.versions(('bench_items', )))
+            BenchItem.load_by_pk(1).set(value=6).save(flush_only=True)
+            self.session.rollback()
+            self.session.commit()
+            self.assertEqual((5, ), cache.versions(('bench_items', )))
+        finally:
+            EnchantedMixin.set_response_cache(prev_cache)
+            ResponseCache.used_tags = prev_tags
+
+    def test_data_many(self):
+        items = BenchItem.all()
+        self.assertEqual([item.data('tags>id') for item in items], BenchItem.data_many(items, 'tags>id'))
+        self.assertEqual([], BenchItem.data_many([]))
@@ -0,0 +1,30 @@
+__author__ = 'Maxim Dutkin (max@dutkin.ru)'
+
+
+import unittest
+from m2core.utils.permissions import HandlerPermissions
+
+
+class HandlerPermissionsTest(unittest.TestCase):
+    def setUp(self):
+        self.hp = HandlerPermissions()
+        self.hp.add_handler_rules('/users', {'get': ['read'], 'post': ['read', 'write'], 'delete': None})
+        self.hp.add_handler_rules('/docs', {'get': []})
+        self.hp.add_handler_method_rules('/admin', 'get', ['read', 'admin', 'admin'])
+
+    def test_permitted_handlers(self):
+        self.assertEqual({'/docs': ['get']}, self.hp.get_all_permitted_handlers([]))
+        self.assertEqual({'/users': ['get'], '/docs': ['get']}, self.hp.get_all_permitted_handlers(['read']))
+        self.assertEqual(
+            {'/users': ['get', 'post'], '/docs': ['get'], '/admin': ['get']},
+            self.hp.get_all_permitted_handlers(['admin', 'write', 'read', 'unknown'])
+        )
+
+    def test_memo_is_reset(self):
+        self.assertEqual({'/docs': ['get']}, self.hp.get_all_permitted_handlers(['write']))
+        # caller can't spoil memoized result
+        self.hp.get_all_permitted_handlers(['write'])['/docs'].append('post')
+        self.assertEqual({'/docs': ['get']}, self.hp.get_all_permitted_handlers(['write']))
+
+        self.hp.add_handler_method_rules('/upload', 'put', ['write'])
+        self.assertEqual({'/docs': ['get'], '/upload': ['put']}, self.hp.get_all_permitted_handlers(['write']))
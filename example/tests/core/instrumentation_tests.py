@@ -0,0 +1,109 @@
+__author__ = 'Maxim Dutkin (max@dutkin.ru)'
+
+
+import asyncio
+import contextvars
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from m2core.bases.base_model import EnchantedMixin
+from m2core.utils.instrumentation import Instrumentation, Histogram, RequestTimings, phase
+from example.tests.helpers import make_sqlite_session, BenchItem
+
+
+class InstrumentationTest(unittest.TestCase):
+    def tearDown(self):
+        Instrumentation.reset()
+
+    def test_phase(self):
+        def scenario():
+            with phase('outside'):
+                pass
+            self.assertIsNone(Instrumentation.current())
+
+            timings = Instrumentation.start()
+            for _ in range(2):
+                with phase('redis'):
+                    pass
+            self.assertEqual(2, timings.phases['redis'][1])
+            self.assertNotIn('outside', timings.phases)
+            header = timings.server_timing(0.0125)
+            self.assertTrue(header.startswith('redis;dur='))
+            self.assertTrue(header.endswith('total;dur=12.500'))
+
+        # every request has it's own context
+        contextvars.Context().run(scenario)
+
+    def test_histogram(self):
+        histogram = Histogram()
+        self.assertIsNone(histogram.quantile(0.5))
+        for seconds in (0.0001, 0.002, 0.003, 0.2, 20):
+            histogram.observe(seconds)
+        snapshot = histogram.snapshot()
+        self.assertEqual(5, snapshot['count'])
+        self.assertEqual(1, snapshot['buckets'][0.0005])
+        self.assertEqual(3, snapshot['buckets'][0.005])
+        self.assertEqual(5, snapshot['buckets'][float('inf')])
+        self.assertEqual(0.005, snapshot['p50'])
+        self.assertEqual(float('inf'), snapshot['p99'])
+
+    def test_finish(self):
+        records = []
+
+        def broken(record):
+            raise ValueError('exporter is down')
+
+        Instrumentation.subscribe(broken)
+        Instrumentation.subscribe(records.append)
+        try:
+            timings = RequestTimings()
+            timings.add('db', 0.002)
+            timings.add('db', 0.001)
+            Instrumentation.finish(timings, '/users/:{id}', 'GET', 200, 0.004)
+            Instrumentation.finish(RequestTimings(), '/users/:{id}', 'GET', 404, 0.0002)
+        finally:
+            Instrumentation.unsubscribe(broken)
+            Instrumentation.unsubscribe(records.append)
+
+        self.assertEqual(2, len(records))
+        self.assertEqual({'db': 0.003}, {k: round(v, 6) for k, v in records[0]['phases'].items()})
+        self.assertEqual({}, records[0]['queries'])
+        histograms = Instrumentation.histograms()['/users/:{id}']['GET']
+        self.assertEqual(2, histograms['total']['count'])
+        self.assertEqual(1, histograms['db']['count'])
+
+    def test_db_phase(self):
+        prev_session = getattr(EnchantedMixin, '_db_session', None)
+        prev_executor = getattr(EnchantedMixin, '_executor', None)
+        session = make_sqlite_session(10)
+        executor = ThreadPoolExecutor(2)
+        EnchantedMixin.set_executor(executor)
+        Instrumentation.instrument_engine(session.bind)
+
+        async def scenario():
+            timings = Instrumentation.start()
+            BenchItem.load_by_pk(1)
+            # queries of async methods are run by executor in context of request
+            await BenchItem.aload_by_pk(2)
+            return timings
+
+        try:
+            timings = asyncio.run(scenario())
+            self.assertEqual(2, timings.phases['db'][1])
+            # both loads have the same statement shape
+            self.assertEqual([2], list(timings.queries.values()))
+            self.assertEqual(timings.queries, timings.repeated(1))
+            self.assertEqual({}, timings.repeated(2))
+        finally:
+            session.remove()
+            executor.shutdown()
+            EnchantedMixin.set_db_session(prev_session)
+            EnchantedMixin.set_executor(prev_executor)
+
+    def test_repeated_queries(self):
+        timings = RequestTimings()
+        timings.queries.update({'SELECT 1': 1, 'SELECT * FROM roles WHERE id = ?': 3})
+        with self.assertLogs('m2core.utils.instrumentation', 'WARNING') as logs:
+            Instrumentation.finish(timings, '/users', 'GET', 200, 0.01, repeat_threshold=2)
+        self.assertEqual(1, len(logs.records))
+        self.assertIn('executed 3 times', logs.output[0])
+        self.assertIn('FROM roles', logs.output[0])
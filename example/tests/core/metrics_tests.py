@@ -0,0 +1,72 @@
+__author__ = 'Maxim Dutkin (max@dutkin.ru)'
+
+
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+import fakeredis
+from sqlalchemy import create_engine
+from sqlalchemy.pool import QueuePool
+from tornado.testing import AsyncTestCase, gen_test
+from tornado import gen
+from m2core.data_schemes.redis_system_scheme import redis_scheme
+from m2core.utils.instrumentation import Instrumentation, RequestTimings
+from m2core.utils.metrics import Metrics, LoopLagMonitor, render
+
+
+class MetricsTest(unittest.TestCase):
+    def tearDown(self):
+        Instrumentation.reset()
+
+    def test_merge(self):
+        r = fakeredis.FakeStrictRedis(decode_responses=True)
+        engine = create_engine('sqlite://', poolclass=QueuePool, pool_size=2)
+        executor = ThreadPoolExecutor(2)
+        first = Metrics(engine, r, redis_scheme, executor)
+        second = Metrics(None, r, redis_scheme)
+        second.worker_id = 'other:1'
+
+        timings = RequestTimings()
+        timings.add('db', 0.002)
+        Instrumentation.finish(timings, '/users/:{id:int}', 'GET', 200, 0.004)
+        for metrics in (first, second):
+            metrics.on_request({'route': '/users/:{id:int}', 'method': 'GET', 'status': 200})
+        second.on_request({'route': '/users/:{id:int}', 'method': 'GET', 'status': 404})
+        second.push()
+
+        with engine.connect():
+            text = first.render()
+        executor.shutdown()
+        lines = text.splitlines()
+        self.assertIn('m2core_requests_total{route="/users/:{id:int}",method="GET",status="200"} 2', lines)
+        self.assertIn('m2core_requests_total{route="/users/:{id:int}",method="GET",status="404"} 1', lines)
+        # histograms of both processes are summed
+        self.assertIn('m2core_request_duration_seconds_count{route="/users/:{id:int}",method="GET"} 2', lines)
+        self.assertIn('m2core_request_duration_seconds_bucket{route="/users/:{id:int}",method="GET",le="0.005"} 2',
+                      lines)
+        self.assertIn('m2core_request_phase_seconds_count{route="/users/:{id:int}",method="GET",phase="db"} 2', lines)
+        self.assertIn('m2core_db_pool_checked_out{worker="%s"} 1' % first.worker_id, lines)
+        self.assertIn('m2core_executor_queue_depth{worker="%s"} 0' % first.worker_id, lines)
+        self.assertIn('m2core_ioloop_lag_seconds{worker="other:1"} 0.0', lines)
+
+        # processes, which stopped pushing, are dropped
+        second.interval = first.interval = 0.01
+        time.sleep(0.05)
+        self.assertEqual([first.worker_id], list(first.collect()))
+
+    def test_render_escaping(self):
+        snapshot = {'requests': [['/a"b\\c', 'GET', 200, 1]], 'histograms': [], 'gauges': {}}
+        self.assertIn('route="/a\\"b\\\\c"', render({'w': snapshot}))
+
+
+class LoopLagTest(AsyncTestCase):
+    @gen_test
+    def test_lag(self):
+        monitor = LoopLagMonitor(0.01)
+        monitor.start()
+        yield gen.sleep(0.02)
+        # IOLoop is blocked
+        time.sleep(0.05)
+        yield gen.sleep(0.02)
+        monitor.stop()
+        self.assertGreaterEqual(monitor.max_lag, 0.03)
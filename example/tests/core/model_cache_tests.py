@@ -0,0 +1,181 @@
+__author__ = 'Maxim Dutkin (max@dutkin.ru)'
+
+
+import datetime
+import unittest
+import fakeredis
+from sqlalchemy import event
+from m2core import M2Core
+from m2core.bases.base_model import EnchantedMixin
+from m2core.common.options import options
+from m2core.data_schemes.redis_system_scheme import redis_scheme
+from m2core.utils.error import M2Error
+from m2core.utils.model_cache import ModelCache, RowCodec
+from example.tests.helpers import make_sqlite_session, BenchItem
+
+
+class ModelCacheTest(unittest.TestCase):
+    def test_codec(self):
+        codec = RowCodec(BenchItem.__mapper__)
+        row = {'id': 1, 'name': 'x', 'value': 2, 'created': datetime.datetime(2017, 6, 29, 16, 18, 37), 'owner_id': None}
+        self.assertEqual(row, codec.loads(codec.dumps(row)))
+
+    def check_cache(self, cache: ModelCache):
+        self.assertIsNone(cache.get('users', (1, )))
+        cache.set('users', (1, ), '{"id": 1}')
+        cache.set('users', (2, ), '{"id": 2}')
+        cache.set_pk('users', 'email', 'a@b.c', (1, ))
+        self.assertEqual('{"id": 1}', cache.get('users', (1, )))
+        self.assertEqual((1, ), cache.get_pk('users', 'email', 'a@b.c'))
+
+        cache.invalidate('users', [(1, )])
+        self.assertIsNone(cache.get('users', (1, )))
+        self.assertEqual('{"id": 2}', cache.get('users', (2, )))
+        cache.invalidate('users')
+        self.assertIsNone(cache.get('users', (2, )))
+        self.assertIsNone(cache.get_pk('users', 'email', 'a@b.c'))
+
+    def test_storage_of_workers(self):
+        storages = options.response_cache_storage, options.model_cache_storage
+        try:
+            options.response_cache_storage = options.model_cache_storage = 'local'
+            # called by `M2Core.run` before forking workers
+            M2Core._M2Core__share_caches()
+            self.assertEqual(('both', 'both'), (options.response_cache_storage, options.model_cache_storage))
+            options.model_cache_storage = 'redis'
+            M2Core._M2Core__share_caches()
+            self.assertEqual('redis', options.model_cache_storage)
+        finally:
+            options.response_cache_storage, options.model_cache_storage = storages
+
+    def test_storages(self):
+        self.check_cache(ModelCache('local'))
+        r = fakeredis.FakeStrictRedis(decode_responses=True)
+        self.check_cache(ModelCache('redis', redis_connector=r, redis_scheme=redis_scheme))
+        self.check_cache(ModelCache('both', redis_connector=r, redis_scheme=redis_scheme))
+
+        with self.assertRaises(M2Error):
+            ModelCache('both')
+        with self.assertRaises(M2Error):
+            ModelCache('unknown')
+
+    def test_invalidation_message(self):
+        r = fakeredis.FakeStrictRedis(decode_responses=True)
+        pubsub = r.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe('invalidation')
+        cache = ModelCache('both', redis_connector=r, redis_scheme=redis_scheme, channel='invalidation')
+        other_process = ModelCache('both', redis_connector=r, redis_scheme=redis_scheme, channel='invalidation')
+        cache.set('users', (1, ), '{"id": 1}')
+        self.assertEqual('{"id": 1}', other_process.get('users', (1, )))
+
+        cache.invalidate('users', [(1, )])
+        # local entry of other process lives until invalidation message is applied
+        self.assertIsNotNone(other_process.local.get('users:0:1'))
+        # the first call reads subscription confirmation, which is ignored
+        message = pubsub.get_message(timeout=1) or pubsub.get_message(timeout=1)
+        other_process.apply_invalidation(message['data'])
+        self.assertIsNone(other_process.get('users', (1, )))
+
+        # all rows of table are dropped by new generation, keys are not scanned
+        cache.set('users', (2, ), '{"id": 2}')
+        self.assertEqual('{"id": 2}', other_process.get('users', (2, )))
+        cache.invalidate('users')
+        self.assertEqual('1', r.hget(redis_scheme['MODEL_CACHE_GENERATIONS']['prefix'], 'users'))
+        self.assertEqual('{"id": 2}', other_process.get('users', (2, )))
+        other_process.apply_invalidation(pubsub.get_message(timeout=1)['data'])
+        self.assertIsNone(other_process.get('users', (2, )))
+        # new process takes generation from Redis
+        self.assertIsNone(ModelCache('both', redis_connector=r, redis_scheme=redis_scheme).get('users', (2, )))
+
+
+class DataMixinCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.prev_session = getattr(EnchantedMixin, '_db_session', None)
+        self.prev_cache = EnchantedMixin.model_cache
+        self.session = make_sqlite_session(10)
+        self.cache = ModelCache('local')
+        EnchantedMixin.set_model_cache(self.cache)
+        BenchItem.__cache__ = {'unique': ('name', )}
+        self.queries = 0
+        event.listen(self.session.bind, 'before_cursor_execute', self.count_query)
+
+    def tearDown(self):
+        del BenchItem.__cache__
+        event.remove(self.session.bind, 'before_cursor_execute', self.count_query)
+        self.session.remove()
+        EnchantedMixin.set_db_session(self.prev_session)
+        EnchantedMixin.set_model_cache(self.prev_cache)
+
+    def count_query(self, *args):
+        self.queries += 1
+
+    def test_load_by_pk(self):
+        item = BenchItem.load_by_pk(1)
+        self.assertEqual(1, self.queries)
+        # identity map expired on every request (`expire_on_connect`) and new session of request
+        self.session.expire_all()
+        self.assertIs(item, BenchItem.load_by_pk(1))
+        self.session.remove()
+        cached = BenchItem.load_by_pk(1)
+        self.assertEqual(1, self.queries)
+        self.assertEqual(item.data(max_level=0), cached.data(max_level=0))
+        self.assertIsInstance(cached.created, datetime.datetime)
+        self.assertIs(cached, BenchItem.load_by_params(id=1))
+
+        # cached models are persistent and can be changed
+        cached.set_and_save(value=100)
+        self.session.remove()
+        self.assertEqual(100, BenchItem.load_by_pk(1).value)
+        self.assertIsNone(BenchItem.load_by_pk(1000))
+
+        stats = self.cache.stats()['tables']['bench_items']
+        self.assertEqual(2, stats['hits'])
+        self.assertEqual(3, stats['misses'])
+
+    def test_load_by_unique(self):
+        self.assertEqual(3, BenchItem.load_by_params(name='item 2').id)
+        queries = self.queries
+        self.session.remove()
+        self.assertEqual(3, BenchItem.load_by_params(name='item 2').id)
+        self.assertEqual(queries, self.queries)
+
+        # mapping of old value is checked
+        BenchItem.load_by_pk(3).set_and_save(name='renamed')
+        self.session.remove()
+        self.assertIsNone(BenchItem.load_by_params(name='item 2'))
+        self.assertEqual(3, BenchItem.load_by_params(name='renamed').id)
+
+        # not unique columns and several params are not cached
+        queries = self.queries
+        BenchItem.load_by_params(value=4)
+        BenchItem.load_by_params(name='renamed', value=2)
+        self.assertEqual(queries + 2, self.queries)
+
+    def test_invalidation(self):
+        BenchItem.load_by_pk(1)
+        BenchItem.load_by_pk(2)
+        self.assertEqual(2, len(self.cache.local))
+
+        BenchItem.load_by_pk(1).delete()
+        self.assertEqual(1, len(self.cache.local))
+        self.assertIsNone(BenchItem.load_by_pk(1))
+
+        BenchItem.q.filter(BenchItem.id == 2).update({'value': 200})
+        self.assertIsNone(self.cache.get('bench_items', (2, )))
+        # rows cached in transaction are dropped when it ends
+        self.session.expire_all()
+        BenchItem.load_by_pk(2)
+        self.assertIsNotNone(self.cache.get('bench_items', (2, )))
+        self.session.rollback()
+        self.assertIsNone(self.cache.get('bench_items', (2, )))
+
+        # inserted rows don't drop cached ones
+        BenchItem.load_by_pk(4)
+        self.session.commit()
+        BenchItem.create_many([{'name': 'new'}])
+        self.assertIsNotNone(self.cache.get('bench_items', (4, )))
+
+        BenchItem.load_by_pk(3)
+        BenchItem.update_many([{'id': 3, 'value': 300}])
+        self.session.remove()
+        self.assertEqual(300, BenchItem.load_by_pk(3).value)
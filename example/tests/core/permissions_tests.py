@@ -3,7 +3,8 @@ __author__ = 'Maxim Dutkin (max@dutkin.ru)'
 
 import unittest
 from m2core import M2Core
-from m2core.common import Permission, And, Or, Not, PermissionsEnum
+from tornado.web import RequestHandler
+from m2core.common import Permission, And, Or, Not, PermissionsEnum, Rules, compile_rule
 from m2core.data_schemes.db_system_scheme import M2PermissionCheckMixin
 
 
@@ -161,6 +162,51 @@ class PermissionsTest(unittest.TestCase):
                 msg=f'Error in {num} sample'
             )
 
+    def test_compiled(self):
+        for num, (sample, right_result, true_perm_set, false_perm_set) in enumerate(self.sample_set):
+            compiled = compile_rule(sample)
+            self.assertTrue(compiled(PermissionsEnum.mask(true_perm_set)), msg=f'Error in {num} sample')
+            self.assertFalse(compiled(PermissionsEnum.mask(frozenset(false_perm_set))), msg=f'Error in {num} sample')
+            self.assertEqual(sample(set()), compiled(0), msg=f'Error in {num} sample')
+        self.assertIsNone(compile_rule(PermissionsEnum.SKIP))
+
+    def test_not_permission_members(self):
+        names = {p.sys_name for p in PermissionsEnum.all_platform_permissions}
+        self.assertIsNone(PermissionsEnum.mask(names))
+        self.assertIsNone(PermissionsEnum.mask(frozenset(names)))
+        self.assertIsNone(PermissionsEnum.mask({self.pp1.Perm1, 'PERM_2'}))
+
+        rules = Rules(lambda: {'validator': None, 'docs': {}, 'permissions': {}, 'compiled': {}, 'group': None})
+
+        class Handler(RequestHandler):
+            def get(self):
+                pass
+        rules.add_meta('/route', Handler, None, {'get': self.pp1.Perm1})
+        self.assertEqual({}, rules.permitted_routes(names))
+
+    def test_permitted_routes(self):
+        class Handler(RequestHandler):
+            def get(self):
+                pass
+
+            def post(self):
+                pass
+
+            def delete(self):
+                pass
+
+        rules = Rules(lambda: {'validator': None, 'docs': {}, 'permissions': {}, 'compiled': {}, 'group': None})
+        for num, (sample, right_result, true_perm_set, false_perm_set) in enumerate(self.sample_set):
+            rules.add_meta(f'/route{num}', Handler, None, {'get': sample, 'delete': None})
+
+        for num, (sample, right_result, true_perm_set, false_perm_set) in enumerate(self.sample_set):
+            for user_permissions in (true_perm_set, frozenset(false_perm_set), frozenset(false_perm_set)):
+                permitted = rules.permitted_routes(user_permissions)
+                for route in rules:
+                    expected = sorted(method for method, p in rules[route]['permissions'].items()
+                                      if p is not None and p(user_permissions))
+                    self.assertEqual(expected, sorted(permitted.get(route, [])), msg=f'Error in {num} sample')
+
     def test_and(self):
         perm = self.pp1.Perm1 & self.pp1.Perm2 & self.pp1.Perm3 & self.pp1.Perm4
         user = User({self.pp1.Perm1, self.pp1.Perm2, self.pp1.Perm3, self.pp1.Perm4})
@@ -0,0 +1,59 @@
+__author__ = 'Maxim Dutkin (max@dutkin.ru)'
+
+
+import threading
+import time
+import unittest
+from m2core.bases import BaseHandler
+from m2core.utils.error import M2Error
+from m2core.utils.profiler import SamplingProfiler
+
+
+class BusyHandler(BaseHandler):
+    def get(self, seconds: float):
+        busy_loop(seconds)
+
+
+def busy_loop(seconds: float):
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        pass
+
+
+class SamplingProfilerTest(unittest.TestCase):
+    def test_routes(self):
+        handler = BusyHandler.__new__(BusyHandler)
+        handler.human_route = '/busy/{id:int}'
+        thread = threading.Thread(target=handler.get, args=(0.3, ), name='busy worker')
+        profiler = SamplingProfiler(interval=0.002)
+        profiler.start()
+        thread.start()
+        thread.join()
+        profiler.stop()
+
+        self.assertFalse(profiler.running)
+        self.assertGreater(profiler.count, 10)
+        self.assertGreater(profiler.routes()['/busy/{id:int}'], 10)
+        lines = profiler.collapsed('/busy/{id:int}').splitlines()
+        self.assertTrue(lines)
+        stack, count = lines[0].rsplit(' ', 1)
+        frames = stack.split(';')
+        self.assertEqual('/busy/{id:int}', frames[0])
+        self.assertIn('%s:BusyHandler.get' % __name__, frames)
+        self.assertEqual('%s:busy_loop' % __name__, frames[-1])
+        self.assertGreater(int(count), 0)
+        # stacks of no handler are grouped by thread names
+        self.assertTrue(any(route.startswith('<') for route in profiler.routes()))
+        self.assertNotIn('<m2core-profiler>', profiler.routes())
+
+    def test_one_at_a_time(self):
+        profiler = SamplingProfiler()
+        profiler.start()
+        try:
+            with self.assertRaises(M2Error):
+                SamplingProfiler().start()
+        finally:
+            profiler.stop()
+        other = SamplingProfiler()
+        other.start()
+        other.stop()
@@ -0,0 +1,41 @@
+__author__ = 'Maxim Dutkin (max@dutkin.ru)'
+
+
+import asyncio
+import unittest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker, scoped_session
+from m2core.db import request_scope
+
+
+class RequestScopeTest(unittest.TestCase):
+    def setUp(self):
+        self.session = scoped_session(sessionmaker(bind=create_engine('sqlite://')),
+                                      scopefunc=request_scope.scope_func)
+
+    def tearDown(self):
+        self.session.remove()
+
+    def test_isolated_sessions(self):
+        async def request():
+            scope = request_scope.enter_scope()
+            session = self.session()
+            await asyncio.sleep(0)
+            # concurrent request doesn't replace our session
+            self.assertIs(session, self.session())
+            return scope, session
+
+        async def scenario():
+            return await asyncio.gather(request(), request())
+
+        (scope1, session1), (scope2, session2) = asyncio.run(scenario())
+        self.assertNotEqual(scope1, scope2)
+        self.assertIsNot(session1, session2)
+        # outside of requests session is scoped by thread
+        self.assertIsNone(request_scope.current_scope())
+        self.assertIsNot(session1, self.session())
+        self.assertIs(self.session(), self.session())
+
+        request_scope.remove_scope(self.session, scope1)
+        request_scope.remove_scope(self.session, scope2)
+        self.assertEqual(1, len(self.session.registry.registry))
@@ -0,0 +1,55 @@
+__author__ = 'Maxim Dutkin (max@dutkin.ru)'
+
+
+import unittest
+import fakeredis
+from m2core.common.permissions import Permission
+from m2core.data_schemes.redis_system_scheme import redis_scheme
+from m2core.utils.error import M2Error
+from m2core.utils.response_cache import ResponseCache, permissions_key
+
+
+class ResponseCacheTest(unittest.TestCase):
+    def check_cache(self, cache: ResponseCache):
+        key = cache.key('/users', 'GET', {'id': 1}, {'q': [b'1']}, None, ('users', ))
+        self.assertEqual(key, cache.key('/users', 'GET', {'id': 1}, {'q': [b'1']}, None, ('users', )))
+        self.assertNotEqual(key, cache.key('/users', 'GET', {'id': 2}, {'q': [b'1']}, None, ('users', )))
+        self.assertIsNone(cache.get(key))
+
+        etag = cache.set(key, b'{"data":1}')
+        self.assertEqual((etag, b'{"data":1}'), cache.get(key))
+        self.assertTrue(etag.startswith('"'))
+
+        cache.invalidate('users')
+        self.assertNotEqual(key, cache.key('/users', 'GET', {'id': 1}, {'q': [b'1']}, None, ('users', )))
+        return key
+
+    def test_local(self):
+        self.check_cache(ResponseCache('local'))
+
+    def test_redis(self):
+        r = fakeredis.FakeStrictRedis(decode_responses=True)
+        self.check_cache(ResponseCache('redis', redis_connector=r, redis_scheme=redis_scheme))
+
+        self.check_cache(ResponseCache('both', redis_connector=r, redis_scheme=redis_scheme))
+
+        # responses and tag versions are shared by processes
+        cache = ResponseCache('both', redis_connector=r, redis_scheme=redis_scheme)
+        other_process = ResponseCache('both', redis_connector=r, redis_scheme=redis_scheme)
+        key = cache.key('/items', 'GET', {}, {}, ('READ', ), ('items', ))
+        cache.set(key, b'{"data":2}')
+        self.assertEqual(key, other_process.key('/items', 'GET', {}, {}, ('READ', ), ('items', )))
+        self.assertEqual(cache.get(key), other_process.get(key))
+        other_process.invalidate('items')
+        self.assertNotEqual(key, cache.key('/items', 'GET', {}, {}, ('READ', ), ('items', )))
+
+        with self.assertRaises(M2Error):
+            ResponseCache('redis')
+        with self.assertRaises(M2Error):
+            ResponseCache('unknown')
+
+    def test_permissions_key(self):
+        read, write = Permission('read'), Permission('write')
+        self.assertEqual(('READ', 'WRITE'), permissions_key({write, read}))
+        self.assertEqual(permissions_key({write, read}), permissions_key(frozenset([read, write])))
+        self.assertIsNone(permissions_key(None))
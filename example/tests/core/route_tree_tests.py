@@ -0,0 +1,66 @@
+__author__ = 'Maxim Dutkin (max@dutkin.ru)'
+
+
+import unittest
+from tornado.httputil import HTTPServerRequest
+from tornado.routing import Rule, AnyMatches
+from tornado.web import Application, RequestHandler
+from m2core.bases import BaseHandler
+from m2core.utils.route_tree import RouteTree
+from m2core.utils.url_parser import UrlParser
+
+
+def handler(name: str, base=BaseHandler):
+    return type(name, (base, ), {})
+
+
+ROUTES = [
+    ('/users', handler('Users')),
+    ('/users/:{id:int}', handler('User')),
+    ('/users/me', handler('Me')),
+    ('/users/:{name}', handler('UserByName')),
+    ('/users/:{id:int}/flags/:{flag:bool}', handler('Flag')),
+    ('/users/:{id:int}/score/:{score:float}', handler('Score')),
+    ('/files/:{name:string(0,[a;b])}-:{version:int}', handler('File')),
+    ('/static/(.*)', handler('Static', RequestHandler)),
+    ('/plain/:{id:int}', handler('Plain', RequestHandler)),
+    ('/static/fixed', handler('StaticFixed')),
+]
+
+
+class RouteTreeTest(unittest.TestCase):
+    def setUp(self):
+        parsers = [UrlParser(route) for route, handler_cls in ROUTES]
+        endpoints = [(parser.tornado_url(), handler_cls, {}) for parser, (route, handler_cls) in zip(parsers, ROUTES)]
+        self.regex_app = Application(endpoints)
+        self.tree_app = Application([])
+        self.tree_app.wildcard_router.add_rules([
+            Rule(AnyMatches(), RouteTree(self.tree_app, endpoints, parsers, typed_handlers=(BaseHandler, )))
+        ])
+
+    @staticmethod
+    def dispatch(app, path: str) -> tuple:
+        delegate = app.find_handler(HTTPServerRequest(uri=path))
+        return delegate.handler_class.__name__, delegate.path_args, delegate.path_kwargs
+
+    def test_same_as_tornado(self):
+        paths = ['/users', '/users/', '/users/5', '/users/me', '/users/bob', '/users/5/flags/1', '/users/5/flags/2',
+                 '/users/5/score/1.5', '/users/5/score/1,5', '/files/a-3', '/files/c-3', '/static/a/b.css',
+                 '/static/fixed', '/plain/7', '/users/%D0%B8%D0%BC%D1%8F', '/unknown', '/users/5/flags']
+        for path in paths:
+            name, args, kwargs = self.dispatch(self.regex_app, path)
+            tree_name, tree_args, tree_kwargs = self.dispatch(self.tree_app, path)
+            self.assertEqual((name, args, kwargs.keys()), (tree_name, tree_args, tree_kwargs.keys()), msg=path)
+
+    def test_typed_params(self):
+        self.assertEqual(('User', [], {'id': 5}), self.dispatch(self.tree_app, '/users/5'))
+        self.assertEqual(('UserByName', [], {'name': 'имя'}),
+                         self.dispatch(self.tree_app, '/users/%D0%B8%D0%BC%D1%8F'))
+        self.assertEqual(('Flag', [], {'id': 5, 'flag': True}), self.dispatch(self.tree_app, '/users/5/flags/1'))
+        self.assertEqual(('Score', [], {'id': 5, 'score': 1.5}), self.dispatch(self.tree_app, '/users/5/score/1.5'))
+        # wrong float is left for url validator
+        self.assertEqual(('Score', [], {'id': 5, 'score': '1,5'}), self.dispatch(self.tree_app, '/users/5/score/1,5'))
+        self.assertEqual(('File', [], {'name': 'a', 'version': 3}), self.dispatch(self.tree_app, '/files/a-3'))
+        # other handlers get params as Tornado gives them
+        self.assertEqual(('Plain', [], {'id': b'7'}), self.dispatch(self.tree_app, '/plain/7'))
+        self.assertEqual(('Static', [b'a/b.css'], {}), self.dispatch(self.tree_app, '/static/a/b.css'))
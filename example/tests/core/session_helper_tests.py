@@ -0,0 +1,156 @@
+__author__ = 'Maxim Dutkin (max@dutkin.ru)'
+
+
+import asyncio
+import unittest
+import fakeredis
+from m2core.data_schemes.redis_system_scheme import redis_scheme
+from m2core.utils.cache import LRUCache
+from m2core.utils.session_helper import SessionHelper, AsyncSessionHelper
+from example.tests.helpers import CountingRedis
+
+
+class NamesSessionHelper(SessionHelper):
+    @staticmethod
+    def _load_permissions(permission_names) -> set:
+        return set(permission_names)
+
+
+class NamesAsyncSessionHelper(AsyncSessionHelper):
+    @staticmethod
+    def _load_permissions(permission_names) -> set:
+        return set(permission_names)
+
+
+class SessionHelperTest(unittest.TestCase):
+    def setUp(self):
+        self.r = fakeredis.FakeStrictRedis(decode_responses=True)
+        self.r.set(redis_scheme['ACCESS_TOKENS_BY_HASH']['prefix'] % 'token1', 1)
+        self.r.sadd(redis_scheme['USER_ROLES']['prefix'] % 1, 1, 2)
+        self.r.sadd(redis_scheme['ROLE_PERMISSIONS']['prefix'] % 1, 'PERM1', 'PERM2')
+        self.r.sadd(redis_scheme['ROLE_PERMISSIONS']['prefix'] % 2, 'PERM2', 'PERM3')
+        self.r.set(redis_scheme['ACCESS_TOKENS_BY_HASH']['prefix'] % 'token2', 2)
+
+    def test_resolvers(self):
+        for resolver in SessionHelper.RESOLVERS:
+            user = NamesSessionHelper(self.r, redis_scheme).resolve('token1', resolver)
+            self.assertEqual(
+                {'id': 1, 'access_token': 'token1', 'permissions': {'PERM1', 'PERM2', 'PERM3'}},
+                user,
+                msg=f'Error in `{resolver}` resolver'
+            )
+
+            # user without roles
+            user = NamesSessionHelper(self.r, redis_scheme).resolve('token2', resolver)
+            self.assertEqual({'id': 2, 'access_token': 'token2', 'permissions': set()}, user,
+                             msg=f'Error in `{resolver}` resolver')
+
+            # unknown token
+            user = NamesSessionHelper(self.r, redis_scheme).resolve('token3', resolver)
+            self.assertEqual({'id': None, 'access_token': 'token3', 'permissions': set()}, user,
+                             msg=f'Error in `{resolver}` resolver')
+
+    def test_unknown_resolver(self):
+        with self.assertRaises(AttributeError):
+            SessionHelper(self.r, redis_scheme).resolve('token1', 'unknown')
+
+    def test_cache(self):
+        SessionHelper.set_cache(LRUCache(10, 60))
+        try:
+            cache = SessionHelper.cache()
+            user = NamesSessionHelper(self.r, redis_scheme).resolve('token1')
+            self.assertEqual(1, cache.misses)
+            # permissions are changed in Redis, but user is taken from cache
+            self.r.sadd(redis_scheme['ROLE_PERMISSIONS']['prefix'] % 1, 'PERM4')
+            self.assertEqual(user, NamesSessionHelper(self.r, redis_scheme).resolve('token1'))
+            self.assertEqual(1, cache.hits)
+
+            # role permissions dump drops all cached users
+            NamesSessionHelper(self.r, redis_scheme).dump_role_permissions(1, ['PERM1', 'PERM2', 'PERM4'])
+            user = NamesSessionHelper(self.r, redis_scheme).resolve('token1')
+            self.assertEqual({'PERM1', 'PERM2', 'PERM3', 'PERM4'}, user['permissions'])
+
+            # user roles dump drops only user's tokens
+            NamesSessionHelper(self.r, redis_scheme).resolve('token2')
+            self.assertEqual(2, len(cache))
+            NamesSessionHelper(self.r, redis_scheme).dump_user_roles(1, [2])
+            self.assertEqual(1, len(cache))
+            user = NamesSessionHelper(self.r, redis_scheme).resolve('token1')
+            self.assertEqual({'PERM2', 'PERM3'}, user['permissions'])
+
+            # logout drops token
+            session = NamesSessionHelper(self.r, redis_scheme)
+            session.resolve('token1')
+            session.logout()
+            user = NamesSessionHelper(self.r, redis_scheme).resolve('token1')
+            self.assertIsNone(user['id'])
+        finally:
+            SessionHelper.set_cache(None)
+
+    def test_resolve_round_trips(self):
+        r = CountingRedis(decode_responses=True)
+        r.set(redis_scheme['ACCESS_TOKENS_BY_HASH']['prefix'] % 'token1', 1)
+        r.sadd(redis_scheme['USER_ROLES']['prefix'] % 1, *range(10))
+        for role_id in range(10):
+            r.sadd(redis_scheme['ROLE_PERMISSIONS']['prefix'] % role_id, 'PERM%s' % role_id)
+
+        CountingRedis.round_trips = 0
+        NamesSessionHelper(r, redis_scheme).resolve('token1', 'batched')
+        self.assertEqual(3, CountingRedis.round_trips)
+
+        # script is loaded to server by the first call, then the same `Script` is used by all helpers
+        NamesSessionHelper(r, redis_scheme).resolve('token1', 'script')
+        script = NamesSessionHelper._script
+        CountingRedis.round_trips = 0
+        user = NamesSessionHelper(r, redis_scheme).resolve('token1', 'script')
+        self.assertEqual(1, CountingRedis.round_trips)
+        self.assertIs(script, NamesSessionHelper._script)
+        self.assertEqual(10, len(user['permissions']))
+
+        # registered script works with other clients too
+        user = NamesSessionHelper(self.r, redis_scheme).resolve('token1', 'script')
+        self.assertEqual({'PERM1', 'PERM2', 'PERM3'}, user['permissions'])
+
+    def test_dump_round_trips(self):
+        r = CountingRedis(decode_responses=True)
+        role_key = redis_scheme['ROLE_PERMISSIONS']['prefix'] % 1
+        user_key = redis_scheme['USER_ROLES']['prefix'] % 1
+        r.sadd(role_key, 'STALE', 'PERM1')
+        r.sadd(user_key, 1, 2)
+
+        # whole set is replaced in one round trip regardless of it's size
+        permissions = ['PERM%s' % i for i in range(1000)]
+        CountingRedis.round_trips = 0
+        SessionHelper(r, redis_scheme).dump_role_permissions(1, permissions)
+        self.assertEqual(1, CountingRedis.round_trips)
+        self.assertEqual(set(permissions), r.smembers(role_key))
+
+        CountingRedis.round_trips = 0
+        SessionHelper(r, redis_scheme).dump_user_roles(1, [3])
+        self.assertEqual(1, CountingRedis.round_trips)
+        self.assertEqual({'3'}, r.smembers(user_key))
+        SessionHelper(r, redis_scheme).dump_user_roles(1, [])
+        self.assertFalse(r.exists(user_key))
+
+    def test_async_helper(self):
+        async def check():
+            r = fakeredis.FakeAsyncRedis(decode_responses=True)
+            session = NamesAsyncSessionHelper(r, redis_scheme)
+            token = (await session.generate_token(1))['access_token']
+            await session.dump_user_roles(1, [1])
+            await session.dump_role_permissions(1, ['PERM1', 'PERM2'])
+            for resolver in SessionHelper.RESOLVERS:
+                user = await NamesAsyncSessionHelper(r, redis_scheme).resolve(token, resolver)
+                self.assertEqual({'id': 1, 'access_token': token, 'permissions': {'PERM1', 'PERM2'}}, user,
+                                 msg=f'Error in `{resolver}` resolver')
+
+            session = NamesAsyncSessionHelper(r, redis_scheme)
+            await session.init_user(token)
+            new_token = (await session.update_token())['access_token']
+            self.assertIsNone((await NamesAsyncSessionHelper(r, redis_scheme).resolve(token))['id'])
+            session = NamesAsyncSessionHelper(r, redis_scheme)
+            self.assertEqual(1, (await session.resolve(new_token))['id'])
+            await session.logout()
+            self.assertIsNone((await NamesAsyncSessionHelper(r, redis_scheme).resolve(new_token))['id'])
+
+        asyncio.run(check())
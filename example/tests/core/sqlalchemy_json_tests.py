@@ -0,0 +1,48 @@
+__author__ = 'Maxim Dutkin (max@dutkin.ru)'
+
+
+import json
+import datetime
+import unittest
+from m2core.db.sqlalchemy_json import AlchemyJSONEncoder, encode_json, register_json_backend, json_backends
+from m2core.utils.error import M2Error
+from example.tests.helpers import BenchItem
+
+
+class EncodeJSONTest(unittest.TestCase):
+    def setUp(self):
+        self.payload = {
+            'meta': {'code': 200, 'msg': 'OK'},
+            'data': [
+                {'html': '<script>alert(1)</script>', 'created': datetime.datetime(2018, 1, 2, 3, 4, 5, 6)},
+                {'day': datetime.date(2018, 1, 2), 'raw': b'bytes', 1: None},
+                BenchItem(id=1, name='item', value=10),
+            ]
+        }
+
+    def test_stdlib_output_is_unchanged(self):
+        expected = json.dumps(self.payload, indent=2, cls=AlchemyJSONEncoder).replace('</', '<\\/')
+        self.assertEqual(expected, encode_json(self.payload, 2))
+
+    def test_backends(self):
+        for backend in ('json', 'orjson'):
+            for indent in (0, 2):
+                encoded = encode_json(self.payload, indent, backend)
+                if isinstance(encoded, bytes):
+                    encoded = encoded.decode()
+                self.assertNotIn('</', encoded, msg=f'Error in `{backend}` backend')
+                self.assertEqual(indent == 0, '\n' not in encoded, msg=f'Error in `{backend}` backend')
+                data = json.loads(encoded)['data']
+                self.assertEqual('<script>alert(1)</script>', data[0]['html'])
+                self.assertEqual('2018-01-02T03:04:05.000006', data[0]['created'])
+                self.assertEqual({'day': '2018-01-02', 'raw': 'bytes', '1': None}, data[1])
+                self.assertEqual({'id': 1, 'name': 'item', 'value': 10}, {k: data[2][k] for k in ('id', 'name', 'value')})
+
+    def test_custom_backend(self):
+        register_json_backend('custom', lambda obj, indent: 'custom')
+        try:
+            self.assertEqual('custom', encode_json({}, backend='custom'))
+        finally:
+            del json_backends['custom']
+        with self.assertRaises(M2Error):
+            encode_json({}, backend='custom')
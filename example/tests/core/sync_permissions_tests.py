@@ -0,0 +1,111 @@
+__author__ = 'Maxim Dutkin (max@dutkin.ru)'
+
+
+import unittest
+import fakeredis
+from sqlalchemy import event
+from m2core.m2core import sync_permissions, dump_roles
+from m2core.common.options import options
+from m2core.common.permissions import PermissionsEnum, Permission, compile_rule
+from m2core.bases.base_model import EnchantedMixin
+from m2core.data_schemes.redis_system_scheme import redis_scheme
+from m2core.data_schemes.db_system_scheme import M2Role, M2Permission, M2RolePermission
+from m2core.utils.session_helper import SessionHelper
+from example.tests.helpers import make_sqlite_session, create_system_tables
+
+
+class SyncPermissionsTest(unittest.TestCase):
+    def setUp(self):
+        self.prev_session = getattr(EnchantedMixin, '_db_session', None)
+        self.prev_redis = getattr(EnchantedMixin, '_redis_session', None)
+        self.prev_sh = getattr(EnchantedMixin, '_sh_cls', None)
+        self.session = make_sqlite_session(0)
+        create_system_tables(self.session)
+        self.r = fakeredis.FakeStrictRedis(decode_responses=True)
+        EnchantedMixin.set_redis_session({'connector': self.r, 'scheme': redis_scheme})
+        EnchantedMixin.set_sh(SessionHelper)
+
+    def tearDown(self):
+        self.session.remove()
+        EnchantedMixin.set_db_session(self.prev_session)
+        EnchantedMixin.set_redis_session(self.prev_redis)
+        EnchantedMixin.set_sh(self.prev_sh)
+        # index of test DB is rebuilt from real DB on next use
+        M2Permission.reset_index()
+
+    def role_permissions(self, role_name: str) -> set:
+        return set(M2Role.load_by_params(name=role_name).get_role_permissions())
+
+    def test_sync(self):
+        platform_permissions = {p.sys_name for p in PermissionsEnum.all_platform_permissions}
+        for _ in range(2):
+            sync_permissions()
+            self.assertEqual(platform_permissions | {options.default_permission},
+                             {p.get('system_name') for p in M2Permission.all()})
+            self.assertEqual(platform_permissions, self.role_permissions(options.admin_role_name))
+            self.assertEqual({options.default_permission}, self.role_permissions(options.default_role_name))
+            self.assertEqual(2, len(M2Role.all()))
+        self.assertEqual(len(platform_permissions) + 1, len(M2RolePermission.all()))
+        self.assertEqual(platform_permissions, set(M2Permission.index().keys()))
+
+    def test_dump_roles(self):
+        sync_permissions()
+        empty_role = M2Role.create(name='empty')
+        key = redis_scheme['ROLE_PERMISSIONS']['prefix']
+        self.r.sadd(key % empty_role.get('id'), 'STALE')
+
+        dump_roles()
+        for role in M2Role.all():
+            self.assertEqual(set(role.get_role_permissions()), self.r.smembers(key % role.get('id')))
+        self.assertEqual(set(), self.r.smembers(key % empty_role.get('id')))
+
+    def login(self, token: str, role_names: list):
+        self.r.set(redis_scheme['ACCESS_TOKENS_BY_HASH']['prefix'] % token, 1)
+        SessionHelper(self.r, redis_scheme).dump_user_roles(
+            1, [M2Role.load_by_params(name=name).get('id') for name in role_names]
+        )
+
+    def test_resolve_without_sql(self):
+        sync_permissions()
+        dump_roles()
+        self.login('token', [options.admin_role_name])
+        # index is built once at startup
+        M2Permission.index()
+
+        statements = []
+        event.listen(self.session.bind, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+        for resolver in SessionHelper.RESOLVERS:
+            user = SessionHelper(self.r, redis_scheme).resolve('token', resolver)
+            self.assertEqual({p.sys_name for p in PermissionsEnum.all_platform_permissions},
+                             {p.sys_name for p in user['permissions']}, msg=f'Error in `{resolver}` resolver')
+            # permissions are members of `PermissionsEnum` from index, not DB rows
+            self.assertEqual(set(M2Permission.index().values()), user['permissions'],
+                             msg=f'Error in `{resolver}` resolver')
+        self.assertEqual([], statements)
+
+    def test_set_permissions(self):
+        class PlatformPermissions(PermissionsEnum):
+            VIEW_REPORTS = Permission('View reports')
+            EDIT_REPORTS = Permission('Edit reports')
+
+        sync_permissions()
+        dump_roles()
+        self.login('token', [options.default_role_name])
+        role = M2Role.load_by_params(name=options.default_role_name)
+        # stale index is rebuilt when permissions of role are changed
+        M2Permission.reset_index({})
+
+        role.set_permissions([PlatformPermissions.VIEW_REPORTS.sys_name])
+        self.assertIs(PlatformPermissions.VIEW_REPORTS, M2Permission.index()[PlatformPermissions.VIEW_REPORTS.sys_name])
+        self.assertEqual({p.sys_name for p in PermissionsEnum.all_platform_permissions}, set(M2Permission.index()))
+        user = SessionHelper(self.r, redis_scheme).resolve('token')
+        self.assertEqual({PlatformPermissions.VIEW_REPORTS}, user['permissions'])
+
+        # rules are matched against resolved permissions, compiled or not
+        for rule, expected in ((PlatformPermissions.VIEW_REPORTS, True),
+                               (PlatformPermissions.EDIT_REPORTS, False),
+                               (PlatformPermissions.VIEW_REPORTS & ~PlatformPermissions.EDIT_REPORTS, True),
+                               (PlatformPermissions.VIEW_REPORTS & PlatformPermissions.EDIT_REPORTS, False)):
+            self.assertEqual(expected, rule(user['permissions']), msg=f'Error in {rule} rule')
+            self.assertEqual(expected, compile_rule(rule)(PermissionsEnum.mask(user['permissions'])),
+                             msg=f'Error in {rule} rule')
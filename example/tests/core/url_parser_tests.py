@@ -103,3 +103,32 @@ class UrlParserTest(unittest.TestCase, RESTTest):
                     raise Exception('normally you can\'t get there')
             except AttributeError:
                 continue
+
+    def test_fast_validator(self):
+        def outcome(validate, params):
+            try:
+                return 'ok', validate(params)
+            except Error as e:
+                return type(e), str(e), [(type(error), error.path) for error in getattr(e, 'errors', [])]
+
+        parser = UrlParser('/users/:{a:int}/:{b:bool}/:{c}/:{d:float}/:{e:string}')
+        self.assertIs(parser.validator_schema(), parser.validator_schema())
+        cases = [
+            {'a': '1', 'b': 'on', 'c': 'x', 'd': '2.5', 'e': 'y'},
+            {'a': ' 000', 'b': 'False', 'c': '1', 'd': '-1', 'e': '0'},
+            {'a': 'x', 'b': 'on', 'c': 'x', 'd': 'y', 'e': 'y'},
+            {'a': '1', 'b': 'zz', 'c': 'x', 'd': '1', 'e': 'y'},
+            {'a': None, 'b': 'q', 'c': 'x', 'd': '1', 'e': 'y'},
+            {'a': '1', 'b': 'zz', 'c': '', 'd': '1', 'e': 'y'},
+            {'a': '1'},
+            {'a': '1', 'b': '1', 'c': 'x', 'd': '1', 'e': 'y', 'f': '1'},
+        ]
+        for params in cases:
+            self.assertEqual(outcome(parser.validator_schema(), params), outcome(parser.validate, params),
+                             msg=f'Error with {params}')
+
+        # rules with params are validated by schema
+        parser = UrlParser('/users/:{id:int(0,[0-100])}')
+        self.assertEqual({'id': 5}, parser.validate({'id': '5'}))
+        with self.assertRaises(Error):
+            parser.validate({'id': '101'})
@@ -0,0 +1,65 @@
+__author__ = 'Maxim Dutkin (max@dutkin.ru)'
+
+
+import time
+from sqlalchemy import create_engine, event
+from tornado import gen
+from tornado.testing import AsyncTestCase, gen_test
+from m2core.bases import BaseHandler
+from m2core.utils.watchdog import BlockingWatchdog
+
+
+class SlowHandler(BaseHandler):
+    def get(self, seconds: float):
+        time.sleep(seconds)
+
+
+def sqlite_sleep(seconds):
+    time.sleep(seconds)
+    return seconds
+
+
+class BlockingWatchdogTest(AsyncTestCase):
+    def setUp(self):
+        super(BlockingWatchdogTest, self).setUp()
+        self.watchdog = BlockingWatchdog(threshold=0.05, buffer_size=10, report_interval=60)
+        self.watchdog.start()
+
+    def tearDown(self):
+        self.watchdog.stop()
+        super(BlockingWatchdogTest, self).tearDown()
+
+    @gen_test
+    def test_handler(self):
+        handler = SlowHandler.__new__(SlowHandler)
+        handler.human_route = '/slow/:{id:int}'
+        yield gen.sleep(0.05)
+        handler.get(0.2)
+        yield gen.sleep(0.05)
+        # the same place is reported once per `report_interval`
+        handler.get(0.2)
+        yield gen.sleep(0.05)
+        # short blocks are not reported
+        handler.get(0.01)
+        yield gen.sleep(0.05)
+
+        reports = self.watchdog.reports()
+        self.assertEqual(1, len(reports))
+        self.assertEqual('/slow/:{id:int}', reports[0]['route'])
+        self.assertEqual(1, reports[0]['suppressed'])
+        self.assertGreater(reports[0]['blocked'], 0.1)
+        self.assertIn('time.sleep(seconds)', reports[0]['stack'][-1])
+        self.assertIsNone(reports[0]['sql'])
+
+    @gen_test
+    def test_sql(self):
+        engine = create_engine('sqlite://')
+        event.listen(engine, 'connect', lambda conn, record: conn.create_function('sleep', 1, sqlite_sleep))
+        yield gen.sleep(0.05)
+        engine.execute('SELECT sleep(0.2)')
+        yield gen.sleep(0.05)
+
+        reports = self.watchdog.reports()
+        self.assertEqual(1, len(reports))
+        self.assertEqual('SELECT sleep(0.2)', reports[0]['sql'])
+        self.assertIsNone(reports[0]['route'])
@@ -1,8 +1,22 @@
 __author__ = 'Maxim Dutkin (max@dutkin.ru)'
 
 
+# Shared fixtures of tests and benchmarks. Models which need a database live in temporary SQLite file, PostgreSQL isn't
+# required, and `sleep_ms(ms)` SQL function is registered on every connection to emulate slow queries. Fake Redis
+# counts round trips
+
+import os
+import time
+import tempfile
+import fakeredis
+from datetime import datetime
 from unittest.mock import MagicMock
+from sqlalchemy import create_engine, event, text, Column, Integer, BigInteger, String, DateTime, ForeignKey, MetaData
+from sqlalchemy.schema import DefaultClause
+from sqlalchemy.orm import sessionmaker, scoped_session, relationship
 from tornado.httputil import HTTPServerRequest
+from m2core.bases.base_model import BaseModel, EnchantedMixin
+from m2core.data_schemes.db_system_scheme import M2Role, M2Permission, M2RolePermission
 
 
 class OldUserRightsFactory:
@@ -57,3 +71,109 @@ def http_server_request_factory(
         server_connection=server_connection or MagicMock()
     )
     return _
+
+
+class CountingRedis(fakeredis.FakeStrictRedis):
+    """
+    Fake Redis which counts every request sent to the server, pipeline is counted as a single request
+    """
+    round_trips = 0
+
+    def execute_command(self, *args, **options):
+        CountingRedis.round_trips += 1
+        return super(CountingRedis, self).execute_command(*args, **options)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        pipe = super(CountingRedis, self).pipeline(transaction, shard_hint)
+        execute = pipe.execute
+
+        def counted_execute(*args, **kwargs):
+            CountingRedis.round_trips += 1
+            return execute(*args, **kwargs)
+
+        pipe.execute = counted_execute
+        return pipe
+
+
+class BenchOwner(BaseModel):
+    __tablename__ = 'bench_owners'
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(100), nullable=False)
+
+
+class BenchItem(BaseModel):
+    __tablename__ = 'bench_items'
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(100), nullable=False)
+    value = Column(Integer, nullable=False, default=0, index=True)
+    created = Column(DateTime, nullable=False, default=datetime.utcnow)
+    owner_id = Column(Integer, ForeignKey('bench_owners.id'))
+
+    owner = relationship('BenchOwner', backref='items')
+    tags = relationship('BenchTag', backref='item', order_by='BenchTag.id')
+
+
+class BenchTag(BaseModel):
+    __tablename__ = 'bench_tags'
+
+    id = Column(Integer, primary_key=True)
+    item_id = Column(Integer, ForeignKey('bench_items.id'), nullable=False)
+    name = Column(String(100), nullable=False)
+
+
+def make_sqlite_session(rows: int=100, tags_per_item: int=0, owners: int=0) -> scoped_session:
+    """
+    Creates temporary SQLite DB with `rows` bench items, injects scoped session into models and returns it
+    :param rows: number of `BenchItem` rows to insert
+    :param tags_per_item: number of `BenchTag` rows of each item
+    :param owners: number of `BenchOwner` rows, items are spread between them
+    """
+    fd, path = tempfile.mkstemp(suffix='.sqlite')
+    os.close(fd)
+    engine = create_engine('sqlite:///%s' % path, connect_args={'check_same_thread': False})
+
+    @event.listens_for(engine, 'connect')
+    def register_functions(dbapi_connection, connection_record):
+        # `time.sleep` releases GIL, just like waiting for response from a real DB server
+        dbapi_connection.create_function('sleep_ms', 1, lambda ms: time.sleep(ms / 1000.0) or 0)
+
+    BaseModel.metadata.create_all(engine, tables=[BenchOwner.__table__, BenchItem.__table__, BenchTag.__table__])
+    session = scoped_session(sessionmaker(bind=engine))
+    # Core inserts by batches, so millions of rows don't need ORM objects in memory
+    batch = 10000
+    if owners:
+        session.execute(BenchOwner.__table__.insert(), [{'id': i + 1, 'name': 'owner %s' % i} for i in range(owners)])
+    for start in range(0, rows, batch):
+        session.execute(BenchItem.__table__.insert(), [
+            {'id': i + 1, 'name': 'item %s' % i, 'value': i, 'owner_id': i % owners + 1 if owners else None}
+            for i in range(start, min(start + batch, rows))
+        ])
+        if tags_per_item:
+            session.execute(BenchTag.__table__.insert(), [
+                {'item_id': i + 1, 'name': 'tag %s' % j}
+                for i in range(start, min(start + batch, rows)) for j in range(tags_per_item)
+            ])
+    session.commit()
+    session.remove()
+
+    EnchantedMixin.set_db_session(session)
+    return session
+
+
+def create_system_tables(session: scoped_session):
+    """
+    Creates M2Core tables of roles, permissions and links between them in SQLite DB of `session`. Their DDL is
+    adapted to SQLite: `BigInteger` keys become `INTEGER` ones (auto incremented by SQLite) and `now()` defaults
+    become `CURRENT_TIMESTAMP`
+    """
+    metadata = MetaData()
+    for model in (M2Role, M2Permission, M2RolePermission):
+        table = model.__table__.tometadata(metadata)
+        for column in table.columns:
+            if isinstance(column.type, BigInteger):
+                column.type = Integer()
+            if column.server_default is not None and 'now()' in str(column.server_default.arg):
+                column.server_default = DefaultClause(text('CURRENT_TIMESTAMP'))
+    metadata.create_all(session.bind)
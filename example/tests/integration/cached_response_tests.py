@@ -0,0 +1,61 @@
+__author__ = 'Maxim Dutkin (max@dutkin.ru)'
+
+
+import json
+from m2core import M2Core
+from m2core.bases import BaseHandler
+from m2core.bases.base_model import EnchantedMixin
+from m2core.common import PermissionsEnum
+from m2core.utils.response_cache import ResponseCache
+from m2core.utils.tests import M2CoreAsyncHTTPTestCase
+
+
+class CachedHandler(BaseHandler):
+    calls = 0
+
+    @M2Core.user_can
+    @M2Core.cached_response(ttl=60, tags=('items', ))
+    async def get(self, *args, **kwargs):
+        CachedHandler.calls += 1
+        self.write_json(data={'calls': CachedHandler.calls, 'q': self.get_argument('q', None)})
+
+
+class CachedResponseTest(M2CoreAsyncHTTPTestCase):
+    def init_m2core(self):
+        m2core = M2Core()
+        m2core.route(human_route=r'/cached', handler_cls=CachedHandler, get=PermissionsEnum.SKIP)
+        return m2core
+
+    def data(self, response) -> dict:
+        self.assertEqual(200, response.code)
+        return json.loads(response.body)['data']
+
+    def test_cached_response(self):
+        first = self.fetch('/cached?q=1')
+        calls = self.data(first)['calls']
+        etag = first.headers['Etag']
+
+        second = self.fetch('/cached?q=1')
+        self.assertEqual(first.body, second.body)
+        self.assertEqual(etag, second.headers['Etag'])
+        # other query is other response
+        self.assertEqual({'calls': calls + 1, 'q': '2'}, self.data(self.fetch('/cached?q=2')))
+
+        not_modified = self.fetch('/cached?q=1', headers={'If-None-Match': etag})
+        self.assertEqual(304, not_modified.code)
+        self.assertEqual(b'', not_modified.body)
+
+        EnchantedMixin.response_cache.invalidate('items')
+        self.assertEqual({'calls': calls + 2, 'q': '1'}, self.data(self.fetch('/cached?q=1')))
+        self.assertEqual(calls + 2, CachedHandler.calls)
+
+    def test_no_cached_routes(self):
+        self.assertIn('items', ResponseCache.used_tags)
+        prev_cache, in_use = EnchantedMixin.response_cache, ResponseCache.in_use
+        ResponseCache.in_use = False
+        try:
+            M2Core().run_for_test()
+            self.assertIsNone(EnchantedMixin.response_cache)
+        finally:
+            ResponseCache.in_use = in_use
+            EnchantedMixin.set_response_cache(prev_cache)
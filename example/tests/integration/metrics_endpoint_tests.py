@@ -0,0 +1,42 @@
+__author__ = 'Maxim Dutkin (max@dutkin.ru)'
+
+
+import fakeredis
+from m2core import M2Core
+from m2core.bases import BaseHandler
+from m2core.common import PermissionsEnum
+from m2core.utils.instrumentation import Instrumentation
+from m2core.utils.tests import M2CoreAsyncHTTPTestCase
+
+
+class PingHandler(BaseHandler):
+    @M2Core.user_can
+    def get(self, *args, **kwargs):
+        self.write_json(data='pong')
+
+
+class MetricsEndpointTest(M2CoreAsyncHTTPTestCase):
+    def init_m2core(self):
+        m2core = M2Core()
+        m2core.route(human_route=r'/ping', handler_cls=PingHandler, get=PermissionsEnum.SKIP)
+        m2core.enable_metrics('/metrics')
+        m2core.metrics.redis_connector = fakeredis.FakeStrictRedis(decode_responses=True)
+        m2core.metrics.start()
+        self.m2core = m2core
+        return m2core
+
+    def tearDown(self):
+        self.m2core.metrics.stop()
+        Instrumentation.reset()
+        super(MetricsEndpointTest, self).tearDown()
+
+    def test_metrics(self):
+        for _ in range(3):
+            self.assertEqual(200, self.fetch('/ping').code)
+        response = self.fetch('/metrics')
+        self.assertEqual(200, response.code)
+        self.assertTrue(response.headers['Content-Type'].startswith('text/plain'))
+        lines = response.body.decode().splitlines()
+        self.assertIn('m2core_requests_total{route="/ping",method="GET",status="200"} 3', lines)
+        self.assertIn('m2core_request_duration_seconds_count{route="/ping",method="GET"} 3', lines)
+        self.assertTrue(any(line.startswith('m2core_ioloop_lag_seconds{') for line in lines))
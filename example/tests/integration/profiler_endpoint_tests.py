@@ -0,0 +1,62 @@
+__author__ = 'Maxim Dutkin (max@dutkin.ru)'
+
+
+from tornado.httpclient import AsyncHTTPClient
+from m2core import M2Core
+from m2core.bases import BaseHandler, http_statuses
+from m2core.common import PermissionsEnum, Permission
+from m2core.utils.error import M2Error
+from m2core.utils.tests import M2CoreAsyncHTTPTestCase
+
+
+class PingHandler(BaseHandler):
+    @M2Core.user_can
+    def get(self, *args, **kwargs):
+        self.write_json(data='pong')
+
+
+class ProfilerEndpointTest(M2CoreAsyncHTTPTestCase):
+    def init_m2core(self):
+        class PlatformPermissions(PermissionsEnum):
+            ADMIN = Permission(name='Admin privilege', sys_name='admin', description='Admin permissions')
+
+        self.pp = PlatformPermissions
+        m2core = M2Core()
+        m2core.route(human_route=r'/ping', handler_cls=PingHandler, get=PermissionsEnum.SKIP)
+        m2core.enable_profiler(self.pp.AUTHORIZED & self.pp.ADMIN, '/admin/profiler')
+        with self.assertRaises(M2Error):
+            m2core.enable_profiler(PermissionsEnum.SKIP, '/public-profiler')
+        return m2core
+
+    def test_permissions(self):
+        self.fetch_bytes('/admin/profiler?seconds=0.1',
+                         expected_codes={http_statuses['WRONG_CREDENTIALS']['code'], })
+        self.fetch_bytes('/admin/profiler?seconds=0.1', user_permissions={self.pp.AUTHORIZED, },
+                         expected_codes={http_statuses['WRONG_CREDENTIALS']['code'], })
+        self.fetch_bytes('/admin/profiler?seconds=1000', user_permissions={self.pp.AUTHORIZED, self.pp.ADMIN},
+                         expected_codes={http_statuses['WRONG_PARAM']['code'], })
+
+    def test_profile(self):
+        headers = {}
+        at = 'profiler-admin'
+        self.m2core.add_test_user(at, permissions={self.pp.AUTHORIZED, self.pp.ADMIN})
+        headers['X-Access-Token'] = at
+        client = AsyncHTTPClient()
+        profile = client.fetch(self.get_url('/admin/profiler?seconds=0.5&interval=0.002'), headers=headers)
+        # the second session in the same process is refused
+        busy = client.fetch(self.get_url('/admin/profiler?seconds=0.1'), headers=headers, raise_error=False)
+        for _ in range(20):
+            self.io_loop.run_sync(lambda: client.fetch(self.get_url('/ping')))
+        self.assertEqual(http_statuses['WRONG_REQUEST']['code'], self.io_loop.run_sync(lambda: busy).code)
+
+        response = self.io_loop.run_sync(lambda: profile)
+        self.assertEqual(200, response.code)
+        self.assertTrue(response.headers['Content-Type'].startswith('text/plain'))
+        self.assertIn('no-cache', response.headers['Cache-Control'])
+        self.assertGreater(int(response.headers['X-Profiler-Samples']), 0)
+        lines = response.body.decode().splitlines()
+        self.assertTrue(lines)
+        for line in lines:
+            stack, count = line.rsplit(' ', 1)
+            self.assertGreater(int(count), 0)
+            self.assertNotIn(' ', stack)
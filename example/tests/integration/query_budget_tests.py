@@ -0,0 +1,66 @@
+__author__ = 'Maxim Dutkin (max@dutkin.ru)'
+
+
+from sqlalchemy.orm import subqueryload
+from m2core import M2Core
+from m2core.bases import BaseHandler
+from m2core.bases.base_model import EnchantedMixin
+from m2core.common import PermissionsEnum
+from m2core.utils.instrumentation import Instrumentation
+from m2core.utils.tests import M2CoreAsyncHTTPTestCase
+from example.tests.helpers import make_sqlite_session, BenchItem
+
+
+class ItemsHandler(BaseHandler):
+    @M2Core.user_can
+    def get(self, *args, **kwargs):
+        query = BenchItem.q.order_by(BenchItem.id)
+        if self.get_argument('eager', None):
+            query = query.options(subqueryload(BenchItem.tags))
+        # relationship is loaded by separate query for every item without `eager`
+        self.write_json(data=[len(item.tags) for item in query.all()])
+
+
+class QueryBudgetTest(M2CoreAsyncHTTPTestCase):
+    def init_m2core(self):
+        m2core = M2Core()
+        m2core.route(human_route=r'/items', handler_cls=ItemsHandler, get=PermissionsEnum.SKIP)
+        return m2core
+
+    def setUp(self):
+        super(QueryBudgetTest, self).setUp()
+        self.prev_session = getattr(EnchantedMixin, '_db_session', None)
+        self.session = make_sqlite_session(20, tags_per_item=2)
+        Instrumentation.instrument_engine(self.session.bind)
+
+    def tearDown(self):
+        self.session.remove()
+        EnchantedMixin.set_db_session(self.prev_session)
+        Instrumentation.reset()
+        super(QueryBudgetTest, self).tearDown()
+
+    def test_query_budget(self):
+        with self.assertQueries(max_queries=2, max_repeats=1) as requests:
+            self.assertEqual(200, self.fetch('/items?eager=1').code)
+        self.assertEqual(1, len(requests))
+        self.assertEqual('/items', requests[0]['route'])
+        self.assertEqual(2, sum(requests[0]['queries'].values()))
+
+        with self.assertRaises(AssertionError):
+            with self.assertQueries(max_queries=1):
+                self.fetch('/items?eager=1')
+
+    def test_repeated_queries(self):
+        # test fails on N+1 queries by default
+        with self.assertRaises(AssertionError) as context:
+            self.fetch('/items')
+        self.assertIn('N+1', str(context.exception))
+
+        self.fail_on_repeated_queries = False
+        with self.assertLogs('m2core.utils.instrumentation', 'WARNING'):
+            with self.assertQueries(max_queries=30) as requests:
+                self.assertEqual(200, self.fetch('/items').code)
+        self.assertEqual(21, sum(requests[0]['queries'].values()))
+        with self.assertRaises(AssertionError):
+            with self.assertQueries(max_repeats=10):
+                self.fetch('/items')
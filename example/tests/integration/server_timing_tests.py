@@ -0,0 +1,47 @@
+__author__ = 'Maxim Dutkin (max@dutkin.ru)'
+
+
+from m2core import M2Core
+from m2core.bases import BaseHandler
+from m2core.common import PermissionsEnum
+from m2core.common.options import options
+from m2core.utils.instrumentation import Instrumentation
+from m2core.utils.tests import M2CoreAsyncHTTPTestCase
+
+
+class TimedHandler(BaseHandler):
+    @M2Core.user_can
+    async def get(self, *args, **kwargs):
+        self.validate_url_params(kwargs)
+        self.write_json(data={'id': kwargs['id']})
+
+
+class ServerTimingTest(M2CoreAsyncHTTPTestCase):
+    def init_m2core(self):
+        m2core = M2Core()
+        m2core.route(human_route=r'/timed/:{id:int}', handler_cls=TimedHandler, get=PermissionsEnum.SKIP)
+        return m2core
+
+    def tearDown(self):
+        options.debug = False
+        Instrumentation.reset()
+        super(ServerTimingTest, self).tearDown()
+
+    def test_server_timing(self):
+        records = []
+        Instrumentation.subscribe(records.append)
+        try:
+            response = self.fetch('/timed/1')
+            self.assertEqual(200, response.code)
+            self.assertNotIn('Server-Timing', response.headers)
+
+            options.debug = True
+            response = self.fetch('/timed/2')
+        finally:
+            Instrumentation.unsubscribe(records.append)
+
+        metrics = [metric.split(';')[0] for metric in response.headers['Server-Timing'].split(', ')]
+        self.assertEqual(['permissions', 'validation', 'serialize', 'total'], metrics)
+        self.assertEqual(['/timed/:{id:int}'] * 2, [record['route'] for record in records])
+        self.assertEqual(200, records[0]['status'])
+        self.assertEqual(2, Instrumentation.histograms()['/timed/:{id:int}']['GET']['total']['count'])
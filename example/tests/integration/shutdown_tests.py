@@ -0,0 +1,54 @@
+__author__ = 'Maxim Dutkin (max@dutkin.ru)'
+
+
+import time
+from tornado import gen
+from m2core import M2Core
+from m2core.bases import BaseHandler
+from m2core.common import PermissionsEnum
+from m2core.common.options import options
+from m2core.utils.tests import M2CoreAsyncHTTPTestCase
+
+
+class SlowHandler(BaseHandler):
+    @M2Core.user_can
+    async def get(self, *args, **kwargs):
+        await gen.sleep(0.3)
+        self.write_json(data='done')
+
+
+class ShutdownTest(M2CoreAsyncHTTPTestCase):
+    def init_m2core(self):
+        m2core = M2Core()
+        m2core.route(human_route=r'/slow', handler_cls=SlowHandler, get=PermissionsEnum.SKIP)
+        return m2core
+
+    def setUp(self):
+        super(ShutdownTest, self).setUp()
+        # handlers made by unit tests are never finished
+        BaseHandler.requests_in_flight = 0
+        self.prev_timeout = options.shutdown_timeout
+        options.shutdown_timeout = 3.0
+
+    def tearDown(self):
+        options.shutdown_timeout = float(self.prev_timeout)
+        super(ShutdownTest, self).tearDown()
+
+    def drain(self) -> float:
+        started = time.monotonic()
+        # the same as `__stop_worker`, but IOLoop of test keeps running
+        self.io_loop.run_sync(lambda: M2Core._M2Core__drain(self.http_server))
+        return time.monotonic() - started
+
+    def test_idle_worker(self):
+        self.assertLess(self.drain(), 1)
+
+    def test_in_flight_requests(self):
+        future = self.http_client.fetch(self.get_url('/slow'))
+        self.io_loop.run_sync(lambda: gen.sleep(0.05))
+        self.assertEqual(1, BaseHandler.requests_in_flight)
+        elapsed = self.drain()
+        self.assertGreater(elapsed, 0.2)
+        self.assertLess(elapsed, 1)
+        self.assertEqual(0, BaseHandler.requests_in_flight)
+        self.assertEqual(200, self.io_loop.run_sync(lambda: future).code)
@@ -0,0 +1,36 @@
+__author__ = 'Maxim Dutkin (max@dutkin.ru)'
+
+
+import json
+from m2core import M2Core
+from m2core.bases import BaseHandler
+from m2core.common import PermissionsEnum
+from m2core.common.options import options
+from m2core.utils.tests import M2CoreAsyncHTTPTestCase
+
+
+class TypedParamsHandler(BaseHandler):
+    async def get(self, *args, **kwargs):
+        self.validate_url_params(kwargs)
+        self.write_json(data={name: [value, type(value).__name__] for name, value in kwargs.items()})
+
+
+class TypedUrlParamsTest(M2CoreAsyncHTTPTestCase):
+    def init_m2core(self):
+        self.prev_router = options.router
+        options.router = 'tree'
+        m2core = M2Core()
+        m2core.route(human_route=r'/items/:{id:int}/:{active:bool}/:{name}', handler_cls=TypedParamsHandler,
+                     get=PermissionsEnum.SKIP)
+        return m2core
+
+    def tearDown(self):
+        options.router = self.prev_router
+        super(TypedUrlParamsTest, self).tearDown()
+
+    def test_typed_params(self):
+        response = self.fetch('/items/42/1/some%20name')
+        self.assertEqual(200, response.code)
+        self.assertEqual({'id': [42, 'int'], 'active': [True, 'bool'], 'name': ['some name', 'str']},
+                         json.loads(response.body)['data'])
+        self.assertEqual(404, self.fetch('/items/x/1/name').code)
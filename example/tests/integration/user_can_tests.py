@@ -94,6 +94,15 @@ class UserCanTest(M2CoreAsyncHTTPTestCase):
         )
         self.assertEqual(None, response['data'])
 
+    def test_permission_names(self):
+        # overridden `get_current_user` may return names of permissions, rule is called without mask then
+        response = self.fetch_json(
+            '/authenticated',
+            user_permissions={'AUTHORIZED', 'VIEW_SOME_INFO'},
+            expected_codes={http_statuses['WRONG_CREDENTIALS']['code'], }
+        )
+        self.assertEqual(None, response['data'])
+
     def test_authenticated_but_not_enough(self):
         response = self.fetch_json(
             '/authenticated-but-not-enough',
@@ -0,0 +1,71 @@
+__author__ = 'Maxim Dutkin (max@dutkin.ru)'
+
+
+import json
+from tornado.httpclient import HTTPClientError
+from m2core import M2Core
+from m2core.bases import BaseHandler
+from m2core.common import PermissionsEnum
+from m2core.common.options import options
+from m2core.utils.tests import M2CoreAsyncHTTPTestCase
+
+
+def broken_rows():
+    yield {'id': 1}
+    raise RuntimeError('DB connection lost')
+
+
+class StreamHandler(BaseHandler):
+    async def get(self, *args, **kwargs):
+        rows = ({'id': i, 'html': '</script>'} for i in range(int(self.get_argument('rows'))))
+        await self.write_json_stream(rows, serialize=lambda row: dict(row, double=row['id'] * 2), flush_every=3)
+
+
+class BrokenStreamHandler(BaseHandler):
+    async def get(self, *args, **kwargs):
+        await self.write_json_stream(broken_rows())
+
+
+class PlainHandler(BaseHandler):
+    async def get(self, *args, **kwargs):
+        self.write_json(data={'id': 1})
+
+
+class WriteJSONStreamTest(M2CoreAsyncHTTPTestCase):
+    def init_m2core(self):
+        m2core = M2Core()
+        m2core.route(human_route=r'/stream', handler_cls=StreamHandler, get=PermissionsEnum.SKIP)
+        m2core.route(human_route=r'/broken-stream', handler_cls=BrokenStreamHandler, get=PermissionsEnum.SKIP)
+        m2core.route(human_route=r'/plain', handler_cls=PlainHandler, get=PermissionsEnum.SKIP)
+        return m2core
+
+    def test_stream(self):
+        for rows in (0, 1, 10):
+            response = self.fetch(f'/stream?rows={rows}')
+            self.assertEqual(200, response.code)
+            self.assertNotIn(b'</', response.body)
+            self.assertEqual(
+                {
+                    'meta': {'code': 200, 'msg': 'OK'},
+                    'data': [{'id': i, 'html': '</script>', 'double': i * 2} for i in range(rows)]
+                },
+                json.loads(response.body)
+            )
+
+    def test_broken_stream(self):
+        # response is broken, so client can't take it for complete data
+        with self.assertRaises(HTTPClientError):
+            self.fetch('/broken-stream')
+
+    def test_write_json_indent(self):
+        # compact output out of debug mode by default
+        self.assertNotIn(b'\n', self.fetch('/plain').body)
+        debug = options.debug
+        options.debug = True
+        try:
+            self.assertIn(b'\n  ', self.fetch('/plain').body)
+            options.json_indent = 0
+            self.assertNotIn(b'\n', self.fetch('/plain').body)
+        finally:
+            options.debug = debug
+            options.json_indent = None
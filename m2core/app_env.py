@@ -3,12 +3,38 @@ from m2core.common.options import options
 # project options:
 # - tornado config
 options.define('debug', default=False, help='Tornado debug mode', type=bool)
+options.define('instrumentation', default=True,
+               help='Times phases of requests (Redis, SQL, permissions, validation, serialization), aggregates them to '
+                    'histograms by route and sends `Server-Timing` header in debug mode, see `Instrumentation`',
+               type=bool)
+options.define('sql_repeat_threshold', default=10,
+               help='Warns about requests, which execute the same SQL statement more times (N+1 queries), requires '
+                    '`instrumentation`. 0 - disabled', type=int)
+options.define('metrics_interval', default=5,
+               help='How often every process pushes it\'s metrics to Redis to be merged by `enable_metrics` route (sec)',
+               type=float)
+options.define('blocking_threshold', default=0,
+               help='Reports IOLoop blocked for longer time (sec) with stack, route, SQL statement and Redis command, '
+                    'see `BlockingWatchdog`. 0 - disabled', type=float)
+options.define('blocking_buffer_size', default=100, help='Number of the last IOLoop blocking reports kept in process',
+               type=int)
+options.define('blocking_report_interval', default=60,
+               help='Minimal interval between IOLoop blocking reports of the same place (sec)', type=float)
+options.define('profiler_max_duration', default=60,
+               help='Maximal duration of profiling by `enable_profiler` route (sec)', type=float)
 options.define('debug_orm', default=False, help='SQLAlchemy debug mode', type=bool)
 options.define('xsrf_cookie', default=False, help='Enable or disable XSRF-cookie protection', type=str)
 options.define('cookie_secret', default='gfqeg4t023ty724ythweirhgiuwehrtp', type=str)
 options.define('server_port', default=8888, help='TCP server bind port', type=int)
 options.define('server_listen_ip', default='0.0.0.0', help='TCP server bind ip', type=str)
 options.define('thread_pool_size', default=10, help='Pool size for background executor', type=int)
+options.define('workers', default=1, help='Number of forked server processes, 0 - one per CPU core', type=int)
+options.define('max_worker_restarts', default=100, help='How many times crashed workers are restarted within '
+                                                        '`worker_restarts_period` before master gives up', type=int)
+options.define('worker_restarts_period', default=60, help='Period (sec) `max_worker_restarts` are counted in',
+               type=float)
+options.define('shutdown_timeout', default=3, help='Seconds workers wait for in-flight requests on SIGTERM',
+               type=float)
 options.define('gen_salt', default=12, help='Argument for gen_salt func in bcrypt module', type=int)
 
 # - M2Core config
@@ -19,8 +45,16 @@ options.define('config_name', default='config.py', help='Config name', type=str)
 options.define('admin_role_name', default='admins', help='Admin group name', type=str)
 options.define('default_role_name', default='users', help='Default user group with login permissions', type=str)
 options.define('default_permission', default='AUTHORIZED', help='Default permission', type=str)
-options.define('json_indent', default=2,
-               help='Number of `space` characters, which are used in json responses after new lines', type=int)
+options.define('json_indent', default=None,
+               help='Number of `space` characters, which are used in json responses after new lines, 0 - compact '
+                    'output, `None` - 2 in debug mode and compact output otherwise', type=int)
+options.define('json_backend', default='json',
+               help='JSON encoder of `BaseHandler.write_json`: `json` - stdlib, `orjson` - requires orjson package, '
+                    'writes only compact output or output with 2 spaces indent', type=str)
+options.define('router', default='tornado',
+               help='How requests are dispatched to handlers: `tornado` - Tornado matches regular expressions of routes '
+                    'one by one, `tree` - prefix tree of url segments (`RouteTree`), `BaseHandler`s get typed url params',
+               type=str)
 options.define('log_file', default='/logs.txt', help='Path to log file', type=str)
 options.define('locale', default='ru_RU.UTF-8', help='Server locale for dates, times, currency and etc', type=str)
 options.define('access_token_param', default='at', help='Name of access token param to search for in request',
@@ -34,6 +68,10 @@ options.define('pg_user', default='postgres', help='Database user', type=str)
 options.define('pg_password', default='password', help='Database password', type=str)
 options.define('pg_pool_size', default=40, help='Pool size for bg executor', type=int)
 options.define('pg_pool_recycle', default=-1, help='Pool recycle time in sec, -1 - disable', type=int)
+options.define('db_session_scope', default='thread',
+               help='How DB sessions are scoped: `thread` - one session per thread, shared by all concurrent requests, '
+                    '`request` - every request gets it\'s own session, which is closed in `BaseHandler.on_finish`',
+               type=str)
 options.define('expire_on_connect', default=True, help='Expire sqlalchemy inner cache when initializing BaseHandler '
                                                        'for incoming client', type=bool)
 # - redis config
@@ -44,8 +82,9 @@ options.define('redis_db', default=0, help='Redis database number (0-15)', type=
 # - additional kwargs for different kind of classes
 options.define('redis_connection_pool_kwargs', default={},
                help='Additional kwargs used when initializing Connection Pool for Redis', type=dict)
-options.define('engine_kwargs', default={}, help='Additional kwargs used when initializing SQLAlchemy engine',
-               type=dict)
+options.define('engine_kwargs', default={},
+               help='Additional kwargs used when initializing SQLAlchemy engine, i.e. `executemany_mode` of psycopg2 '
+                    'dialect (SQLAlchemy 1.3.7+) to speed up executemany calls of `DataMixin.update_many`', type=dict)
 options.define('session_kwargs', default={}, help='Additional kwargs used when initializing SQLAlchemy session',
                type=dict)
 options.define('tornado_application_kwargs', default={}, help='Additional kwargs used when initializing Tornado app',
@@ -54,3 +93,30 @@ options.define('http_server_kwargs', default={'xheaders': True},
                help='Additional kwargs used when initializing HTTP server', type=dict)
 options.define('access_token_update_on_check', default=False,
                help='When checking access token in Redis, resets it\'s TTL to default value', type=bool)
+options.define('session_resolver', default='sequential',
+               help='How `BaseHandler.get_current_user` resolves access token, user roles and permissions in Redis: '
+                    '`sequential` - one request per key, `batched` - 3 requests for any number of roles, '
+                    '`script` - single server-side Lua script call', type=str)
+options.define('session_cache_size', default=0,
+               help='Max number of resolved users cached in process by access token, 0 - disable cache', type=int)
+options.define('session_cache_ttl', default=10, help='TTL of resolved users in process cache (sec)', type=float)
+options.define('session_cache_channel', default='m2core:session_invalidation',
+               help='Redis pub/sub channel used to invalidate resolved users caches of all processes', type=str)
+options.define('response_cache_storage', default='local',
+               help='Where `M2Core.cached_response` stores responses: `local` - LRU cache of process, `redis` - Redis, '
+                    '`both` - local cache backed by Redis. Only Redis storages invalidate responses in all processes, so '
+                    '`local` is replaced with `both` when several workers are run',
+               type=str)
+options.define('response_cache_size', default=1024, help='Max number of responses in process cache', type=int)
+options.define('response_cache_ttl', default=60, help='Default TTL of cached responses (sec)', type=float)
+options.define('model_cache_storage', default='local',
+               help='Where models with `__cache__` setting keep cached rows: `local` - LRU cache of process, `redis` - '
+                    'Redis, `both` - local cache backed by Redis, invalidated in all processes via '
+                    '`model_cache_channel`. `local` is replaced with `both` when several workers are run', type=str)
+options.define('model_cache_size', default=10000, help='Max number of rows in process cache of models', type=int)
+options.define('model_cache_ttl', default=300, help='Default TTL of cached rows of models (sec)', type=float)
+options.define('model_cache_channel', default='m2core:model_invalidation',
+               help='Redis pub/sub channel used to invalidate cached rows of models in all processes', type=str)
+options.define('redis_async', default=False,
+               help='Creates additional `redis.asyncio` client (redis>=4.2), so `BaseHandler` resolves current user '
+                    'in `prepare` without blocking IOLoop', type=bool)
@@ -1,3 +1,4 @@
+import asyncio
 import traceback
 import logging
 from tornado import escape
@@ -5,8 +6,11 @@ from tornado.escape import *
 from tornado.web import HTTPError
 from tornado.web import RequestHandler
 from m2core.common.options import options
-from m2core.utils.session_helper import SessionHelper
-from m2core.db.sqlalchemy_json import AlchemyJSONEncoder
+from m2core.utils.session_helper import SessionHelper, AsyncSessionHelper
+from m2core.db.sqlalchemy_json import encode_json
+from m2core.db import request_scope
+from m2core.bases.base_model import EnchantedMixin
+from m2core.utils.instrumentation import Instrumentation, phase
 
 # 200 – OK – All is working, normal answer for any ordinary request
 # 201 – OK – Returned if resource was created successfully (POST or PUT)
@@ -46,6 +50,9 @@ logger = logging.getLogger(__name__)
 
 
 class BaseHandler(RequestHandler):
+    # number of requests of this process, which are not finished yet, see `M2Core.run`
+    requests_in_flight = 0
+
     def __init__(self, application, request, **kwargs):
         """
         Constructor
@@ -56,12 +63,21 @@ class BaseHandler(RequestHandler):
         # all protected attributes have been left there for compatibility
         self.redis_schema = application.settings['redis']['scheme']
         self.redis_connector = application.settings['redis']['connector']
+        self.async_redis_connector = application.settings['redis'].get('async_connector')
         self.db_session = application.settings['db']
         self.executor = application.settings['thread_pool']
         self.permissions = application.settings['permissions']
         self.url_parser = None
         self.human_route = None
         self.m2core = None
+        # every request gets it's own DB session, which is closed in `on_finish`
+        self.db_scope = request_scope.enter_scope() if options.db_session_scope == 'request' else None
+        # (cache key, TTL) of response, which should be stored by `write_json`, see `cache_response`
+        self._response_cache_entry = None
+        # time spent in phases of request, see `Instrumentation`
+        self.timings = Instrumentation.start() if options.instrumentation else None
+        self._in_flight = True
+        BaseHandler.requests_in_flight += 1
         # Expire sql alchemy inner cache when initializing BaseHandler for incoming client
         if options.expire_on_connect:
             self.db_session.expire_all()
@@ -113,14 +129,23 @@ class BaseHandler(RequestHandler):
         self.url_parser = kwargs['url_parser']
         self.m2core = kwargs['m2core']
 
+    def decode_argument(self, value, name=None):
+        """
+        Url params, which are already coerced by `RouteTree` (`options.router` is `tree`), are passed as is
+        """
+        if type(value) is bytes:
+            return super(BaseHandler, self).decode_argument(value, name)
+        return value
+
     def validate_url_params(self, params: dict):
         """
         Additional url validation, pass request method kwargs (which actually contains parsed
-        url arguments) to this method to check it via generated voluptuous schema
+        url arguments) to this method to check it via generated validators, which are compiled once per route
         :param params: 
         :return: 
         """
-        self.url_parser.validator_schema()(params)
+        with phase('validation'):
+            self.url_parser.validate(params)
 
     def get(self, *args, **kwargs):
         """
@@ -188,16 +213,137 @@ class BaseHandler(RequestHandler):
                     },
                 'data': data,
             } if code != 204 else None
-            self.finish(json.dumps(result,
-                                   indent=options.json_indent,
-                                   cls=AlchemyJSONEncoder).
-                        replace("</", "<\\/"))
+            indent = options.json_indent
+            if indent is None:
+                indent = 2 if options.debug else 0
+            with phase('serialize'):
+                body = encode_json(result, indent, options.json_backend)
+            cache = self.response_cache
+            if self._response_cache_entry is not None and code == 200 and cache is not None:
+                key, ttl = self._response_cache_entry
+                body = utf8(body)
+                self.write_cached_json(cache.set(key, body, ttl), body)
+            else:
+                self.finish(body)
 
-    def get_current_user(self):
+    @property
+    def response_cache(self):
         """
-        Called only once when `self.current_user` is used at first time. If `None` is returned, then
-        decorator `@authenticated` (and also `@authenticated_json` in our M2-case) will raise 403 HTTPError,
-        otherwise it has to return some data, i.e. `integer` user ID
+        Cache of JSON responses, see `M2Core.cached_response`
+        """
+        return EnchantedMixin.response_cache
+
+    def cache_response(self, key: str, ttl: float=None):
+        """
+        Asks `write_json` to store response in `response_cache`
+        :param key: cache key made by `ResponseCache.key`
+        :param ttl: time to live of response in seconds
+        """
+        self._response_cache_entry = (key, ttl)
+
+    def write_cached_json(self, etag: str, body: bytes):
+        """
+        Writes cached JSON response with it's ETag, or 304 response if client already has it
+        :param etag: strong ETag of response
+        :param body: encoded response
+        """
+        self.set_header('Content-Type', 'application/json; charset=utf-8')
+        self.set_header('Etag', etag)
+        if self.check_etag_header():
+            self.set_status(http_statuses['NOT_MODIFIED']['code'])
+            self.finish()
+        else:
+            self.finish(body)
+
+    async def write_json_stream(self, rows, code: int=200, msg: str=None, serialize: callable=None,
+                                flush_every: int=1000):
+        """
+        Writes json response to client the same way as `write_json` does, but `data` is an array, which is encoded
+        and sent by chunks while `rows` are iterated, so whole response is never kept in memory. Output is always
+        compact. Response is flushed after the first row and then after each `flush_every` rows, i.e:
+            await self.write_json_stream(User.iter_all(), serialize=lambda u: u.data('password'))
+        :param rows: iterable of data elements, i.e. generator returned by `DataMixin.iter_all`
+        :param code: HTTP response code
+        :param msg: status code message
+        :param serialize: function, which converts each row to encodable value before encoding
+        :param flush_every: number of rows sent to client at once
+        """
+        self.set_header('Content-Type', 'application/json; charset=utf-8')
+        self.set_status(code, msg)
+        meta = encode_json({'code': self._status_code, 'msg': self._reason}, None, options.json_backend)
+        chunk = [b'{"meta":', utf8(meta), b',"data":[']
+        sent = 0
+        try:
+            for row in rows:
+                if sent:
+                    chunk.append(b',')
+                chunk.append(utf8(encode_json(serialize(row) if serialize else row, None, options.json_backend)))
+                sent += 1
+                if sent == 1 or sent % flush_every == 0:
+                    self.write(b''.join(chunk))
+                    chunk = []
+                    await self.flush()
+                    # flush is done at once while socket buffer isn't full, let IOLoop serve other requests
+                    await asyncio.sleep(0)
+        except Exception:
+            if sent:
+                # status is already sent, so the only way to tell client about error is to break the response
+                self.request.connection.close()
+            raise
+        chunk.append(b']}')
+        self.finish(b''.join(chunk))
+
+    def flush(self, include_footers: bool=False):
+        """
+        Adds `Server-Timing` header with timings of request phases in debug mode
+        """
+        if self.timings is not None and options.debug and not self._headers_written:
+            self.set_header('Server-Timing', self.timings.server_timing(self.request.request_time()))
+        return super(BaseHandler, self).flush(include_footers)
+
+    def on_finish(self):
+        """
+        Closes DB session of request when `options.db_session_scope` is `request` and passes timings of request
+        to `Instrumentation`. Don't forget to call it if you override `on_finish` in your handler
+        """
+        if self._in_flight:
+            self._in_flight = False
+            BaseHandler.requests_in_flight -= 1
+        if self.db_scope is not None:
+            request_scope.remove_scope(self.db_session, self.db_scope)
+        if self.timings is not None:
+            Instrumentation.finish(self.timings, self.human_route, self.request.method, self.get_status(),
+                                   self.request.request_time(), options.sql_repeat_threshold)
+
+    async def prepare(self):
+        """
+        Resolves current user with asyncio Redis client when `options.redis_async` is enabled, so Redis requests
+        don't block IOLoop. Don't forget to call it if you override `prepare` in your handler:
+
+            async def prepare(self):
+                await super().prepare()
+        """
+        if self.async_redis_connector is None:
+            return
+
+        token = self._get_access_token()
+        if not token:
+            self.current_user = None
+            return
+
+        # hack for test purposes
+        if options.allow_test_users:
+            user_data = self.m2core.get_test_user(token)
+            if user_data:
+                self.current_user = user_data
+                return
+
+        session = AsyncSessionHelper(self.async_redis_connector, self.redis_schema)
+        self.current_user = await session.resolve(token)
+
+    def _get_access_token(self) -> str or None:
+        """
+        Looks for access token in GET params, then in X-Access-Token header, then in JSON body
         """
         # looking for access_token in GET params, then in X-Access-Token header
         # TODO: add Cookie support
@@ -214,7 +360,15 @@ class BaseHandler(RequestHandler):
         except KeyError as err:
             # no `access_token` field in json
             logger.warning('no `access_token` field in request body JSON')
+        return token
 
+    def get_current_user(self):
+        """
+        Called only once when `self.current_user` is used at first time. If `None` is returned, then
+        decorator `@authenticated` (and also `@authenticated_json` in our M2-case) will raise 403 HTTPError,
+        otherwise it has to return some data, i.e. `integer` user ID
+        """
+        token = self._get_access_token()
         if not token:
             return None
 
@@ -225,12 +379,7 @@ class BaseHandler(RequestHandler):
                 return user_data
 
         session = SessionHelper(self.redis_connector, self.redis_schema)
-        session.init_user(token)
-        return {
-            'id': session.get_user_id(),
-            'access_token': session.get_token(),
-            'permissions': session.get_user_permissions()
-        }
+        return session.resolve(token)
 
     def session_helper_factory(self) -> SessionHelper:
         """
@@ -242,5 +391,15 @@ class BaseHandler(RequestHandler):
             session_helper.init_user(self.current_user['access_token'])
         return session_helper
 
+    async def async_session_helper_factory(self) -> AsyncSessionHelper:
+        """
+        The same as `session_helper_factory`, but returns helper which works with asyncio Redis client, available
+        only with `options.redis_async` enabled
+        """
+        session_helper = AsyncSessionHelper(self.async_redis_connector, self.redis_schema)
+        if self.current_user:
+            await session_helper.init_user(self.current_user['access_token'])
+        return session_helper
+
     def options(self, *args, **kwargs):
         pass
@@ -2,6 +2,6 @@ __author__ = 'Maxim Dutkin (max@dutkin.ru)'
 
 
 from .rules import Rules
-from .permissions import PermissionsEnum, Permission, BasePermissionRule, Or, And, Not
+from .permissions import PermissionsEnum, Permission, BasePermissionRule, Or, And, Not, compile_rule
 from .int_enum import M2CoreIntEnum
 from .options import M2OptionParser
@@ -2,9 +2,17 @@ __author__ = 'Maxim Dutkin (max@dutkin.ru)'
 
 
 import re
+import functools
+import itertools
+import threading
 from m2core.utils.decorators import classproperty
 
 
+# bit positions of permissions in masks, see `Permission.bit`
+_bit_ids = itertools.count()
+_bit_lock = threading.Lock()
+
+
 class BasePermissionRule(list):
     operator_char = ''
 
@@ -83,6 +91,7 @@ class Permission:
         self._name = name
         self._sys_name = sys_name
         self._description = description
+        self._bit = None
         self.rule_chain = None
 
     @property
@@ -97,6 +106,18 @@ class Permission:
     def description(self):
         return self._description
 
+    @property
+    def bit(self) -> int:
+        """
+        Single bit mask of this permission, permission gets it's bit on first use. Bits are unique only inside of
+        current process, so masks shouldn't be stored anywhere outside of it
+        """
+        if self._bit is None:
+            with _bit_lock:
+                if self._bit is None:
+                    self._bit = 1 << next(_bit_ids)
+        return self._bit
+
     def copy(self):
         return Permission(name=self._name, sys_name=self._sys_name)
 
@@ -175,7 +196,8 @@ class PermissionsEnum(metaclass=PermissionsEnumMeta):
     @classproperty
     def ALL(cls):
         cache_var_name = '__all_cache'
-        cached_perms = getattr(cls, cache_var_name, None)
+        # cache of base class isn't inherited, every enum has it's own members
+        cached_perms = cls.__dict__.get(cache_var_name)
         if cached_perms is None:
             setattr(cls, cache_var_name, set())
             cached_perms = getattr(cls, cache_var_name)
@@ -190,6 +212,18 @@ class PermissionsEnum(metaclass=PermissionsEnumMeta):
     def SKIP(cls):
         return lambda p: True
 
+    @staticmethod
+    def mask(permissions) -> int or None:
+        """
+        Returns bitmask of `permissions` for rules compiled with `compile_rule`, or `None` if some of them are not
+        `Permission` (i.e. system names or DB rows from overridden `BaseHandler.get_current_user`) - rule itself
+        should be called with such permissions. Masks of frozen sets (i.e. cached users' permissions) are memoized
+        :param permissions: iterable of `Permission`
+        """
+        if type(permissions) is frozenset:
+            return _frozen_mask(permissions)
+        return _mask(permissions)
+
     @classproperty
     def all_platform_permissions(cls):
         sub_classes = PermissionsEnum.registry
@@ -199,3 +233,75 @@ class PermissionsEnum(metaclass=PermissionsEnumMeta):
 
         return all_perms
 
+
+def _mask(permissions) -> int or None:
+    mask = 0
+    for permission in permissions:
+        if not isinstance(permission, Permission):
+            return None
+        mask |= permission.bit
+    return mask
+
+
+_frozen_mask = functools.lru_cache(maxsize=1024)(_mask)
+
+
+def _compile(rule) -> callable:
+    """
+    Builds function of user's permissions mask `m`, which is equal to calling `rule`. Plain permissions inside of
+    `And` and `Or` are merged into single mask test
+    """
+    if isinstance(rule, Permission):
+        if rule.rule_chain is not None:
+            return _compile(rule.rule_chain)
+        bit = rule.bit
+        return lambda m: m & bit != 0
+    if isinstance(rule, Not):
+        check = _compile(rule[0])
+        return lambda m: not check(m)
+    if isinstance(rule, (And, Or)):
+        plain_mask = 0
+        parts = []
+        for member in rule:
+            if isinstance(member, Permission) and member.rule_chain is None:
+                plain_mask |= member.bit
+            else:
+                parts.append(_compile(member))
+        parts = tuple(parts)
+        if isinstance(rule, And):
+            if not parts:
+                return lambda m: m & plain_mask == plain_mask
+
+            def check_all(m):
+                if m & plain_mask != plain_mask:
+                    return False
+                for part in parts:
+                    if not part(m):
+                        return False
+                return True
+            return check_all
+
+        if not parts:
+            return lambda m: m & plain_mask != 0
+
+        def check_any(m):
+            if m & plain_mask:
+                return True
+            for part in parts:
+                if part(m):
+                    return True
+            return False
+        return check_any
+    raise TypeError('For checking permissions you should use instances of `BasePermissionRule` or `Permissions`')
+
+
+def compile_rule(rule) -> callable or None:
+    """
+    Compiles permission rule tree (`Permission`, `And`, `Or`, `Not`) into a function of user's permissions mask
+    (see `PermissionsEnum.mask`), so rule is evaluated with a few integer operations instead of walking the tree.
+    Returns `None` for other callables (i.e. `PermissionsEnum.SKIP`) - they should be called as usual
+    :param rule: permission rule
+    """
+    if not isinstance(rule, (Permission, BasePermissionRule)):
+        return None
+    return _compile(rule)
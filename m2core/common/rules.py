@@ -4,8 +4,9 @@ __author__ = 'Maxim Dutkin (max@dutkin.ru)'
 from collections import defaultdict
 from tornado.web import RequestHandler
 from typing import Type
-from m2core.common.permissions import PermissionsEnum
+from m2core.common.permissions import PermissionsEnum, compile_rule
 from m2core.utils.url_parser import UrlParser
+from m2core.utils.cache import LRUCache
 
 
 class Rules(defaultdict):
@@ -18,9 +19,66 @@ class Rules(defaultdict):
     def permissions(self, human_route: str=None, method: str=None):
         return self[human_route]['permissions'].get(method.upper())
 
+    def compiled(self, human_route: str=None, method: str=None):
+        return self[human_route]['compiled'].get(method.upper())
+
     def group(self, human_route: str=None):
         return self[human_route]['group']
 
+    def permitted_routes(self, user_permissions) -> dict:
+        """
+        Returns dict of routes with lists of methods, which user with `user_permissions` is allowed to call.
+        Compiled rules are evaluated once per distinct permissions set and result is memoized, other callables
+        (i.e. `PermissionsEnum.SKIP`) are called every time, as well as all rules for permissions which have no mask
+        (see `PermissionsEnum.mask`)
+        :param user_permissions: iterable of `Permission`
+        """
+        table = getattr(self, '_decision_table', None)
+        if table is None:
+            table = self._decision_table = self._build_decision_table()
+        compiled_rules, dynamic_rules = table
+
+        mask = PermissionsEnum.mask(user_permissions)
+        if mask is None:
+            result = defaultdict(list)
+            for human_route, method, rule, _ in compiled_rules + dynamic_rules:
+                if rule(user_permissions):
+                    result[human_route].append(method)
+            return result
+
+        memo = self._permitted_memo
+        permitted = memo.get(mask)
+        if permitted is None:
+            permitted = defaultdict(list)
+            for human_route, method, _, compiled in compiled_rules:
+                if compiled(mask):
+                    permitted[human_route].append(method)
+            memo.set(mask, permitted)
+
+        result = defaultdict(list, {human_route: list(methods) for human_route, methods in permitted.items()})
+        for human_route, method, rule, _ in dynamic_rules:
+            if rule(user_permissions):
+                result[human_route].append(method)
+        return result
+
+    def _build_decision_table(self) -> tuple:
+        """
+        Splits rules of all routes to compiled ones and other callables
+        """
+        compiled_rules = list()
+        dynamic_rules = list()
+        for human_route, route in self.items():
+            for method, rule in route['permissions'].items():
+                if rule is None:
+                    continue
+                compiled = route['compiled'].get(method)
+                if compiled is not None:
+                    compiled_rules.append((human_route, method, rule, compiled))
+                else:
+                    dynamic_rules.append((human_route, method, rule, None))
+        self._permitted_memo = LRUCache(1024)
+        return compiled_rules, dynamic_rules
+
     def add_meta(self, human_route, handler_cls: Type[RequestHandler], rule_group: str, method_permissions: dict) \
             -> UrlParser:
         # add documentation per each method in SUPPORTED_METHODS
@@ -35,7 +93,10 @@ class Rules(defaultdict):
                         permissions = p
                         break
                 self[human_route]['permissions'][method_upper] = permissions
+                self[human_route]['compiled'][method_upper] = compile_rule(permissions)
         self[human_route]['group'] = rule_group
+        # rebuild decision table on next `permitted_routes` call
+        self._decision_table = None
         url_parser = UrlParser(human_route)
         self[human_route]['validator'] = url_parser
 
@@ -13,7 +13,8 @@ from sqlalchemy.exc import SQLAlchemyError
 from m2core.bases.base_model import BaseModel
 from m2core.common.permissions import Permission, PermissionsEnum
 from m2core.utils.error import M2Error
-from typing import List
+from types import MappingProxyType
+from typing import List, Mapping
 
 
 class CreatedMixin:
@@ -51,6 +52,49 @@ class M2Permission(BaseModel):
     active = Column(Boolean, default=True, server_default='1')
     created = Column(DateTime(timezone=True), server_default=text('now()'), nullable=False)
 
+    # immutable mapping system_name -> `Permission`, see `index` method
+    _index = None
+
+    @classmethod
+    def index(cls) -> Mapping[str, Permission]:
+        """
+        Returns in-process index of permissions by their system names. It contains members of
+        `PermissionsEnum.all_platform_permissions` which are stored in DB, so it's safe to use it on request path
+        without touching DB. Index is built on first use and rebuilt with `refresh_index`
+        """
+        index = cls._index
+        if index is None:
+            index = cls.refresh_index()
+        return index
+
+    @classmethod
+    def refresh_index(cls) -> Mapping[str, Permission]:
+        """
+        Rebuilds index of permissions by their system names. Called after permissions have been synced with DB
+        (`sync_permissions`) or changed for some role (`M2Role.set_permissions`)
+        """
+        enum_members = {p.sys_name: p for p in PermissionsEnum.all_platform_permissions}
+        try:
+            stored_names = cls.s.query(cls.system_name).all()
+        except SQLAlchemyError:
+            cls.s.rollback()
+            raise
+        index = dict()
+        for system_name, in stored_names:
+            if system_name in enum_members:
+                index[system_name] = enum_members[system_name]
+        # whole mapping is replaced at once, so readers never see it half-built
+        cls._index = MappingProxyType(index)
+        return cls._index
+
+    @classmethod
+    def reset_index(cls, index: Mapping[str, Permission]=None):
+        """
+        Drops index of permissions, so it's rebuilt from DB on next use, e.g. after DB session has been changed
+        :param index: mapping system_name -> `Permission` which is used instead of DB one, when DB isn't available
+        """
+        cls._index = MappingProxyType(dict(index)) if index is not None else None
+
     @property
     def enum_member(self):
         if not hasattr(self, '__enum_member'):
@@ -113,6 +157,7 @@ class M2Role(BaseModel):
                 self.add_permission(p)
             # dump to db
             self.dump_role_permissions()
+            M2Permission.refresh_index()
         except SQLAlchemyError:
             self.s.rollback()
             raise
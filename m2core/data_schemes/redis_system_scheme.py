@@ -27,4 +27,15 @@ redis_scheme = {
     'USER_ROLES': {'prefix': 'ur:%s', 'ttl': -1},
     # mapping between role id and its permissions
     'ROLE_PERMISSIONS': {'prefix': 'rp:%s', 'ttl': -1},
+    # cached response (ETag and body) by hash of it's key, TTL is set by `M2Core.cached_response`
+    'RESPONSE_CACHE': {'prefix': 'rc:%s', 'ttl': None},
+    # hash of response tags and their versions
+    'RESPONSE_CACHE_TAGS': {'prefix': 'rc_tags', 'ttl': -1},
+    # cached model row (JSON of column values) by table and primary key, or primary key by table and unique column
+    # value, TTL is set by `ModelCache`
+    'MODEL_CACHE': {'prefix': 'mc:%s', 'ttl': None},
+    # hash of model tables and generations of their cached rows, see `ModelCache.invalidate`
+    'MODEL_CACHE_GENERATIONS': {'prefix': 'mc_generations', 'ttl': -1},
+    # hash of snapshots of metrics (JSON) by worker ids, see `Metrics`
+    'METRICS': {'prefix': 'm2core_metrics', 'ttl': -1},
 }
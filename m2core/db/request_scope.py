@@ -0,0 +1,53 @@
+import itertools
+import threading
+from contextvars import ContextVar
+from sqlalchemy.orm import scoped_session
+
+
+# id of DB session scope of current request. Tornado runs every request handler in it's own asyncio task, which
+# copies context of the connection, so value set in `BaseHandler.__init__` is seen only by coroutines of this request
+_current_scope = ContextVar('m2core_db_scope', default=None)
+_scope_ids = itertools.count(1)
+
+
+def scope_func():
+    """
+    `scopefunc` for `scoped_session`: returns id of current request scope, or id of current thread outside of
+    requests (app initialization, thread pool jobs and etc.)
+    """
+    scope = _current_scope.get()
+    if scope is None:
+        return 'thread', threading.get_ident()
+    return scope
+
+
+def current_scope():
+    """
+    Returns id of current request scope or None
+    """
+    return _current_scope.get()
+
+
+def enter_scope():
+    """
+    Starts new request scope in current context, every next `scoped_session()` call in this context will return
+    new session
+    :return: id of started scope
+    """
+    scope = 'request', next(_scope_ids)
+    _current_scope.set(scope)
+    return scope
+
+
+def remove_scope(session: scoped_session, scope):
+    """
+    Closes and forgets session of `scope`. It doesn't depend on the context it's called from, because `on_finish`
+    could be called outside of request task
+    :param session: scoped session created with `scope_func`
+    :param scope: id of scope returned by `enter_scope`
+    """
+    scoped = session.registry.registry.pop(scope, None)
+    if scoped is not None:
+        scoped.close()
+    if _current_scope.get() == scope:
+        _current_scope.set(None)
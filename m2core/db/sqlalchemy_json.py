@@ -1,42 +1,88 @@
+from sqlalchemy import inspect
 from sqlalchemy.orm import state
 from tornado import escape
 
 from sqlalchemy.ext.declarative import DeclarativeMeta
+from m2core.utils.error import M2Error
 import json
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def alchemy_default(obj):
+    """
+    Converts objects, which JSON encoders don't know, to encodable values: SQLAlchemy models to dicts, bytes to
+    strings, dates and times to ISO format. Raises `TypeError` for everything else
+    """
+    def dump_sqlalchemy_obj(sqlalchemy_obj):
+        # only mapped columns, `dir` would also touch relations and class properties of mixins (DB session and etc.)
+        return {attr.key: getattr(sqlalchemy_obj, attr.key) for attr in inspect(sqlalchemy_obj).mapper.column_attrs}
+
+    if isinstance(obj, state.InstanceState):
+        return None
+    if isinstance(obj.__class__, DeclarativeMeta):  # an SQLAlchemy class
+        return dump_sqlalchemy_obj(obj)
+    if isinstance(obj, bytes):
+        return escape.to_unicode(obj)
+    if hasattr(obj, 'isoformat'):
+        return obj.isoformat()
+    raise TypeError(f'Object of type {obj.__class__.__name__} is not JSON serializable')
+
 
 class AlchemyJSONEncoder(json.JSONEncoder):
     def default(self, obj):
-        def dump_sqlalchemy_obj(sqlalchemy_obj):
-            fields = {}
-            for field in [x for x in dir(sqlalchemy_obj)
-                          if not x.startswith('_')  # sqlalch builtin attr
-                and not x.startswith('rel_')  # for my attr, which are references to other tbls
-                and x != 'metadata']:
-                data = sqlalchemy_obj.__getattribute__(field)
-                try:
-                    # this will fail on non-encodable values, like other classes
-                    # also deals with every type which has an `isoformat` attr, like
-                    # datetime.datetime
-                    if hasattr(data, 'isoformat'):
-                        fields[field] = data.isoformat()
-                    # # no need of this if we are not taking `rel_*` attrs
-                    # elif isinstance(data.__class__, DeclarativeMeta): # an SQLAlchemy class
-                    # fields[field] = dump_sqlalchemy_obj(data)
-                    else:
-                        fields[field] = dump_sqlalchemy_obj(data) if isinstance(data.__class__,
-                                                                                DeclarativeMeta) else data
-                except TypeError:
-                    fields[field] = None
-            # a json-encodable dict
-            return fields
-
-        if isinstance(obj, state.InstanceState):
-            return None
-        if isinstance(obj.__class__, DeclarativeMeta):  # an SQLAlchemy class
-            return dump_sqlalchemy_obj(obj)
-        if isinstance(obj, bytes):
-            return escape.to_unicode(obj)
-        if hasattr(obj, 'isoformat'):
-            return obj.isoformat()
-        return json.JSONEncoder.default(self, obj)
+        try:
+            return alchemy_default(obj)
+        except TypeError:
+            return json.JSONEncoder.default(self, obj)
+
+
+def _json_dumps(obj, indent: int or None) -> str:
+    if indent:
+        result = json.dumps(obj, indent=indent, cls=AlchemyJSONEncoder)
+    else:
+        result = json.dumps(obj, separators=(',', ':'), cls=AlchemyJSONEncoder)
+    # `</` can occur only inside of strings, most responses don't have it and aren't copied
+    return result.replace('</', '<\\/') if '</' in result else result
+
+
+def _orjson_dumps(obj, indent: int or None) -> bytes:
+    if orjson is None:
+        raise M2Error('`orjson` JSON backend requires orjson package, install it with `pip install orjson`')
+    # orjson supports only indentation with 2 spaces
+    option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+    result = orjson.dumps(obj, default=alchemy_default, option=option)
+    return result.replace(b'</', b'<\\/') if b'</' in result else result
+
+
+# name => function(obj, indent), which returns JSON as `str` or UTF-8 `bytes` with `</` escaped
+json_backends = {
+    'json': _json_dumps,
+    'orjson': _orjson_dumps,
+}
+
+
+def register_json_backend(name: str, dumps: callable):
+    """
+    Adds JSON backend, which could be selected with `options.json_backend`
+    :param name: backend name
+    :param dumps: function(obj, indent), which returns JSON as `str` or UTF-8 `bytes`. It should encode SQLAlchemy
+                  models, dates and bytes (see `alchemy_default`) and escape `</` in strings
+    """
+    json_backends[name] = dumps
+
+
+def encode_json(obj, indent: int or None=None, backend: str='json') -> str or bytes:
+    """
+    Encodes `obj` to JSON with selected backend, so it's safe to embed into HTML `<script>`
+    :param obj: data to encode
+    :param indent: number of spaces for indentation, `None` or 0 - compact output
+    :param backend: name of backend in `json_backends`
+    """
+    dumps = json_backends.get(backend)
+    if dumps is None:
+        raise M2Error('Unknown JSON backend `%s`, available backends: %s' % (backend, ', '.join(json_backends)))
+    return dumps(obj, indent)
@@ -1,5 +1,8 @@
 from .session_mixin import SessionMixin
-from sqlalchemy import func, text
+from sqlalchemy import func, text, asc, desc, tuple_, and_, bindparam, event
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session, scoped_session, object_session, make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlalchemy.inspection import inspect
 from sqlalchemy.orm import RelationshipProperty, class_mapper
 from sqlalchemy.ext.hybrid import hybrid_property, hybrid_method
@@ -7,13 +10,123 @@ from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.engine import reflection
 from m2core.utils.error import M2Error
 from m2core.utils.decorators import classproperty
+from m2core.utils.model_cache import RowCodec
+from m2core.utils.response_cache import ResponseCache
+from m2core.db import request_scope
+from tornado.ioloop import IOLoop
+from weakref import WeakKeyDictionary
+import asyncio
+import base64
+import contextvars
+import datetime
+import decimal
+import functools
+import json
 import operator
+import threading
 import copy
+import uuid
+
+
+# DB sessions of asyncio tasks, which use async methods of DataMixin
+_task_sessions = WeakKeyDictionary()
+# compiled plans of `DataMixin.data`, see `_serializer_plan`
+_serializer_plans = dict()
+# codecs of cached rows by model class, see `DataMixin.__cache__`
+_row_codecs = dict()
+# key of `Session.info` with rows changed in current transaction: {model class: set of primary keys or None - all rows}
+_CHANGED_ROWS = 'm2core_changed_rows'
+# key of `Session.info` with models changed in current transaction, their cached responses are invalidated on commit
+_CHANGED_MODELS = 'm2core_changed_models'
+# types of columns, which values are kept in pagination cursors as strings, see `DataMixin._encode_cursor`
+_CURSOR_STRING_TYPES = frozenset((datetime.datetime, datetime.date, datetime.time, decimal.Decimal, uuid.UUID))
+# JSON types of cursor values allowed for columns of other types
+_CURSOR_JSON_TYPES = {int: (int, ), float: (int, float), str: (str, ), bool: (bool, )}
+# key of `Session.info` with id of thread, which uses session for async DataMixin method at the moment
+_IN_USE = 'm2core_in_use'
+
+
+class _SerializerPlan:
+    """
+    What `DataMixin.data` takes from instances of one model class at one place of the output tree: columns and
+    relations with plans of their children
+    """
+    __slots__ = ('columns', 'relations')
+
+    def __init__(self, columns: tuple, relations: tuple):
+        self.columns = columns
+        # (name, uselist, child plans by class, key of child plans in `_serializer_plans` without class)
+        self.relations = relations
+
+
+def _serializer_plan(cls, ignore_fields: tuple, back_relationships: frozenset, except_fields: frozenset,
+                     max_level: int, current_level: int) -> _SerializerPlan:
+    """
+    Returns cached plan for instances of `cls`, compiles it on first use
+    :param ignore_fields: split except fields related to current level, i.e. (('photo_id',), ('socials', 'id'))
+    :param back_relationships: backref names of relations on the path from root, they are not visited
+    :param except_fields: all except fields as they were passed to `data`, relations with such names are skipped
+    """
+    key = (cls, ignore_fields, back_relationships, except_fields, max_level, current_level)
+    plan = _serializer_plans.get(key)
+    if plan is not None:
+        return plan
+
+    ignore_in_cur_iteration = {field[0] for field in ignore_fields if len(field) == 1}
+    columns = tuple(c.key for c in cls.__table__.columns if c.key not in ignore_in_cur_iteration)
+    relations = list()
+    for name, relation in class_mapper(cls).relationships.items():
+        if name in back_relationships or name in except_fields or name in ignore_in_cur_iteration:
+            continue
+        if current_level < max_level:
+            ignore_in_next_iteration = tuple(f[1:] for f in ignore_fields if len(f) > 1 and f[0] == name)
+            # only backref of this relation is skipped in it's children, backrefs of siblings are not
+            back = back_relationships
+            if relation.backref:
+                back = back_relationships | {relation.backref if type(relation.backref) == str else relation.backref[0]}
+            child_key = (ignore_in_next_iteration, back, except_fields, max_level, current_level + 1)
+            relations.append((name, relation.uselist, dict(), child_key))
+
+    plan = _SerializerPlan(columns, tuple(relations))
+    _serializer_plans[key] = plan
+    return plan
+
+
+def _serialize(obj, plan: _SerializerPlan) -> dict:
+    """
+    Dumps `obj` to dict according to `plan`
+    """
+    serialized_data = {key: getattr(obj, key) for key in plan.columns}
+    for name, uselist, child_plans, child_key in plan.relations:
+        relationship_children = getattr(obj, name)
+        if relationship_children is None:
+            continue
+        if uselist:
+            children = list()
+            for child in relationship_children:
+                child_plan = child_plans.get(child.__class__)
+                if child_plan is None:
+                    child_plan = child_plans[child.__class__] = _serializer_plan(child.__class__, *child_key)
+                children.append(_serialize(child, child_plan))
+            serialized_data[name] = children
+        else:
+            child_plan = child_plans.get(relationship_children.__class__)
+            if child_plan is None:
+                child_plan = child_plans[relationship_children.__class__] = \
+                    _serializer_plan(relationship_children.__class__, *child_key)
+            serialized_data[name] = _serialize(relationship_children, child_plan)
+    return serialized_data
 
 
 class DataMixin(SessionMixin):
     __abstract__ = True
 
+    # opt-in second-level cache of rows (see `ModelCache`): `True` or dict of settings, i.e.:
+    #     __cache__ = {'ttl': 60, 'unique': ('email', )}
+    # `ttl` - time to live of cached rows (sec), `ModelCache.ttl` by default; `unique` - unique columns, which
+    # `load_by_params` looks up in cache too
+    __cache__ = None
+
     @classproperty
     def columns(cls):
         return inspect(cls).columns.keys()
@@ -157,6 +270,9 @@ class DataMixin(SessionMixin):
         Loads model by primary key
         """
         try:
+            cache = cls._row_cache()
+            if cache is not None and type(_pk) != dict:
+                return cls._load_cached(cache, _pk)
             return cls.q.get(_pk)
         except SQLAlchemyError:
             cls.s.rollback()
@@ -168,6 +284,14 @@ class DataMixin(SessionMixin):
         Loads model with filtering by params
         """
         try:
+            cache = cls._row_cache()
+            if cache is not None and len(_params) == 1:
+                (name, value), = _params.items()
+                if type(value) != tuple and value is not None:
+                    if [name] == cls.primary_keys:
+                        return cls._load_cached(cache, value)
+                    if name in cls._cache_setting('unique', ()):
+                        return cls._load_cached_unique(cache, name, value)
             return cls._prepare_parametrized_queue(**_params).first()
         except SQLAlchemyError:
             cls.s.rollback()
@@ -202,32 +326,300 @@ class DataMixin(SessionMixin):
         """
         Saves changes to DB. If there is `updated` field in model - sets it's value to current time
         """
+        session = self._session()
         try:
             # set `updated` field with current datetime
             if 'updated' in self.columns and self.get('updated') is not None:
                 self.set(updated=text('now()'))
-            self.s.add(self)
+            session.add(self)
+            self._invalidate_responses(session)
             if flush_only:
-                self.s.flush()
+                session.flush()
             else:
-                self.s.commit()
+                session.commit()
 
             return self
         except SQLAlchemyError:
-            self.s.rollback()
+            session.rollback()
             raise
 
     def delete(self):
         """
         Removes the model from the current entity session and mark for deletion.
         """
+        session = self._session()
         try:
-            self.s.delete(self)
-            self.s.commit()
+            session.delete(self)
+            self._invalidate_responses(session)
+            session.commit()
         except SQLAlchemyError:
-            self.s.rollback()
+            session.rollback()
+            raise
+
+    def _session(self) -> scoped_session or Session:
+        """
+        Returns session which instance belongs to (e.g. session of task, if instance was loaded by async method) or
+        current DB session for new instances. Raises `M2Error` if session is used by async method at the moment
+        """
+        session = object_session(self)
+        if session is None:
+            session = self.s
+        owner = session.info.get(_IN_USE)
+        if owner is not None and owner != threading.get_ident():
+            raise M2Error('DB session is used by async DataMixin method, await it before using session again')
+        return session
+
+    @classmethod
+    def _row_cache(cls):
+        """
+        Returns `ModelCache` if model has `__cache__` setting and cache is defined, otherwise `None`
+        """
+        if not cls.__cache__:
+            return None
+        return cls.model_cache
+
+    @classmethod
+    def _cache_setting(cls, name: str, default=None):
+        return cls.__cache__.get(name, default) if type(cls.__cache__) == dict else default
+
+    @classmethod
+    def _row_codec(cls) -> RowCodec:
+        codec = _row_codecs.get(cls)
+        if codec is None:
+            codec = _row_codecs[cls] = RowCodec(cls.__mapper__)
+        return codec
+
+    @classmethod
+    def _load_cached(cls, cache, _pk):
+        """
+        `load_by_pk` through cache of rows: models, which are already loaded in session, are returned as is, cached
+        rows are merged to session without DB query, others are loaded from DB and cached
+        """
+        pk = tuple(_pk) if isinstance(_pk, (tuple, list)) else (_pk, )
+        table = cls.__table__.name
+        session = cls.s
+        obj = session.identity_map.get(cls.__mapper__.identity_key_from_primary_key(pk))
+        if obj is not None and not inspect(obj).expired:
+            # `get` takes it from identity map without DB query
+            return cls.q.get(_pk)
+
+        raw = cache.get(table, pk)
+        cache.record(table, raw is not None)
+        if raw is not None:
+            instance = cls.__mapper__.class_manager.new_instance()
+            for key, value in cls._row_codec().loads(raw).items():
+                set_committed_value(instance, key, value)
+            make_transient_to_detached(instance)
+            return session.merge(instance, load=False)
+
+        obj = cls.q.get(_pk)
+        if obj is not None:
+            cls._cache_row(cache, obj)
+        return obj
+
+    @classmethod
+    def _load_cached_unique(cls, cache, name: str, value):
+        """
+        `load_by_params` by one unique column through cache: primary key of row is taken from cache, then row is
+        loaded by `_load_cached`. Row is checked to have the same value, because mapping could be cached before
+        row was changed
+        """
+        table = cls.__table__.name
+        pk = cache.get_pk(table, name, value)
+        if pk is not None:
+            obj = cls._load_cached(cache, pk)
+            if obj is not None and getattr(obj, name) == value:
+                return obj
+        else:
+            cache.record(table, False)
+
+        obj = cls._prepare_parametrized_queue(**{name: value}).first()
+        if obj is not None:
+            pk = cls._cache_row(cache, obj)
+            if pk is not None:
+                cache.set_pk(table, name, value, pk, cls._cache_setting('ttl'))
+        return obj
+
+    @classmethod
+    def _cache_row(cls, cache, obj) -> tuple or None:
+        """
+        Puts column values of loaded model to cache, returns its primary key. Models with deferred columns, which
+        are not loaded yet, are not cached
+        """
+        state = inspect(obj)
+        codec = cls._row_codec()
+        if state.identity is None or not all(key in state.dict for key in codec.keys):
+            return None
+        row = {key: state.dict[key] for key in codec.keys}
+        cache.set(cls.__table__.name, state.identity, codec.dumps(row), cls._cache_setting('ttl'))
+        return state.identity
+
+    @classmethod
+    def _forget_rows(cls, session, pks: set or None):
+        """
+        Drops changed rows from cache right away and remembers them in session, so they are dropped again when
+        transaction ends - rows, which were cached by other sessions meanwhile, could be stale
+        :param pks: primary keys of rows, `None` - all rows of model
+        """
+        cache = cls._row_cache()
+        if cache is None:
+            return
+        cache.invalidate(cls.__table__.name, pks)
+        if session is None:
+            return
+        changed = session.info.setdefault(_CHANGED_ROWS, dict())
+        if pks is None or changed.get(cls, set()) is None:
+            changed[cls] = None
+        else:
+            changed.setdefault(cls, set()).update(pks)
+
+    @classmethod
+    def _invalidate_responses(cls, session):
+        """
+        Invalidates cached responses (see `M2Core.cached_response`) tagged with table of current model, when
+        transaction of `session` is committed. Concurrent request could cache old rows under new tag versions, if
+        they were bumped before commit. Tables, which no cached response is made of, are skipped
+        """
+        if cls.response_cache is not None and cls.__table__.name in ResponseCache.used_tags:
+            session.info.setdefault(_CHANGED_MODELS, set()).add(cls)
+
+    @classmethod
+    def _bulk_batches(cls, rows: list, batch_size: int):
+        """
+        Splits `rows` dicts to batches of `batch_size` rows with the same set of keys, so every batch is one
+        statement. Unknown keys raise `M2Error`
+        """
+        columns = set(cls.columns)
+        groups = dict()
+        for row in rows:
+            keys = tuple(sorted(row.keys()))
+            if keys not in groups:
+                unknown = set(keys) - columns
+                if unknown:
+                    raise M2Error(f'{cls.__name__} has no columns {", ".join(sorted(unknown))}')
+                groups[keys] = list()
+            groups[keys].append(row)
+        for keys, group in groups.items():
+            for start in range(0, len(group), batch_size):
+                yield keys, group[start:start + batch_size]
+
+    @classmethod
+    def _execute_bulk(cls, statements, commit: bool, changes_rows: bool=True) -> int:
+        """
+        Executes `(statement, params)` pairs in one transaction and returns total number of affected rows
+        :param changes_rows: statements change existing rows, so cached rows of model are dropped. Inserted rows
+                             can't be cached before, misses are not cached
+        """
+        affected = 0
+        try:
+            for statement, params in statements:
+                result = cls.s.execute(statement, params)
+                affected += result.rowcount if result.rowcount > 0 else 0
+            if changes_rows:
+                cls._forget_rows(cls.s, None)
+            cls._invalidate_responses(cls.s)
+            if commit:
+                cls.s.commit()
+            return affected
+        except SQLAlchemyError:
+            cls.s.rollback()
             raise
 
+    @classmethod
+    def create_many(cls, rows: list, batch_size: int=1000, commit: bool=True) -> int:
+        """
+        Inserts `rows` (list of dicts with column values) by multi-row `INSERT ... VALUES` statements (executemany
+        calls for non-PostgreSQL engines) of `batch_size` rows in one transaction. Unlike `create`, no model instances are made, so it costs one round trip per batch
+        instead of one round trip and one transaction per row:
+            User.create_many([{'email': 'a@b.c', 'name': 'A'}, {'email': 'c@d.e', 'name': 'C'}])
+        :param rows: list of dicts with column values
+        :param batch_size: number of rows in one statement, number of rows by number of columns shouldn't exceed
+                           bind parameters limit of DB (32767 for PostgreSQL)
+        :param commit: commit transaction, otherwise caller commits it
+        :return: number of inserted rows
+        """
+        table = cls.__table__
+        if cls.s.bind.dialect.name == 'postgresql':
+            # psycopg2 sends executemany as one statement per row
+            statements = ((table.insert().values(batch), None) for keys, batch in cls._bulk_batches(rows, batch_size))
+        else:
+            # other drivers execute it in one call (SQLite) or rewrite it to multi-row INSERT (MySQL) themselves,
+            # which is cheaper than compiling multi-row statement of every batch
+            statement = table.insert()
+            statements = ((statement, batch) for keys, batch in cls._bulk_batches(rows, batch_size))
+        return cls._execute_bulk(statements, commit, changes_rows=False)
+
+    @classmethod
+    def _upsert_statement(cls, keys: tuple, batch: list, conflict_cols: list, update_cols: list or None):
+        """
+        Builds multi-row PostgreSQL `INSERT ... ON CONFLICT` statement for `batch` rows with `keys` columns
+        """
+        statement = pg_insert(cls.__table__).values(batch)
+        if update_cols is None:
+            update_cols = [c for c in keys if c not in conflict_cols]
+        if not update_cols:
+            return statement.on_conflict_do_nothing(index_elements=conflict_cols)
+
+        set_ = {c: statement.excluded[c] for c in update_cols}
+        if 'updated' in cls.columns and 'updated' not in set_:
+            set_['updated'] = func.now()
+        return statement.on_conflict_do_update(index_elements=conflict_cols, set_=set_)
+
+    @classmethod
+    def upsert_many(cls, rows: list, conflict_cols: list, update_cols: list=None, batch_size: int=1000,
+                    commit: bool=True) -> int:
+        """
+        Inserts `rows` or updates existing ones by PostgreSQL `INSERT ... ON CONFLICT (conflict_cols) DO UPDATE`
+        multi-row statements of `batch_size` rows in one transaction:
+            M2Permission.upsert_many([{'system_name': 'x', 'name': 'X'}], conflict_cols=['system_name'])
+        :param rows: list of dicts with column values
+        :param conflict_cols: columns of unique index or constraint, which detects existing rows
+        :param update_cols: columns to update in existing rows, by default - all passed columns except
+                            `conflict_cols`. If there is nothing to update - existing rows are left as is
+        :param batch_size: number of rows in one statement, see `create_many`
+        :param commit: commit transaction, otherwise caller commits it
+        :return: number of inserted or updated rows
+        """
+        if cls.s.bind.dialect.name != 'postgresql':
+            raise M2Error('upsert_many is supported by PostgreSQL only')
+        return cls._execute_bulk(
+            (
+                (cls._upsert_statement(keys, batch, conflict_cols, update_cols), None)
+                for keys, batch in cls._bulk_batches(rows, batch_size)
+            ),
+            commit
+        )
+
+    @classmethod
+    def update_many(cls, rows: list, batch_size: int=1000, commit: bool=True) -> int:
+        """
+        Updates rows found by primary key values in `rows` dicts with the rest of their values. Each batch of
+        `batch_size` rows is one executemany call of `UPDATE ... WHERE pk = ...`, all in one transaction:
+            User.update_many([{'id': 1, 'name': 'A'}, {'id': 2, 'name': 'B'}])
+        Models, which are already loaded in session, are not refreshed
+        :param rows: list of dicts with primary key values and new column values
+        :param batch_size: number of rows in one executemany call
+        :param commit: commit transaction, otherwise caller commits it
+        :return: number of updated rows
+        """
+        table = cls.__table__
+        pks = cls.primary_keys
+
+        def statements():
+            for keys, batch in cls._bulk_batches(rows, batch_size):
+                if not set(pks).issubset(keys):
+                    raise M2Error(f'Primary key values are required to update {cls.__name__}')
+                values = [c for c in keys if c not in pks]
+                if not values:
+                    continue
+                # primary key values go to renamed params, SET clause is built from the rest of keys
+                statement = table.update().where(and_(*[table.c[pk] == bindparam(f'_pk_{pk}') for pk in pks]))
+                yield statement, [
+                    dict({c: row[c] for c in values}, **{f'_pk_{pk}': row[pk] for pk in pks}) for row in batch
+                ]
+
+        return cls._execute_bulk(statements(), commit)
+
     def data(self, *_except_fields, **kwargs):
         """
         Dumps model to JSON. Also dumps all it's relations.
@@ -276,70 +668,50 @@ class DataMixin(SessionMixin):
                 `max_level` - maximum recursion level, 2 by default
         """
 
-        _max_level = kwargs.get('max_level', 2)
-
-        def model_to_dict(obj, ignore_fields=list(), back_relationships=set(), max_level=2,
-                          current_level=0):
-            current_level += 1
-            ignore_in_cur_iteration = list()
-            for field in ignore_fields:
-                final_exclusion = len(field) == 1
-                if final_exclusion:
-                    ignore_in_cur_iteration.append(field[0])
-
-            serialized_data = dict()
-            for c in obj.__table__.columns:
-                if c.key not in ignore_in_cur_iteration:
-                    serialized_data[c.key] = getattr(obj, c.key)
-            relationships = class_mapper(obj.__class__).relationships
-            visitable_relationships = [(name, rel) for name, rel in relationships.items() if
-                                       name not in back_relationships and name not in _except_fields]
-
-            for name, relation in visitable_relationships:
-                ignore_in_next_iteration = list()
-
-                if name in ignore_in_cur_iteration:
-                    continue
-
-                for i in ignore_fields:
-                    if len(i) > 1 and name == i[0]:
-                        ignore_in_next_iteration.append(i[1:])
-
-                if relation.backref:
-                    if type(relation.backref) == str:
-                        back_relationships.add(relation.backref)
-                    elif type(relation.backref) == tuple:
-                        back_relationships.add(relation.backref[0])
-                relationship_children = getattr(obj, name)
-                if relationship_children is not None:
-                    if relation.uselist and current_level != max_level:
-                        children = []
-                        for child in [c for c in relationship_children]:
-                            if current_level < max_level:
-                                children.append(model_to_dict(child,
-                                                              ignore_in_next_iteration,
-                                                              back_relationships,
-                                                              max_level,
-                                                              current_level))
-                        serialized_data[name] = children
-                    else:
-                        if current_level < max_level:
-                            serialized_data[name] = model_to_dict(relationship_children,
-                                                                  ignore_in_next_iteration,
-                                                                  back_relationships,
-                                                                  max_level,
-                                                                  current_level)
-            return serialized_data
-
         try:
-            normalized_except_fields = []
-            for f in _except_fields:
-                normalized_except_fields.append(f.split('>'))
-            return model_to_dict(self, ignore_fields=normalized_except_fields, max_level=_max_level)
+            return _serialize(self, self._root_serializer_plan(_except_fields, kwargs.get('max_level', 2)))
         except SQLAlchemyError:
             self.s.rollback()
             raise
 
+    @classmethod
+    def data_many(cls, rows, *_except_fields, **kwargs) -> list:
+        """
+        Dumps list of models, the same as calling `data` of each of them, but serializer plan is taken only once
+        per model class:
+            users = User.all()
+            self.write_json(data=User.data_many(users, 'password'))
+        :param rows: iterable of models
+        :param kwargs:
+                `max_level` - maximum recursion level, 2 by default
+        """
+        max_level = kwargs.get('max_level', 2)
+        plans = dict()
+        result = list()
+        try:
+            for row in rows:
+                plan = plans.get(row.__class__)
+                if plan is None:
+                    plan = plans[row.__class__] = row._root_serializer_plan(_except_fields, max_level)
+                result.append(_serialize(row, plan))
+            return result
+        except SQLAlchemyError:
+            cls.s.rollback()
+            raise
+
+    @classmethod
+    def _root_serializer_plan(cls, _except_fields: tuple, max_level: int) -> _SerializerPlan:
+        """
+        Returns plan of `data` for `cls` with specified except fields
+        """
+        key = (cls, _except_fields, max_level)
+        plan = _serializer_plans.get(key)
+        if plan is None:
+            ignore_fields = tuple(tuple(f.split('>')) for f in _except_fields)
+            plan = _serializer_plan(cls, ignore_fields, frozenset(), frozenset(_except_fields), max_level, 1)
+            _serializer_plans[key] = plan
+        return plan
+
     @classmethod
     def count(cls, **_params):
         """
@@ -382,6 +754,113 @@ class DataMixin(SessionMixin):
             cls.s.rollback()
             raise
 
+    @classmethod
+    def page_by_cursor(cls, cursor: str=None, per_page: int=20, **_params) -> tuple:
+        """
+        Keyset (seek) pagination: returns page of rows, which follow the row encoded in `cursor`, and cursor of the
+        next page. Unlike `all` with `page`, DB doesn't read and skip rows of all previous pages, so deep pages are
+        as fast as the first one:
+            rows, cursor = User.page_by_cursor(per_page=50, order_by='created desc', gender=1)
+            rows, cursor = User.page_by_cursor(cursor, per_page=50, order_by='created desc', gender=1)
+        Rows are ordered by `order_by` field and then by primary key, so order is stable for equal values. `order_by`
+        field shouldn't be nullable - rows with NULL in it are never reached by cursor
+        :param cursor: opaque cursor returned by previous call, `None` - first page
+        :param per_page: page size
+        :param _params: filtering params and `order_by`, the same as in `all`. They should be the same for all pages
+        :return: (list of rows, cursor of the next page or `None` if it's the last page)
+        """
+        order_by = _params.pop('order_by', None)
+        order_by_params = order_by.split(' ') if order_by else []
+        descending = len(order_by_params) > 1 and order_by_params[1] == 'desc'
+        order_function = desc if descending else asc
+        key_columns = [getattr(cls, order_by_params[0])] if order_by_params else []
+        key_columns += [getattr(cls, pk) for pk in cls.primary_keys]
+
+        try:
+            query = cls._prepare_parametrized_queue(**_params)
+            if cursor is not None:
+                values = cls._decode_cursor(cursor, order_by, key_columns)
+                # values are bound with types of their columns, so custom types process them
+                values = tuple_(*[bindparam(None, value, type_=column.type)
+                                  for column, value in zip(key_columns, values)])
+                if descending:
+                    query = query.filter(tuple_(*key_columns) < values)
+                else:
+                    query = query.filter(tuple_(*key_columns) > values)
+            rows = query.order_by(*[order_function(c) for c in key_columns]).limit(per_page + 1).all()
+        except SQLAlchemyError:
+            cls.s.rollback()
+            raise
+
+        if len(rows) <= per_page:
+            return rows, None
+        rows = rows[:per_page]
+        return rows, cls._encode_cursor(order_by, [getattr(rows[-1], c.key) for c in key_columns])
+
+    @staticmethod
+    def _encode_cursor(order_by: str or None, values: list) -> str:
+        """
+        Packs sort key of the last row of page into opaque url-safe cursor
+        """
+        values = [v.isoformat() if isinstance(v, (datetime.date, datetime.time)) else
+                  str(v) if isinstance(v, (decimal.Decimal, uuid.UUID)) else v for v in values]
+        payload = json.dumps({'o': order_by, 'v': values}, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+    @staticmethod
+    def _decode_cursor(cursor: str, order_by: str or None, key_columns: list) -> list:
+        """
+        Unpacks sort key from cursor, values of date/time columns are converted back from ISO format, values of
+        numeric and UUID columns - from strings. Cursor comes from client, so values of wrong types raise `M2Error`
+        as well as malformed cursor
+        """
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+            values = payload['v']
+            if not isinstance(values, list):
+                raise TypeError('Sort key should be a list')
+        except (ValueError, TypeError, KeyError):
+            raise M2Error('Malformed pagination cursor', True)
+        if payload.get('o') != order_by or len(values) != len(key_columns):
+            raise M2Error('Pagination cursor was made for another ordering', True)
+
+        for i, column in enumerate(key_columns):
+            try:
+                python_type = column.type.python_type
+            except NotImplementedError:
+                continue
+            value = values[i]
+            if value is None:
+                continue
+            if python_type in _CURSOR_STRING_TYPES:
+                if type(value) is not str:
+                    raise M2Error('Malformed pagination cursor', True)
+                try:
+                    if python_type in (decimal.Decimal, uuid.UUID):
+                        values[i] = python_type(value)
+                    else:
+                        values[i] = python_type.fromisoformat(value)
+                except (ValueError, TypeError, decimal.InvalidOperation):
+                    raise M2Error('Malformed pagination cursor', True)
+            elif python_type in _CURSOR_JSON_TYPES and type(value) not in _CURSOR_JSON_TYPES[python_type]:
+                raise M2Error('Malformed pagination cursor', True)
+        return values
+
+    @classmethod
+    def iter_all(cls, per_chunk: int=1000, **_params):
+        """
+        The same as `all`, but returns generator which fetches rows from DB by chunks of `per_chunk` rows (server-side
+        cursor is used by PostgreSQL), so even huge result sets are processed with constant memory:
+            handler.write_json_stream(User.iter_all(order_by='id asc'), serialize=lambda u: u.data('password'))
+        :param per_chunk: number of rows fetched from DB at once
+        :param _params: filtering params, the same as in `all`
+        """
+        try:
+            yield from cls._prepare_parametrized_queue(**_params).yield_per(per_chunk)
+        except SQLAlchemyError:
+            cls.s.rollback()
+            raise
+
     @classmethod
     def schema(cls, only_self: bool=False):
         """
@@ -416,3 +895,188 @@ class DataMixin(SessionMixin):
         except SQLAlchemyError:
             cls.s.rollback()
             raise
+
+    @classmethod
+    def _task_session(cls) -> Session:
+        """
+        Returns DB session bound to current asyncio task. It's created on first use and closed when task is done,
+        so every request handler coroutine gets its own session for async methods. Instances loaded by them belong
+        to this session, so their `save` and `delete` (sync or async) use it too. Inside of request scope
+        (`options.db_session_scope` is `request`) session of request is returned instead
+        """
+        task = asyncio.current_task()
+        if task is None:
+            raise M2Error('Async DataMixin methods should be awaited inside of a coroutine')
+        if request_scope.current_scope() is not None:
+            return cls.s()
+        session = _task_sessions.get(task)
+        if session is None:
+            session = cls.s.session_factory()
+            _task_sessions[task] = session
+            task.add_done_callback(lambda _: session.close())
+        return session
+
+    @classmethod
+    async def _run_async(cls, method: callable, *args, **kwargs):
+        """
+        Runs blocking DataMixin `method` in `cls.executor` with session bound to current task, so IOLoop is not
+        blocked by DB queries
+        """
+        return await cls._run_in_session(cls._task_session(), method, *args, **kwargs)
+
+    @classmethod
+    async def _run_in_session(cls, session: Session, method: callable, *args, **kwargs):
+        """
+        Runs blocking DataMixin `method` in `cls.executor` with `session`. Session is marked as used for the time of
+        the call, so several async methods run concurrently on one session (i.e. with `gather`) and sync methods
+        called meanwhile raise `M2Error` instead of sharing session between two threads
+        """
+        if session.info.get(_IN_USE) is not None:
+            raise M2Error('DB session is already used by other async DataMixin method, async methods of one task '
+                          'should be awaited one by one')
+        registry = cls.s.registry
+        # worker thread sees context of the task, i.e. timings of request (see `Instrumentation`)
+        context = contextvars.copy_context()
+
+        def run():
+            session.info[_IN_USE] = threading.get_ident()
+            if request_scope.current_scope() is not None:
+                # scope of request is in copied context too, so registry already returns session of request in the
+                # worker thread, and it's closed by `remove_scope`
+                return method(*args, **kwargs)
+            # bind session to the worker thread for the time of the call, keeping session the thread had
+            previous = registry() if registry.has() else None
+            registry.set(session)
+            try:
+                return method(*args, **kwargs)
+            finally:
+                if previous is not None:
+                    registry.set(previous)
+                else:
+                    registry.clear()
+
+        # reserved until worker thread takes session
+        session.info[_IN_USE] = 0
+        try:
+            return await IOLoop.current().run_in_executor(cls.executor, context.run, run)
+        finally:
+            session.info.pop(_IN_USE, None)
+
+    @classmethod
+    async def aload_by_pk(cls, _pk):
+        """
+        Async version of `load_by_pk`
+        """
+        return await cls._run_async(cls.load_by_pk, _pk)
+
+    @classmethod
+    async def aload_by_params(cls, **_params):
+        """
+        Async version of `load_by_params`
+        """
+        return await cls._run_async(functools.partial(cls.load_by_params, **_params))
+
+    @classmethod
+    async def aall(cls, page: int=0, per_page: int=0, **_params):
+        """
+        Async version of `all`
+        """
+        return await cls._run_async(functools.partial(cls.all, page, per_page, **_params))
+
+    @classmethod
+    async def acount(cls, **_params):
+        """
+        Async version of `count`
+        """
+        return await cls._run_async(functools.partial(cls.count, **_params))
+
+    @classmethod
+    async def acreate(cls, **_params):
+        """
+        Async version of `create`
+        """
+        return await cls._run_async(functools.partial(cls.create, **_params))
+
+    async def asave(self, flush_only=False):
+        """
+        Async version of `save`, runs in session of instance, so instances loaded by sync methods are saved too
+        """
+        return await self._run_in_session(object_session(self) or self._task_session(), self.save, flush_only)
+
+    async def adelete(self):
+        """
+        Async version of `delete`, runs in session of instance
+        """
+        return await self._run_in_session(object_session(self) or self._task_session(), self.delete)
+
+    @classmethod
+    async def acreate_many(cls, rows: list, batch_size: int=1000) -> int:
+        """
+        Async version of `create_many`
+        """
+        return await cls._run_async(cls.create_many, rows, batch_size)
+
+    @classmethod
+    async def aupsert_many(cls, rows: list, conflict_cols: list, update_cols: list=None, batch_size: int=1000) -> int:
+        """
+        Async version of `upsert_many`
+        """
+        return await cls._run_async(cls.upsert_many, rows, conflict_cols, update_cols, batch_size)
+
+    @classmethod
+    async def aupdate_many(cls, rows: list, batch_size: int=1000) -> int:
+        """
+        Async version of `update_many`
+        """
+        return await cls._run_async(cls.update_many, rows, batch_size)
+
+
+@event.listens_for(DataMixin, 'after_update', propagate=True)
+@event.listens_for(DataMixin, 'after_delete', propagate=True)
+def _on_row_changed(mapper, connection, target):
+    """
+    Drops updated and deleted rows of cached models, including changes made by `save` and `delete`
+    """
+    if mapper.class_.__cache__:
+        mapper.class_._forget_rows(object_session(target), {inspect(target).identity})
+
+
+@event.listens_for(Session, 'after_bulk_update')
+@event.listens_for(Session, 'after_bulk_delete')
+def _on_bulk_change(context):
+    """
+    Drops all rows of cached models changed by `Query.update` and `Query.delete`
+    """
+    cls = context.mapper.class_
+    if getattr(cls, '__cache__', None):
+        cls._forget_rows(context.session, None)
+
+
+@event.listens_for(Session, 'after_commit')
+def _on_commit(session):
+    """
+    Invalidates cached responses of tables changed in committed transaction with single call
+    """
+    models = session.info.pop(_CHANGED_MODELS, None)
+    if not models:
+        return
+    cache = next(iter(models)).response_cache
+    if cache is not None:
+        cache.invalidate(*{cls.__table__.name for cls in models})
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _on_transaction_end(session, transaction):
+    """
+    Drops rows changed in transaction once again, when it's committed or rolled back. Tables of rolled back
+    transaction are forgotten, responses made of them are still valid
+    """
+    if transaction.parent is not None:
+        return
+    session.info.pop(_CHANGED_MODELS, None)
+    if _CHANGED_ROWS not in session.info:
+        return
+    for cls, pks in session.info.pop(_CHANGED_ROWS).items():
+        cache = cls._row_cache()
+        if cache is not None:
+            cache.invalidate(cls.__table__.name, pks)
@@ -1,3 +1,4 @@
+from concurrent.futures import Executor
 from redis import StrictRedis
 from sqlalchemy.orm import Session, scoped_session, Query
 from m2core.utils.decorators import classproperty
@@ -51,6 +52,22 @@ class SessionMixin:
             raise M2Error('No Redis session defined')
         return cls._sh_cls(cls.r['connector'], cls.r['scheme'])
 
+    @classproperty
+    def ash(cls):
+        """
+        Returns instance of async Session Helper, available only with `options.redis_async` enabled
+        """
+        if not cls.r or not cls.r.get('async_connector'):
+            raise M2Error('No async Redis session defined')
+        return cls._ash_cls(cls.r['async_connector'], cls.r['scheme'])
+
+    @classmethod
+    def set_ash(cls, ash_cls):
+        """
+        Sets async Session Helper class during M2Core initialization with this method
+        """
+        cls._ash_cls = ash_cls
+
     @classmethod
     def set_sh(cls, sh_cls):
         """
@@ -58,6 +75,54 @@ class SessionMixin:
         """
         cls._sh_cls = sh_cls
 
+    @classmethod
+    def set_executor(cls, executor: Executor):
+        """
+        Sets executor, which runs DB queries of async methods (`aload_by_pk`, `asave`, etc.), during M2Core
+        initialization with this method
+        """
+        cls._executor = executor
+
+    @classproperty
+    def executor(cls) -> Executor:
+        """
+        Returns executor for DB queries of async methods
+        """
+        if getattr(cls, '_executor', None):
+            return cls._executor
+        else:
+            raise M2Error('No executor defined')
+
+    @classmethod
+    def set_response_cache(cls, cache):
+        """
+        Sets cache of JSON responses (`ResponseCache`) during M2Core initialization with this method, saved and
+        deleted models invalidate responses tagged with their tables
+        """
+        cls._response_cache = cache
+
+    @classproperty
+    def response_cache(cls):
+        """
+        Returns cache of JSON responses, `None` if it isn't defined
+        """
+        return getattr(cls, '_response_cache', None)
+
+    @classmethod
+    def set_model_cache(cls, cache):
+        """
+        Sets cache of model rows (`ModelCache`) during M2Core initialization with this method, it's used by models
+        with `__cache__` setting
+        """
+        cls._model_cache = cache
+
+    @classproperty
+    def model_cache(cls):
+        """
+        Returns cache of model rows, `None` if it isn't defined
+        """
+        return getattr(cls, '_model_cache', None)
+
     @classproperty
     def q(cls) -> Query:
         """
@@ -0,0 +1,2 @@
+from .metrics import MetricsHandler
+from .profiler import ProfilerHandler
@@ -0,0 +1,14 @@
+from m2core.m2core import M2Core
+from m2core.bases.base_handler import BaseHandler
+from m2core.utils.decorators import no_cache
+
+
+class MetricsHandler(BaseHandler):
+    @no_cache
+    @M2Core.user_can
+    def get(self, *args, **kwargs):
+        """
+        Metrics of all M2Core processes in Prometheus text format
+        """
+        self.set_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.finish(self.m2core.metrics.render())
@@ -0,0 +1,40 @@
+from tornado import gen
+from m2core.common.options import options
+from tornado.web import HTTPError
+from m2core.m2core import M2Core
+from m2core.bases.base_handler import BaseHandler, http_statuses
+from m2core.utils.decorators import no_cache
+from m2core.utils.error import M2Error
+from m2core.utils.profiler import SamplingProfiler
+
+
+class ProfilerHandler(BaseHandler):
+    @no_cache
+    @M2Core.user_can
+    async def get(self, *args, **kwargs):
+        """
+        Profiles this process for `seconds` (10 by default, `options.profiler_max_duration` at most) with sampling
+        `interval` (sec) and returns collapsed stacks grouped by human routes. Stacks of only one `route` could be
+        requested
+        """
+        try:
+            seconds = float(self.get_argument('seconds', 10))
+            interval = float(self.get_argument('interval', 0.005))
+        except ValueError:
+            raise HTTPError(http_statuses['WRONG_PARAM']['code'], http_statuses['WRONG_PARAM']['msg'])
+        if not 0 < seconds <= options.profiler_max_duration or not 0.001 <= interval <= 1:
+            raise HTTPError(http_statuses['WRONG_PARAM']['code'], http_statuses['WRONG_PARAM']['msg'])
+
+        profiler = SamplingProfiler(interval)
+        try:
+            profiler.start()
+        except M2Error:
+            raise HTTPError(http_statuses['WRONG_REQUEST']['code'], 'Profiler is already running in this process')
+        try:
+            await gen.sleep(seconds)
+        finally:
+            profiler.stop()
+
+        self.set_header('Content-Type', 'text/plain; charset=utf-8')
+        self.set_header('X-Profiler-Samples', profiler.count)
+        self.finish(profiler.collapsed(self.get_argument('route', None)))
@@ -1,11 +1,20 @@
 __author__ = 'Maxim Dutkin (max@dutkin.ru)'
 
 
+import asyncio
+import collections
 import functools
 import locale
 import logging
+import os
 import redis
+import signal
+import sys
+import time
+import tornado.httpserver
 import tornado.ioloop
+import tornado.netutil
+import tornado.process
 import tornado.web
 import warnings
 # needed for env initialization
@@ -21,19 +30,29 @@ from random import randint
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, scoped_session
 from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.pool import QueuePool
 from m2core.common.options import options
 from tornado.web import HTTPError, RequestHandler
 from tornado.websocket import WebSocketHandler
 from tornado.web import StaticFileHandler
+from tornado.routing import Rule, AnyMatches
 from concurrent.futures import ThreadPoolExecutor
 from typing import Type
 from voluptuous.error import Error as VoluptuousError
-from m2core.bases.base_handler import http_statuses
+from m2core.bases.base_handler import http_statuses, BaseHandler
 from m2core.utils.url_parser import UrlParser
-from m2core.utils.session_helper import SessionHelper
+from m2core.utils.route_tree import RouteTree
+from m2core.utils.session_helper import SessionHelper, AsyncSessionHelper
+from m2core.utils.cache import LRUCache
+from m2core.utils.response_cache import ResponseCache, permissions_key
+from m2core.utils.model_cache import ModelCache
+from m2core.utils.instrumentation import Instrumentation, phase
+from m2core.utils.metrics import Metrics
+from m2core.utils.watchdog import BlockingWatchdog
 from m2core.utils.permissions import HandlerPermissions
 from m2core.utils.error import M2Error
+from m2core.db import request_scope
 
 
 logger = logging.getLogger(__name__)
@@ -41,7 +60,7 @@ logger = logging.getLogger(__name__)
 
 class M2Core:
     handler_permissions = HandlerPermissions()
-    rules = Rules(lambda: {'validator': None, 'docs': {}, 'permissions': {}, 'group': None})
+    rules = Rules(lambda: {'validator': None, 'docs': {}, 'permissions': {}, 'compiled': {}, 'group': None})
 
     @staticmethod
     def requires_permission(handler_method_func):
@@ -89,36 +108,101 @@ class M2Core:
 
         @functools.wraps(handler_method)
         def decorated(handler_instance, *args, **kwargs):
-            permissions = M2Core.rules.permissions(handler_instance.human_route, method.upper())
-            # restricted method
-            if permissions is None:
-                raise HTTPError(http_statuses['METHOD_NOT_ALLOWED']['code'],
-                                http_statuses['METHOD_NOT_ALLOWED']['msg'])
-
-            if issubclass(type(permissions), Permission) or callable(permissions):
-                # didn't get user from Redis
-                if not handler_instance.current_user:
-                    # maybe it's permissions == PermissionsEnum.SKIP?
-                    if permissions({}):
-                        return handler_method(handler_instance, *args, **kwargs)
-                    else:
-                        raise HTTPError(http_statuses['WRONG_CREDENTIALS']['code'],
-                                        http_statuses['WRONG_CREDENTIALS']['msg'])
+            # user is resolved before the check, so it's Redis requests are timed as `redis` phase
+            current_user = handler_instance.current_user
+            with phase('permissions'):
+                M2Core._check_permissions(handler_instance.human_route, method, current_user)
+            return handler_method(handler_instance, *args, **kwargs)
 
-                user_generic_perms = handler_instance.current_user['permissions']
+        return decorated
 
+    @staticmethod
+    def _check_permissions(human_route: str, method: str, current_user: dict or None):
+        """
+        Raises HTTPError if `current_user` can't access handler `method`
+        """
+        permissions = M2Core.rules.permissions(human_route, method.upper())
+        # restricted method
+        if permissions is None:
+            raise HTTPError(http_statuses['METHOD_NOT_ALLOWED']['code'],
+                            http_statuses['METHOD_NOT_ALLOWED']['msg'])
+
+        if issubclass(type(permissions), Permission) or callable(permissions):
+            # didn't get user from Redis
+            if not current_user:
+                # maybe it's permissions == PermissionsEnum.SKIP?
+                if permissions({}):
+                    return
+                raise HTTPError(http_statuses['WRONG_CREDENTIALS']['code'],
+                                http_statuses['WRONG_CREDENTIALS']['msg'])
+
+            user_generic_perms = current_user['permissions']
+
+            compiled = M2Core.rules.compiled(human_route, method)
+            mask = PermissionsEnum.mask(user_generic_perms) if compiled is not None else None
+            if mask is not None:
+                check_result = compiled(mask)
+            else:
                 check_result = permissions(user_generic_perms)
-                if check_result:
+            if not check_result:
+                # user's rights are not enough to get into method
+                raise HTTPError(http_statuses['WRONG_CREDENTIALS']['code'],
+                                http_statuses['WRONG_CREDENTIALS']['msg'])
+        else:
+            raise HTTPError(http_statuses['SRV_INTERNAL_ERR'],
+                            'Handler permissions must be instance of `Permissions` or `callable`')
+
+    @staticmethod
+    def cached_response(ttl: float=None, tags: tuple=(), models: tuple=(), per_user: bool=False):
+        """
+        Decorator which caches JSON response of handler method, written by `BaseHandler.write_json` with 200 code.
+        Response is cached by route, url params, query arguments and permissions of user, responses get strong ETags
+        and requests with matching `If-None-Match` header are answered with 304. Put it after permissions check:
+
+            class UsersHandler(BaseHandler):
+                @M2Core.user_can
+                @M2Core.cached_response(ttl=30, models=(User, ))
+                async def get(self, *args, **kwargs):
+                    self.write_json(data=[u.data('password') for u in User.all()])
+
+        Saving or deleting of `models` by `DataMixin` invalidates response
+        :param ttl: time to live of response in seconds, `options.response_cache_ttl` by default
+        :param tags: tags to invalidate response with `ResponseCache.invalidate`
+        :param models: models response is made of, their table names are added to `tags`
+        :param per_user: cache response for each user separately, i.e. if it contains user's data
+        """
+        all_tags = tuple(tags) + tuple(model.__table__.name for model in models)
+        ResponseCache.use_tags(all_tags)
+
+        def decorator(handler_method):
+            method = handler_method.__qualname__.split('.')[1].upper()
+
+            @functools.wraps(handler_method)
+            def decorated(handler_instance, *args, **kwargs):
+                cache = EnchantedMixin.response_cache
+                if cache is None:
                     return handler_method(handler_instance, *args, **kwargs)
-                else:
-                    # user's rights are not enough to get into method
-                    raise HTTPError(http_statuses['WRONG_CREDENTIALS']['code'],
-                                    http_statuses['WRONG_CREDENTIALS']['msg'])
-            else:
-                raise HTTPError(http_statuses['SRV_INTERNAL_ERR'],
-                                'Handler permissions must be instance of `Permissions` or `callable`')
 
-        return decorated
+                user = handler_instance.current_user
+                key = cache.key(
+                    handler_instance.human_route,
+                    method,
+                    kwargs,
+                    handler_instance.request.query_arguments,
+                    [permissions_key(user['permissions']), user['id'] if per_user else None] if user else None,
+                    all_tags
+                )
+                cached = cache.get(key)
+                if cached is not None:
+                    handler_instance.write_cached_json(*cached)
+                    return None
+                # response is stored by `write_json`
+                handler_instance.cache_response(key, ttl)
+                return handler_method(handler_instance, *args, **kwargs)
+
+            return decorated
+
+        return decorator
 
     @staticmethod
     def tryex(*errors):
@@ -219,15 +303,25 @@ class M2Core:
         self.__db_engine = None  # engine for db_session
         self.__db_session = None  # singleton of SQLAlchemy connections pool
         self.__redis_session = None  # singleton of Redis connections pool
+        self.__async_redis_session = None  # singleton of asyncio Redis connections pool
+        self.__session_cache_listener = None  # thread which listens for resolved users cache invalidations
+        self.__model_cache_listener = None  # thread which listens for model rows cache invalidations
         self.__redis_scheme = redis_scheme  # Redis key mapping
         self.__thread_pool = None  # thread pool for doing some jobs in background
         self.__custom_response_headers = dict()  # custom headers, which will be mixed in every response
         self.__endpoints = list()  # list of Tornado routes with handler classes, permissions
         self.__handler_docs = dict()  # all docstrings of all methods of all routes
         self.__handler_validators = dict()  # all validators (UrlParser instance) of all methods of all routes
+        self.__url_parsers = list()  # UrlParser instance of each endpoint, used by `RouteTree`
         self.__started = False
         self.__app = None
         self.__test_users = dict()  # used for impersonation users during integration tests
+        self.__callbacks = list()  # callbacks added with `add_callback` before start
+        self.__workers = dict()  # pid => worker id, filled only in master process of prefork mode
+        self.__shutting_down = False
+        self.__metrics = None  # metrics of current process, see `enable_metrics`
+        self.__metrics_enabled = False
+        self.__watchdog = None  # detector of blocked IOLoop, see `options.blocking_threshold`
 
         # make singleton of thread pool
         self.__make_thread_pool()
@@ -242,10 +336,22 @@ class M2Core:
         """
         Init Tornado
         """
-        return tornado.web.Application(
-            [endpoint for endpoint in self.__endpoints],
+        if options.router not in ('tornado', 'tree'):
+            raise M2Error('Unknown router `%s`, use `tornado` or `tree`' % options.router)
+        # all handlers are routed at this point, responses are cached only if some of them uses `cached_response`
+        EnchantedMixin.set_response_cache(ResponseCache(
+            options.response_cache_storage,
+            options.response_cache_size,
+            options.response_cache_ttl,
+            self.__redis_session,
+            self.__redis_scheme
+        ) if ResponseCache.in_use else None)
+
+        app = tornado.web.Application(
+            [endpoint for endpoint in self.__endpoints] if options.router == 'tornado' else [],
             redis={
                 'connector': self.__redis_session,
+                'async_connector': self.__async_redis_session,
                 'scheme': self.__redis_scheme
             },
             db=self.__db_session,
@@ -258,6 +364,11 @@ class M2Core:
             debug=options.debug,
             **options.tornado_application_kwargs
         )
+        if options.router == 'tree':
+            app.wildcard_router.add_rules([
+                Rule(AnyMatches(), RouteTree(app, self.__endpoints, self.__url_parsers, typed_handlers=(BaseHandler, )))
+            ])
+        return app
 
     def route(self, human_route: str=None, handler_cls: Type[RequestHandler]=None, rule_group: str=None,
               extra: dict=None, **kwargs):
@@ -296,6 +407,7 @@ class M2Core:
         if extra:
             tornado_handler_params.update(extra)
 
+        self.__url_parsers.append(url_parser)
         if issubclass(handler_cls, StaticFileHandler):
             # for StaticFileHandler we have to reduce kwargs because of its initialize method
             self.__endpoints.append(
@@ -377,6 +489,7 @@ class M2Core:
         }
         tornado_handler_params.update(extra_params)
 
+        self.__url_parsers.append(url_parser)
         if StaticFileHandler in handler_class.__bases__ or StaticFileHandler == handler_class:
             # for StaticFileHandler we have to reduce kwargs because of its initialize method
             self.__endpoints.append(
@@ -397,6 +510,41 @@ class M2Core:
 
         self.__handler_validators[human_route] = url_parser
 
+    def enable_metrics(self, human_route: str='/metrics', permission=PermissionsEnum.SKIP, rule_group: str=None):
+        """
+        Adds route with metrics of all processes in Prometheus text format: requests by route, method and status,
+        histograms of request time and it's phases, DB and Redis pools usage, thread pool queue depth and IOLoop lag.
+        Request timings are collected only with `options.instrumentation` enabled:
+
+            m2core.enable_metrics('/metrics', PermissionsEnum.ADMIN)
+
+        :param human_route: url of metrics
+        :param permission: permission rule of GET method, metrics are public by default
+        :param rule_group: rule group of route
+        """
+        from m2core.handlers.metrics import MetricsHandler
+        self.route(human_route=human_route, handler_cls=MetricsHandler, rule_group=rule_group, get=permission)
+        self.__metrics_enabled = True
+
+    def enable_profiler(self, permission: Permission, human_route: str='/profiler', rule_group: str=None):
+        """
+        Adds route, which profiles process serving the request by `SamplingProfiler` for `seconds` and returns
+        collapsed stacks (for `flamegraph.pl` or speedscope) grouped by human routes of handlers. Profiler shows
+        internals of application, so route requires permission:
+
+            m2core.enable_profiler(PlatformPermissions.AUTHORIZED & PlatformPermissions.ADMIN)
+
+            curl -H 'X-Access-Token: ...' 'http://localhost:8888/profiler?seconds=30' | flamegraph.pl > app.svg
+
+        :param permission: permission rule of GET method
+        :param human_route: url of profiler
+        :param rule_group: rule group of route
+        """
+        if not isinstance(permission, Permission):
+            raise M2Error('Profiler route requires permission rule, `%r` is given' % permission)
+        from m2core.handlers.profiler import ProfilerHandler
+        self.route(human_route=human_route, handler_cls=ProfilerHandler, rule_group=rule_group, get=permission)
+
     def add_endpoint_method_permissions(self, human_route: str, method: str, permissions: list or None):
         """
         Adds permissions for specified method of handler, accessed by `human_route`
@@ -482,6 +630,50 @@ class M2Core:
         """
         return self.__redis_session
 
+    @property
+    def async_redis_session(self):
+        """
+        Getter of asyncio Redis sessions pool, `None` if `options.redis_async` is disabled
+        """
+        return self.__async_redis_session
+
+    @property
+    def session_cache(self) -> LRUCache or None:
+        """
+        Getter of process-local cache of resolved users, `None` if `options.session_cache_size` is 0
+        """
+        return SessionHelper.cache()
+
+    @property
+    def model_cache(self) -> ModelCache or None:
+        """
+        Getter of cache of model rows, `stats()` of it returns hit ratio by tables
+        """
+        return EnchantedMixin.model_cache
+
+    @property
+    def metrics(self) -> Metrics:
+        """
+        Getter of metrics of current process, see `enable_metrics`
+        """
+        if self.__metrics is None:
+            self.__metrics = Metrics(
+                self.__db_engine,
+                self.__redis_session,
+                self.__redis_scheme,
+                self.__thread_pool,
+                options.metrics_interval
+            )
+        return self.__metrics
+
+    @property
+    def watchdog(self) -> BlockingWatchdog or None:
+        """
+        Getter of detector of blocked IOLoop of current process, `reports()` of it returns the last reports. `None`
+        if `options.blocking_threshold` is 0 or server isn't started
+        """
+        return self.__watchdog
+
     @property
     def redis_tables(self) -> dict:
         """
@@ -510,6 +702,12 @@ class M2Core:
             **options.engine_kwargs
         )
 
+        if options.instrumentation:
+            Instrumentation.instrument_engine(self.__db_engine)
+
+        if options.db_session_scope not in ('thread', 'request'):
+            raise M2Error('Unknown DB session scope `%s`, use `thread` or `request`' % options.db_session_scope)
+
         self.__db_session = scoped_session(
             sessionmaker(
                 autoflush=False,
@@ -517,11 +715,13 @@ class M2Core:
                 expire_on_commit=True,
                 bind=self.__db_engine,
                 **options.session_kwargs
-            )
+            ),
+            scopefunc=request_scope.scope_func if options.db_session_scope == 'request' else None
         )
 
         EnchantedMixin.set_db_session(self.__db_session)
         EnchantedMixin.set_sh(SessionHelper)
+        EnchantedMixin.set_executor(self.__thread_pool)
 
     def __make_thread_pool(self):
         """
@@ -542,10 +742,69 @@ class M2Core:
                 **options.redis_connection_pool_kwargs
             ),
         )
+        if options.redis_async:
+            try:
+                from redis import asyncio as async_redis
+            except ImportError:
+                raise M2Error('`redis_async` option requires redis>=4.2')
+            self.__async_redis_session = async_redis.StrictRedis(
+                connection_pool=async_redis.ConnectionPool(
+                    host=options.redis_host,
+                    port=str(options.redis_port),
+                    db=options.redis_db,
+                    decode_responses=True,
+                    **options.redis_connection_pool_kwargs
+                ),
+            )
         EnchantedMixin.set_redis_session({
             'connector': self.__redis_session,
+            'async_connector': self.__async_redis_session,
             'scheme': self.__redis_scheme
         })
+        EnchantedMixin.set_ash(AsyncSessionHelper)
+        SessionHelper.set_cache(
+            LRUCache(options.session_cache_size, options.session_cache_ttl) if options.session_cache_size > 0
+            else None
+        )
+        EnchantedMixin.set_model_cache(ModelCache(
+            options.model_cache_storage,
+            options.model_cache_size,
+            options.model_cache_ttl,
+            self.__redis_session,
+            self.__redis_scheme,
+            options.model_cache_channel
+        ))
+
+    def __listen_session_invalidation(self):
+        """
+        Subscribes to Redis channel with invalidation messages for resolved users cache. Messages are handled
+        in background thread
+        """
+        if SessionHelper.cache() is None or self.__session_cache_listener is not None:
+            return
+
+        def on_message(message):
+            SessionHelper.apply_invalidation(message['data'])
+
+        pubsub = self.__redis_session.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{options.session_cache_channel: on_message})
+        self.__session_cache_listener = pubsub.run_in_thread(sleep_time=1, daemon=True)
+
+    def __listen_model_invalidation(self):
+        """
+        Subscribes to Redis channel with invalidation messages for process-local cache of model rows (`both` storage
+        of `ModelCache`). Messages are handled in background thread
+        """
+        cache = EnchantedMixin.model_cache
+        if cache is None or cache.channel is None or self.__model_cache_listener is not None:
+            return
+
+        def on_message(message):
+            cache.apply_invalidation(message['data'])
+
+        pubsub = self.__redis_session.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{cache.channel: on_message})
+        self.__model_cache_listener = pubsub.run_in_thread(sleep_time=1, daemon=True)
 
     def add_callback(self, callback: callable, *args, **kwargs):
         """
@@ -553,7 +812,11 @@ class M2Core:
         and kwargs). Additionally, an instance of inited M2Core will be passed as kwarg `m2core`.
         :param callback: reference to your callback
         """
-        tornado.ioloop.IOLoop.current().add_callback(callback, m2core=self, *args, **kwargs)
+        if self.__started:
+            tornado.ioloop.IOLoop.current().add_callback(callback, m2core=self, *args, **kwargs)
+        else:
+            # IOLoop of every worker is created only after fork, so callbacks are scheduled on start
+            self.__callbacks.append(functools.partial(callback, m2core=self, *args, **kwargs))
 
     def extended(self, callback: callable):
         """
@@ -576,28 +839,176 @@ class M2Core:
         """
         self.__custom_response_headers = headers
 
-    def run(self):
+    def run(self, workers: int=None):
         """
-        Launches Tornado web server
+        Launches Tornado web server. With `workers` > 1 (or `options.workers`) binds sockets once and forks
+        worker processes, which serve requests on them. Master process syncs permissions and roles, restarts
+        crashed workers and stops them gracefully on SIGTERM
+        :param workers: number of worker processes, 0 - one per CPU core, `options.workers` by default
         """
+        workers = options.workers if workers is None else workers
+        if workers <= 0:
+            workers = tornado.process.cpu_count()
         locale.setlocale(locale.LC_TIME, options.locale)
+        if workers == 1:
+            self.__app = self.__make_app()
+            self.__app.listen(
+                options.server_port,
+                address=options.server_listen_ip,
+                **options.http_server_kwargs
+            )
+            # write all permissions and roles to DB
+            self.__callbacks.append(sync_permissions)
+            # dump all permissions and roles to Redis
+            self.__callbacks.append(dump_roles)
+            self.__start_io_loop()
+            return
+
+        self.__share_caches()
+        sockets = tornado.netutil.bind_sockets(options.server_port, address=options.server_listen_ip)
+        # sync permissions only once, workers get them with the memory of master
+        sync_permissions()
+        dump_roles()
+        # connections and threads can't be shared with forked processes
+        self.__db_session.remove()
+        self.__db_engine.dispose()
+        self.__redis_session.connection_pool.disconnect()
+        self.__thread_pool.shutdown(wait=True)
+
+        if self.__fork_workers(workers) is None:
+            # master process, all workers are stopped
+            return
+
+        self.__make_thread_pool()
+        self.__make_db_session()
+        self.__make_redis_session()
+        self.__metrics = None
+        asyncio.set_event_loop(asyncio.new_event_loop())
         self.__app = self.__make_app()
-        self.__app.listen(
-            options.server_port,
-            address=options.server_listen_ip,
-            **options.http_server_kwargs
-        )
-        # write all permissions and roles to DB
-        tornado.ioloop.IOLoop.current().add_callback(sync_permissions)
-        # dump all permissions and roles to Redis
-        tornado.ioloop.IOLoop.current().add_callback(dump_roles)
+        server = tornado.httpserver.HTTPServer(self.__app, **options.http_server_kwargs)
+        server.add_sockets(sockets)
+        io_loop = tornado.ioloop.IOLoop.current()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            io_loop.asyncio_loop.add_signal_handler(sig, lambda: io_loop.add_callback(self.__stop_worker, server))
+        self.__start_io_loop()
+        # don't return to the code after `run` in every worker
+        sys.exit(0)
+
+    @staticmethod
+    def __share_caches():
+        """
+        Replaces `local` storages of response and model caches with `both` before workers are forked: process-local
+        caches are invalidated only in worker, which changed data, so others would return stale data until TTL
+        """
+        for name in ('response_cache_storage', 'model_cache_storage'):
+            if options[name] == 'local':
+                logger.warning('`local` storage of `%s` can\'t be invalidated in other workers, `both` storage is used '
+                               'instead' % name)
+                options[name] = 'both'
+
+    def __start_io_loop(self):
+        """
+        Schedules callbacks added before start and runs IOLoop of current process
+        """
+        io_loop = tornado.ioloop.IOLoop.current()
+        for callback in self.__callbacks:
+            io_loop.add_callback(callback)
+        self.__listen_session_invalidation()
+        self.__listen_model_invalidation()
+        if self.__metrics_enabled:
+            self.metrics.start()
+        if options.blocking_threshold > 0:
+            self.__watchdog = BlockingWatchdog(
+                options.blocking_threshold,
+                options.blocking_buffer_size,
+                options.blocking_report_interval
+            )
+            self.__watchdog.start()
         self.__started = True
         logger.info('Starting M2Core...')
         try:
-            tornado.ioloop.IOLoop.current().start()
+            io_loop.start()
         except KeyboardInterrupt:
             pass
 
+    def __fork_workers(self, workers: int) -> int or None:
+        """
+        Forks `workers` processes and supervises them until all of them exit. Workers, which exited abnormally, are
+        restarted with the same id, unless master is shutting down
+        :param workers: number of processes
+        :return: id of worker in forked process, `None` in master
+        """
+        def start_worker(worker_id: int) -> int or None:
+            pid = os.fork()
+            if pid == 0:
+                self.__workers.clear()
+                for sig in (signal.SIGTERM, signal.SIGINT):
+                    signal.signal(sig, signal.SIG_DFL)
+                return worker_id
+            self.__workers[pid] = worker_id
+            return None
+
+        def shutdown(signum, frame):
+            self.__shutting_down = True
+            for pid in list(self.__workers):
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                except ProcessLookupError:
+                    pass
+
+        signal.signal(signal.SIGTERM, shutdown)
+        signal.signal(signal.SIGINT, shutdown)
+        logger.info('Starting %s M2Core workers...' % workers)
+        for i in range(workers):
+            if start_worker(i) is not None:
+                return i
+
+        # times of the last restarts within `options.worker_restarts_period`
+        restarts = collections.deque()
+        while self.__workers:
+            pid, status = os.wait()
+            if pid not in self.__workers:
+                continue
+            worker_id = self.__workers.pop(pid)
+            if os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0 or self.__shutting_down:
+                logger.info('Worker %s (pid %s) exited' % (worker_id, pid))
+                continue
+            logger.warning('Worker %s (pid %s) died with status %s, restarting' % (worker_id, pid, status))
+            now = time.monotonic()
+            restarts.append(now)
+            while restarts[0] < now - options.worker_restarts_period:
+                restarts.popleft()
+            if len(restarts) > options.max_worker_restarts:
+                shutdown(None, None)
+                raise M2Error('Too many worker restarts, giving up')
+            if start_worker(worker_id) is not None:
+                return worker_id
+        logger.info('All M2Core workers stopped')
+        return None
+
+    async def __stop_worker(self, server: tornado.httpserver.HTTPServer):
+        """
+        Stops accepting new connections, waits for in-flight requests and stops IOLoop of worker
+        """
+        if self.__shutting_down:
+            return
+        self.__shutting_down = True
+        logger.info('Stopping M2Core worker %s...' % os.getpid())
+        await self.__drain(server)
+        tornado.ioloop.IOLoop.current().stop()
+
+    @staticmethod
+    async def __drain(server: tornado.httpserver.HTTPServer):
+        """
+        Stops accepting new connections and closes existing ones, when in-flight requests complete, but not later
+        than in `options.shutdown_timeout` seconds
+        """
+        server.stop()
+        deadline = time.monotonic() + options.shutdown_timeout
+        while BaseHandler.requests_in_flight and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        await server.close_all_connections()
+
     def run_with_recreate(self):
         """
         Does exactly the same as `run` method, but firstly recreates DB structure
@@ -642,72 +1053,102 @@ class M2Core:
         return self.__test_users.get(at)
 
 
+def _insert_missing(model, rows: list, conflict_cols: list) -> int:
+    """
+    Inserts `rows`, which weren't found in DB, in current transaction. PostgreSQL skips rows, which were inserted by
+    concurrently starting process in the meantime, with `ON CONFLICT DO NOTHING`
+    """
+    if not rows:
+        return 0
+    if model.s.bind.dialect.name == 'postgresql':
+        return model.upsert_many(rows, conflict_cols, update_cols=[], commit=False)
+    return model.create_many(rows, commit=False)
+
+
 def sync_permissions():
     """
     Syncs permissions, received from all method of all handlers per each human route during initialization
-    and stores them in DB, also with caching them in Redis
+    and stores them in DB, also with caching them in Redis. Reconciliation is set-based: existing roles, permissions
+    and admin links are read by one query each and all missing rows are inserted by bulk statements in one transaction
     """
-    # load or create default admin role
-    admin_role = M2Role.load_by_params(name=options.admin_role_name)
-    # admin group, which holds all new added permissions
-    if not admin_role:
-        # if there is no such group (i.e. - first run) - create it
-        admin_role = M2Role.load_or_create(
-            name=options.admin_role_name,
-            description='Superuser role with all existing permissions'
+    started = time.perf_counter()
+    session = M2Permission.s
+    try:
+        # admin role holds all permissions, default role is given to all authorized users
+        roles = {
+            options.admin_role_name: 'Superuser role with all existing permissions',
+            options.default_role_name: 'Default user role',
+        }
+        role_ids = dict(session.query(M2Role.name, M2Role.id).filter(M2Role.name.in_(list(roles))).all())
+        _insert_missing(
+            M2Role,
+            [{'name': name, 'description': description} for name, description in roles.items() if name not in role_ids],
+            ['name']
         )
-    # default group for all authorized users
-    default_role = M2Role.load_by_params(name=options.default_role_name)
-    if not default_role:
-        # if there is no such group (i.e. - first run) - create it
-        default_role = M2Role.create(
-            name=options.default_role_name,
-            description='Default user role'
+        if len(role_ids) < len(roles):
+            role_ids = dict(session.query(M2Role.name, M2Role.id).filter(M2Role.name.in_(list(roles))).all())
+        admin_role_id = role_ids[options.admin_role_name]
+        default_role_id = role_ids[options.default_role_name]
+
+        # default permission, which will be added to all newly created users, and all platform permissions
+        permissions = {
+            options.default_permission: {'name': options.default_permission, 'system_name': options.default_permission}
+        }
+        for p in PermissionsEnum.all_platform_permissions:
+            permissions.setdefault(p.sys_name, {'name': p.name, 'system_name': p.sys_name, 'description': p.description})
+        permission_ids = dict(session.query(M2Permission.system_name, M2Permission.id).all())
+        new_permissions = _insert_missing(
+            M2Permission,
+            [row for system_name, row in permissions.items() if system_name not in permission_ids],
+            ['system_name']
         )
-
-    # now we add default permission, which will be added to all newly created users
-    permission = M2Permission.load_by_params(name=options.default_permission)
-    if not permission:
-        permission = M2Permission.create(name=options.default_permission, system_name=options.default_permission)
-    M2RolePermission.load_or_create(
-        role_id=default_role.get('id'),
-        permission_id=permission.get('id')
-    )
-    logger.debug(f'added {permission} for `default` role to DB')
-
-    # for new permissions model
-    all_perms = PermissionsEnum.all_platform_permissions
-    for p in all_perms:
-        permission = M2Permission.load_by_params(
-            system_name=p.sys_name
+        if new_permissions:
+            permission_ids = dict(session.query(M2Permission.system_name, M2Permission.id).all())
+
+        links = {(default_role_id, permission_ids[options.default_permission])}
+        links.update((admin_role_id, permission_ids[p.sys_name]) for p in PermissionsEnum.all_platform_permissions)
+        existing_links = set(
+            session.query(M2RolePermission.role_id, M2RolePermission.permission_id).filter(
+                M2RolePermission.role_id.in_([admin_role_id, default_role_id])
+            ).all()
         )
-        logger.debug(f'checking {permission}')
-        if not permission:
-            permission = M2Permission.create(
-                name=p.name,
-                system_name=p.sys_name,
-                description=p.description
-            )
-            M2RolePermission.create(
-                role_id=admin_role.get('id'),
-                permission_id=permission.get('id')
-            )
-            logger.debug(f'added {permission} for `admin` role to DB')
-        else:
-            M2RolePermission.load_or_create(
-                role_id=admin_role.get('id'),
-                permission_id=permission.get('id')
-            )
-            logger.debug(f'added {permission} for `admin` role to DB')
-            pass
+        new_links = _insert_missing(
+            M2RolePermission,
+            [{'role_id': role_id, 'permission_id': permission_id} for role_id, permission_id in links - existing_links],
+            ['role_id', 'permission_id']
+        )
+        session.commit()
+    except SQLAlchemyError:
+        session.rollback()
+        raise
+
+    # rebuild permissions index, which is used when resolving user permissions on each request
+    M2Permission.refresh_index()
+    logger.info(f'synced {len(permissions)} permissions ({new_permissions} new, {new_links} new role links) '
+                f'in {(time.perf_counter() - started) * 1000:.1f} ms')
 
 
 def dump_roles():
     """
-    Caches all permissions of each role to Redis
+    Caches all permissions of each role to Redis: pairs role -> permission are taken by one join query and written
+    by one Redis pipeline
     """
-    # TODO: complete refactoring
-    roles = M2Role.all()
-    for role in roles:
-        role.dump_role_permissions()
-        logger.debug(f'dumped role {role} to Redis')
+    started = time.perf_counter()
+    try:
+        pairs = M2Role.s.query(M2Role.id, M2Permission.system_name). \
+            outerjoin(M2RolePermission, M2RolePermission.role_id == M2Role.id). \
+            outerjoin(M2Permission, M2Permission.id == M2RolePermission.permission_id). \
+            all()
+    except SQLAlchemyError:
+        M2Role.s.rollback()
+        raise
+
+    role_permissions = dict()
+    for role_id, system_name in pairs:
+        permissions = role_permissions.setdefault(role_id, [])
+        # roles without permissions are dumped as empty
+        if system_name is not None:
+            permissions.append(system_name)
+    M2Role.sh.dump_roles_permissions(role_permissions)
+    logger.info(f'dumped {len(role_permissions)} roles ({len(pairs)} permissions) to Redis '
+                f'in {(time.perf_counter() - started) * 1000:.1f} ms')
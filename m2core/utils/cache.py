@@ -0,0 +1,95 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Bounded in-process cache with least recently used eviction and per-entry TTL. Thread safe, also counts
+    hits and misses
+    """
+    def __init__(self, max_size: int=1024, ttl: float or None=None):
+        """
+        Constructor
+        :param max_size: maximum number of entries, the least recently used one is evicted on overflow
+        :param ttl: time to live of each entry in seconds, `None` - entries never expire
+        """
+        if max_size <= 0:
+            raise AttributeError('`max_size` should be > 0')
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        """
+        Returns value by key or `default` if there is no such key or it has already expired
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl: float or None=None):
+        """
+        Stores value by key
+        :param ttl: custom TTL for this entry, `self.ttl` by default
+        """
+        ttl = ttl if ttl is not None else self.ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        """
+        Removes entry by key and returns its value
+        """
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return entry[0] if entry is not None else default
+
+    def pop_matching(self, predicate: callable) -> int:
+        """
+        Removes all entries which values satisfy `predicate(value)`
+        :return: number of removed entries
+        """
+        with self._lock:
+            keys = [k for k, (v, _) in self._data.items() if predicate(v)]
+            for k in keys:
+                del self._data[k]
+        return len(keys)
+
+    def clear(self):
+        """
+        Removes all entries
+        """
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        """
+        Returns cache usage info
+        """
+        total = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total else 0.0,
+        }
+
+    def __len__(self):
+        return len(self._data)
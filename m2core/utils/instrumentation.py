@@ -0,0 +1,292 @@
+import bisect
+import logging
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from sqlalchemy import event
+
+
+logger = logging.getLogger(__name__)
+
+# timings of current request. Tornado runs every request handler in it's own asyncio task, which copies context
+# of the connection, so value set in `BaseHandler.__init__` is seen only by coroutines of this request
+_current_timings = ContextVar('m2core_timings', default=None)
+
+
+class RequestTimings:
+    """
+    Time spent by one request in each phase (`redis`, `db`, `permissions`, `validation`, `serialize`, etc.),
+    number of times phase was entered and SQL statements executed by request
+    """
+    __slots__ = ('phases', 'queries')
+
+    def __init__(self):
+        # phase name -> [seconds, count]
+        self.phases = dict()
+        # SQL statement with placeholders of parameters -> number of executions
+        self.queries = Counter()
+
+    def add(self, name: str, seconds: float):
+        entry = self.phases.get(name)
+        if entry is None:
+            self.phases[name] = [seconds, 1]
+        else:
+            entry[0] += seconds
+            entry[1] += 1
+
+    def server_timing(self, total: float) -> str:
+        """
+        Returns value of `Server-Timing` header with durations of phases and total request time in milliseconds
+        """
+        metrics = ['%s;dur=%.3f' % (name, seconds * 1000) for name, (seconds, _) in self.phases.items()]
+        metrics.append('total;dur=%.3f' % (total * 1000))
+        return ', '.join(metrics)
+
+    def repeated(self, threshold: int) -> dict:
+        """
+        Returns SQL statements executed more than `threshold` times, like lazy loads of relationship for every row
+        of result (N+1 queries)
+        """
+        return {statement: count for statement, count in self.queries.items() if count > threshold}
+
+
+class _Phase:
+    __slots__ = ('timings', 'name', 'started')
+
+    def __init__(self, timings: RequestTimings, name: str):
+        self.timings = timings
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.timings.add(self.name, time.perf_counter() - self.started)
+
+
+class _NoPhase:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+
+_no_phase = _NoPhase()
+
+
+def phase(name: str):
+    """
+    Context manager, which adds time of it's block to phase `name` of current request. Outside of requests
+    (or with `options.instrumentation` disabled) it does nothing:
+
+        with phase('geocoder'):
+            address = geocoder.reverse(lat, lon)
+    """
+    timings = _current_timings.get()
+    if timings is None:
+        return _no_phase
+    return _Phase(timings, name)
+
+
+class Histogram:
+    """
+    Distribution of durations by fixed buckets (in seconds), the same as Prometheus histograms have
+    """
+    BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    __slots__ = ('counts', 'count', 'sum')
+
+    def __init__(self):
+        # the last one counts values greater than all buckets
+        self.counts = [0] * (len(Histogram.BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(Histogram.BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def quantile(self, q: float) -> float or None:
+        """
+        Returns upper bound of bucket, which holds `q` quantile of values (`inf` if it's beyond all buckets)
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return Histogram.BUCKETS[i] if i < len(Histogram.BUCKETS) else float('inf')
+        return float('inf')
+
+    def snapshot(self) -> dict:
+        """
+        Returns count, sum, cumulative counts of buckets (`le` -> count) and estimated p50/p95/p99
+        """
+        buckets = dict()
+        seen = 0
+        for bound, count in zip(Histogram.BUCKETS + (float('inf'), ), self.counts):
+            seen += count
+            buckets[bound] = seen
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'buckets': buckets,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+        }
+
+
+class Instrumentation:
+    """
+    Collects timings of requests: `BaseHandler` starts them with `start`, hot paths add phases with `phase` and
+    `BaseHandler.on_finish` passes them to `finish`, which aggregates them to histograms per human route, method
+    and phase (`total` - whole request time), and calls subscribers. Exporters subscribe like this:
+
+        def export(record: dict):
+            statsd.timing('%s.%s' % (record['route'], record['method']), record['total'])
+
+        Instrumentation.subscribe(export)
+
+    Record has `route`, `method`, `status`, `total` (sec), `phases` (phase name -> sec) and `queries` (SQL statement
+    -> number of executions) keys. Requests, which execute the same statement more than `repeat_threshold` times,
+    are logged as possible N+1 queries
+    """
+    _histograms = dict()
+    _subscribers = list()
+    _lock = threading.Lock()
+
+    @classmethod
+    def start(cls) -> RequestTimings:
+        """
+        Starts timings of request in current context
+        """
+        timings = RequestTimings()
+        _current_timings.set(timings)
+        return timings
+
+    @staticmethod
+    def current() -> RequestTimings or None:
+        """
+        Returns timings of current request or `None`
+        """
+        return _current_timings.get()
+
+    @classmethod
+    def subscribe(cls, callback: callable):
+        """
+        Adds callback, which gets record of every finished request
+        """
+        with cls._lock:
+            cls._subscribers = cls._subscribers + [callback]
+
+    @classmethod
+    def unsubscribe(cls, callback: callable):
+        with cls._lock:
+            cls._subscribers = [s for s in cls._subscribers if s != callback]
+
+    @classmethod
+    def finish(cls, timings: RequestTimings, route: str, method: str, status: int, total: float,
+               repeat_threshold: int=0):
+        """
+        Aggregates timings of finished request and passes it's record to subscribers
+        :param timings: timings of request
+        :param route: human route of handler
+        :param method: HTTP method
+        :param status: response status code
+        :param total: request time in seconds
+        :param repeat_threshold: warn about SQL statements executed more times, 0 - don't check
+        """
+        phases = {name: seconds for name, (seconds, _) in timings.phases.items()}
+        if repeat_threshold and len(timings.queries) < sum(timings.queries.values()):
+            for statement, count in timings.repeated(repeat_threshold).items():
+                logger.warning('Possible N+1 queries: %s %s executed %s times\n%s', method, route, count, statement)
+        with cls._lock:
+            cls._observe(route, method, 'total', total)
+            for name, seconds in phases.items():
+                cls._observe(route, method, name, seconds)
+
+        record = {'route': route, 'method': method, 'status': status, 'total': total, 'phases': phases,
+                  'queries': timings.queries}
+        for callback in cls._subscribers:
+            try:
+                callback(record)
+            except Exception:
+                logger.exception('Instrumentation subscriber %r failed', callback)
+
+    @classmethod
+    def _observe(cls, route: str, method: str, name: str, seconds: float):
+        key = (route, method, name)
+        histogram = cls._histograms.get(key)
+        if histogram is None:
+            histogram = cls._histograms[key] = Histogram()
+        histogram.observe(seconds)
+
+    @classmethod
+    def histograms(cls) -> dict:
+        """
+        Returns snapshots of histograms: {human route: {method: {phase: snapshot}}}
+        """
+        result = dict()
+        with cls._lock:
+            for (route, method, name), histogram in cls._histograms.items():
+                result.setdefault(route, dict()).setdefault(method, dict())[name] = histogram.snapshot()
+        return result
+
+    @classmethod
+    def dump(cls) -> list:
+        """
+        Returns raw histograms, which could be summed with histograms of other processes:
+        [[human route, method, phase, counts of buckets, sum], ...]
+        """
+        with cls._lock:
+            return [[route, method, name, list(histogram.counts), histogram.sum]
+                    for (route, method, name), histogram in cls._histograms.items()]
+
+    @classmethod
+    def reset(cls):
+        """
+        Drops all histograms
+        """
+        with cls._lock:
+            cls._histograms = dict()
+
+    @staticmethod
+    def instrument_engine(engine):
+        """
+        Adds time of SQL statements executed by `engine` to `db` phase of current request and counts them
+        """
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(engine, 'handle_error', _handle_error)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.queries[statement] += 1
+        conn.info.setdefault('m2core_query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timings = _current_timings.get()
+    started = conn.info.get('m2core_query_started')
+    if timings is not None and started:
+        timings.add('db', time.perf_counter() - started.pop())
+
+
+def _handle_error(context):
+    started = context.connection.info.get('m2core_query_started') if context.connection is not None else None
+    if started:
+        timings = _current_timings.get()
+        seconds = time.perf_counter() - started.pop()
+        if timings is not None:
+            timings.add('db', seconds)
@@ -0,0 +1,231 @@
+import json
+import os
+import socket
+import time
+from collections import Counter
+from tornado.ioloop import IOLoop, PeriodicCallback
+from m2core.utils.instrumentation import Instrumentation, Histogram
+
+
+class LoopLagMonitor:
+    """
+    Measures IOLoop lag: how late a callback scheduled each `interval` seconds is actually called. Big lag means that
+    something blocks IOLoop
+    """
+    def __init__(self, interval: float=0.5):
+        """
+        Constructor
+        :param interval: how often lag is measured in seconds
+        """
+        self.interval = interval
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self._io_loop = None
+        self._expected = None
+        self._handle = None
+
+    def start(self):
+        self._io_loop = IOLoop.current()
+        self._schedule()
+
+    def stop(self):
+        if self._handle is not None:
+            self._io_loop.remove_timeout(self._handle)
+            self._handle = None
+
+    def _schedule(self):
+        self._expected = self._io_loop.time() + self.interval
+        self._handle = self._io_loop.call_at(self._expected, self._tick)
+
+    def _tick(self):
+        self.lag = max(0.0, self._io_loop.time() - self._expected)
+        self.max_lag = max(self.max_lag, self.lag)
+        self._schedule()
+
+
+class Metrics:
+    """
+    Metrics of M2Core worker process: number of requests by route, method and status, histograms of request phases
+    (taken from `Instrumentation`), usage of DB and Redis connection pools, queue of thread pool and IOLoop lag.
+    Counters are updated only by IOLoop thread, so they need no locks.
+
+    Every process pushes snapshot of it's metrics to Redis hash each `interval` seconds (and before rendering),
+    `render` merges snapshots of all live processes: counters and histograms are summed, gauges are labeled with
+    worker id
+    """
+    def __init__(self, db_engine=None, redis_connector=None, redis_scheme: dict=None, executor=None,
+                 interval: float=5):
+        """
+        Constructor
+        :param db_engine: SQLAlchemy engine with `QueuePool`
+        :param redis_connector: Redis connection, metrics of it's pool are reported and snapshots are merged through it
+        :param redis_scheme: Redis key mapping
+        :param executor: `ThreadPoolExecutor` of M2Core
+        :param interval: how often snapshot is pushed to Redis in seconds
+        """
+        self.worker_id = '%s:%s' % (socket.gethostname(), os.getpid())
+        self.db_engine = db_engine
+        self.redis_connector = redis_connector
+        self.redis_scheme = redis_scheme
+        self.executor = executor
+        self.interval = interval
+        self.requests = Counter()
+        self.loop_lag = LoopLagMonitor()
+        self._pusher = None
+
+    def start(self):
+        """
+        Starts collecting of requests and IOLoop lag, and periodic pushes of snapshots in current IOLoop
+        """
+        Instrumentation.subscribe(self.on_request)
+        self.loop_lag.start()
+        if self.redis_connector is not None:
+            self._pusher = PeriodicCallback(self.push, self.interval * 1000)
+            self._pusher.start()
+
+    def stop(self):
+        Instrumentation.unsubscribe(self.on_request)
+        self.loop_lag.stop()
+        if self._pusher is not None:
+            self._pusher.stop()
+            self._pusher = None
+
+    def on_request(self, record: dict):
+        """
+        `Instrumentation` subscriber, which counts requests
+        """
+        self.requests[(record['route'], record['method'], record['status'])] += 1
+
+    def gauges(self) -> dict:
+        """
+        Returns current values of gauges of this process
+        """
+        gauges = {
+            'ioloop_lag_seconds': self.loop_lag.lag,
+            'ioloop_lag_max_seconds': self.loop_lag.max_lag,
+        }
+        if self.db_engine is not None:
+            pool = self.db_engine.pool
+            if hasattr(pool, 'checkedout'):
+                gauges.update({
+                    'db_pool_size': pool.size(),
+                    'db_pool_checked_out': pool.checkedout(),
+                    'db_pool_overflow': max(pool.overflow(), 0),
+                })
+        if self.redis_connector is not None:
+            pool = self.redis_connector.connection_pool
+            gauges.update({
+                'redis_pool_in_use': len(getattr(pool, '_in_use_connections', ())),
+                'redis_pool_available': len(getattr(pool, '_available_connections', ())),
+            })
+        if self.executor is not None:
+            gauges.update({
+                'executor_queue_depth': self.executor._work_queue.qsize(),
+                'executor_threads': len(self.executor._threads),
+            })
+        return gauges
+
+    def snapshot(self) -> dict:
+        """
+        Returns JSON serializable metrics of this process
+        """
+        return {
+            'ts': time.time(),
+            'requests': [[route, method, status, count] for (route, method, status), count in self.requests.items()],
+            'histograms': Instrumentation.dump(),
+            'gauges': self.gauges(),
+        }
+
+    def _key(self) -> str:
+        return self.redis_scheme['METRICS']['prefix']
+
+    def push(self):
+        """
+        Stores snapshot of this process in Redis
+        """
+        self.redis_connector.hset(self._key(), self.worker_id, json.dumps(self.snapshot()))
+
+    def collect(self) -> dict:
+        """
+        Returns snapshots of all live processes by worker ids. Snapshots of processes, which haven't pushed them
+        for 3 intervals, are dropped
+        """
+        if self.redis_connector is None:
+            return {self.worker_id: self.snapshot()}
+        self.push()
+        snapshots = dict()
+        stale = list()
+        deadline = time.time() - self.interval * 3
+        for worker_id, raw in self.redis_connector.hgetall(self._key()).items():
+            snapshot = json.loads(raw)
+            if snapshot['ts'] < deadline:
+                stale.append(worker_id)
+            else:
+                snapshots[worker_id if type(worker_id) is str else worker_id.decode()] = snapshot
+        if stale:
+            self.redis_connector.hdel(self._key(), *stale)
+        return snapshots
+
+    def render(self) -> str:
+        """
+        Returns merged metrics of all processes in Prometheus text format
+        """
+        return render(self.collect())
+
+
+def _labels(**labels) -> str:
+    return ','.join(
+        '%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels.items()
+    )
+
+
+def render(snapshots: dict) -> str:
+    """
+    Merges snapshots of processes and renders them in Prometheus text format
+    :param snapshots: worker id -> `Metrics.snapshot()`
+    """
+    requests = Counter()
+    histograms = dict()
+    for snapshot in snapshots.values():
+        for route, method, status, count in snapshot['requests']:
+            requests[(route, method, status)] += count
+        for route, method, name, counts, total in snapshot['histograms']:
+            merged = histograms.get((route, method, name))
+            if merged is None:
+                histograms[(route, method, name)] = [list(counts), total]
+            else:
+                merged[0] = [a + b for a, b in zip(merged[0], counts)]
+                merged[1] += total
+
+    lines = ['# TYPE m2core_requests_total counter']
+    for (route, method, status), count in sorted(requests.items()):
+        lines.append('m2core_requests_total{%s} %s' % (_labels(route=route, method=method, status=status), count))
+
+    bounds = ['%g' % bound for bound in Histogram.BUCKETS] + ['+Inf']
+    for metric, phases in (('m2core_request_duration_seconds', lambda name: name == 'total'),
+                           ('m2core_request_phase_seconds', lambda name: name != 'total')):
+        lines.append('# TYPE %s histogram' % metric)
+        for (route, method, name), (counts, total) in sorted(histograms.items()):
+            if not phases(name):
+                continue
+            # labels are escaped once per histogram, not per bucket
+            labels = _labels(route=route, method=method) if name == 'total' else _labels(route=route, method=method,
+                                                                                        phase=name)
+            bucket = metric + '_bucket{' + labels + ',le="%s"} %s'
+            seen = 0
+            for bound, count in zip(bounds, counts):
+                seen += count
+                lines.append(bucket % (bound, seen))
+            lines.append('%s_sum{%s} %r' % (metric, labels, total))
+            lines.append('%s_count{%s} %s' % (metric, labels, seen))
+
+    gauges = dict()
+    for worker_id, snapshot in sorted(snapshots.items()):
+        for name, value in snapshot['gauges'].items():
+            gauges.setdefault(name, []).append((worker_id, value))
+    for name, values in sorted(gauges.items()):
+        lines.append('# TYPE m2core_%s gauge' % name)
+        for worker_id, value in values:
+            lines.append('m2core_%s{%s} %r' % (name, _labels(worker=worker_id), value))
+    return '\n'.join(lines) + '\n'
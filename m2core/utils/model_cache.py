@@ -0,0 +1,253 @@
+import base64
+import datetime
+import decimal
+import json
+import threading
+import uuid
+from collections import defaultdict
+from m2core.utils.cache import LRUCache
+from m2core.utils.error import M2Error
+
+
+# column types, which JSON doesn't keep, and their loaders
+_LOADERS = {
+    datetime.datetime: datetime.datetime.fromisoformat,
+    datetime.date: datetime.date.fromisoformat,
+    datetime.time: datetime.time.fromisoformat,
+    decimal.Decimal: decimal.Decimal,
+    uuid.UUID: uuid.UUID,
+    bytes: base64.b64decode,
+}
+
+
+def _dump_value(value):
+    if type(value) is bytes:
+        return base64.b64encode(value).decode()
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return str(value)
+
+
+class RowCodec:
+    """
+    Dumps column values of model rows to JSON and back, restoring types, which JSON doesn't have (dates, decimals,
+    UUIDs and binary values), by types of mapped columns
+    """
+    def __init__(self, mapper):
+        """
+        Constructor
+        :param mapper: SQLAlchemy mapper of model
+        """
+        self.keys = tuple(prop.key for prop in mapper.column_attrs)
+        self.loaders = dict()
+        for prop in mapper.column_attrs:
+            try:
+                python_type = prop.columns[0].type.python_type
+            except NotImplementedError:
+                continue
+            if python_type in _LOADERS:
+                self.loaders[prop.key] = _LOADERS[python_type]
+
+    def dumps(self, row: dict) -> str:
+        return json.dumps(row, default=_dump_value)
+
+    def loads(self, raw: str) -> dict:
+        row = json.loads(raw)
+        for key, loader in self.loaders.items():
+            value = row.get(key)
+            if value is not None:
+                row[key] = loader(value)
+        return row
+
+
+class ModelCache:
+    """
+    Second-level cache of model rows by primary key, see `DataMixin.__cache__`. Rows are stored as JSON in
+    process-local LRU cache (`local`), in Redis (`redis`) or in both of them - Redis is checked when local cache misses
+    (`both`). Models with unique columns also keep mapping of column values to primary keys, so `load_by_params`
+    on such column doesn't query DB either.
+
+    Changed and deleted rows are dropped by `invalidate`. Keys of entries include generation of their table, so all
+    rows of table are invalidated by increment of generation (kept in Redis with `redis` and `both` storages) without
+    scanning of keys - old entries are never found again and expire. With `both` storage invalidation is published to
+    `channel` and applied by all processes with `apply_invalidation`, with `local` storage - only by current one
+    """
+    STORAGES = ('local', 'redis', 'both')
+
+    def __init__(self, storage: str='local', max_size: int=10000, ttl: float=300, redis_connector=None,
+                 redis_scheme: dict=None, channel: str=None):
+        """
+        Constructor
+        :param storage: one of `STORAGES`
+        :param max_size: maximum number of entries in local cache
+        :param ttl: default time to live of entries in seconds
+        :param redis_connector: Redis connection, required by `redis` and `both` storages
+        :param redis_scheme: Redis key mapping
+        :param channel: Redis pub/sub channel for invalidation messages of `both` storage
+        """
+        if storage not in ModelCache.STORAGES:
+            raise M2Error('Unknown model cache storage `%s`, use one of: %s' %
+                          (storage, ', '.join(ModelCache.STORAGES)))
+        if storage != 'local' and redis_connector is None:
+            raise M2Error('Model cache storage `%s` requires Redis connection' % storage)
+        self.storage = storage
+        self.ttl = ttl
+        self.channel = channel if storage == 'both' else None
+        self.local = LRUCache(max_size, ttl) if storage != 'redis' else None
+        self._redis = redis_connector if storage != 'local' else None
+        self._redis_scheme = redis_scheme
+        # table -> [hits, misses]
+        self._counters = defaultdict(lambda: [0, 0])
+        # table -> generation, Redis generations are cached by `both` storage and updated by invalidation messages
+        self._generations = dict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _pk_key(pk: tuple) -> str:
+        return ','.join(str(value) for value in pk)
+
+    def _generation(self, table: str) -> int:
+        """
+        Returns current generation of table. `redis` storage reads it from Redis every time, `both` storage - once,
+        then it's updated by invalidation messages
+        """
+        if self._redis is not None and self.channel is None:
+            return int(self._redis.hget(self._generations_key(), table) or 0)
+        generation = self._generations.get(table)
+        if generation is None:
+            generation = int(self._redis.hget(self._generations_key(), table) or 0) if self._redis is not None else 0
+            with self._lock:
+                generation = self._generations.setdefault(table, generation)
+        return generation
+
+    def _key(self, table: str, suffix: str) -> str:
+        return '%s:%s:%s' % (table, self._generation(table), suffix)
+
+    def _redis_key(self, key: str) -> str:
+        return self._redis_scheme['MODEL_CACHE']['prefix'] % key
+
+    def _generations_key(self) -> str:
+        return self._redis_scheme['MODEL_CACHE_GENERATIONS']['prefix']
+
+    def _get(self, key: str) -> str or None:
+        if self.local is not None:
+            value = self.local.get(key)
+            if value is not None:
+                return value
+        if self._redis is not None:
+            value = self._redis.get(self._redis_key(key))
+            if value is not None:
+                if type(value) is bytes:
+                    value = value.decode()
+                if self.local is not None:
+                    self.local.set(key, value)
+                return value
+        return None
+
+    def _set(self, key: str, value: str, ttl: float=None):
+        ttl = ttl if ttl is not None else self.ttl
+        if self.local is not None:
+            self.local.set(key, value, ttl)
+        if self._redis is not None:
+            self._redis.set(self._redis_key(key), value, px=int(ttl * 1000))
+
+    def get(self, table: str, pk: tuple) -> str or None:
+        """
+        Returns JSON of cached row or `None`
+        :param table: table name
+        :param pk: tuple of primary key values
+        """
+        return self._get(self._key(table, self._pk_key(pk)))
+
+    def set(self, table: str, pk: tuple, row: str, ttl: float=None):
+        """
+        Stores JSON of row
+        :param ttl: time to live of entry in seconds, `self.ttl` by default
+        """
+        self._set(self._key(table, self._pk_key(pk)), row, ttl)
+
+    def get_pk(self, table: str, column: str, value) -> tuple or None:
+        """
+        Returns primary key of row with `value` in unique `column`, row should be checked by caller, because it could
+        be changed since mapping was cached
+        """
+        raw = self._get(self._key(table, '%s=%s' % (column, json.dumps(value, default=_dump_value))))
+        return tuple(json.loads(raw)) if raw is not None else None
+
+    def set_pk(self, table: str, column: str, value, pk: tuple, ttl: float=None):
+        """
+        Stores primary key of row with `value` in unique `column`
+        """
+        self._set(self._key(table, '%s=%s' % (column, json.dumps(value, default=_dump_value))),
+                  json.dumps(pk, default=_dump_value), ttl)
+
+    def record(self, table: str, hit: bool):
+        """
+        Counts hit or miss of lookup in table
+        """
+        with self._lock:
+            self._counters[table][0 if hit else 1] += 1
+
+    def invalidate(self, table: str, pks=None):
+        """
+        Drops cached rows of table by primary keys, or all rows of table if `pks` is `None` (by increment of
+        generation of table)
+        :param table: table name
+        :param pks: iterable of primary key tuples
+        """
+        if pks is None:
+            keys = None
+            if self._redis is not None:
+                generation = self._redis.hincrby(self._generations_key(), table, 1)
+            else:
+                generation = self._generation(table) + 1
+            self._set_generation(table, generation)
+        else:
+            keys = [self._key(table, self._pk_key(pk)) for pk in pks]
+            generation = None
+            self._drop_local(keys)
+            if self._redis is not None and keys:
+                self._redis.delete(*[self._redis_key(key) for key in keys])
+        if self.channel is not None:
+            self._redis.publish(self.channel, json.dumps([table, keys, generation]))
+
+    def _set_generation(self, table: str, generation: int):
+        if self._redis is not None and self.channel is None:
+            # `redis` storage reads generation from Redis every time
+            return
+        with self._lock:
+            # messages of concurrent invalidations could come in any order
+            if generation > self._generations.get(table, 0):
+                self._generations[table] = generation
+
+    def _drop_local(self, keys: list):
+        if self.local is not None:
+            for key in keys:
+                self.local.pop(key)
+
+    def apply_invalidation(self, message: str):
+        """
+        Applies invalidation message of other process to local cache: JSON list of table name, keys of dropped entries
+        and new generation of table if all of it's rows are dropped
+        """
+        table, keys, generation = json.loads(message)
+        if keys is not None:
+            self._drop_local(keys)
+        if generation is not None:
+            self._set_generation(table, generation)
+
+    def stats(self) -> dict:
+        """
+        Returns hits, misses and hit ratio of lookups by tables, and local cache usage info
+        """
+        with self._lock:
+            counters = {table: list(values) for table, values in self._counters.items()}
+        tables = dict()
+        for table, (hits, misses) in counters.items():
+            total = hits + misses
+            tables[table] = {'hits': hits, 'misses': misses, 'hit_ratio': hits / total if total else 0.0}
+        return {
+            'storage': self.storage,
+            'tables': tables,
+            'local': self.local.stats() if self.local is not None else None,
+        }
@@ -1,7 +1,12 @@
+from m2core.utils.cache import LRUCache
+
+
 class HandlerPermissions:
     def __init__(self):
         self.handler_settings = dict()
         self.all_permissions = set()
+        self._index = None  # inverted index for `get_all_permitted_handlers`, built on first use
+        self._permitted_memo = LRUCache(1024)
 
     def add_handler_rules(self, handler: str, rules: dict()):
         """
@@ -18,6 +23,7 @@ class HandlerPermissions:
                     it disables this method)
         """
         self.handler_settings[handler] = rules
+        self._reset_index()
         for k, v in rules.items():
             if v:
                 self.add_permission(*v)
@@ -33,6 +39,7 @@ class HandlerPermissions:
             self.handler_settings[human_route].update({method: rules})
         else:
             self.handler_settings[human_route] = {method: rules}
+        self._reset_index()
         if rules:
             self.add_permission(*rules)
 
@@ -50,20 +57,54 @@ class HandlerPermissions:
         """
         return list(self.all_permissions)
 
+    def _reset_index(self):
+        """
+        Drops inverted index and memoized results after rules change
+        """
+        self._index = None
+        self._permitted_memo.clear()
+
+    def _build_index(self) -> tuple:
+        """
+        Builds inverted index of methods: list of (handler, method, number of required permissions) and dict
+        permission => positions of methods in that list, which require it
+        """
+        methods = list()
+        by_permission = dict()
+        for handler, handler_rules in self.handler_settings.items():
+            for method, method_permissions in handler_rules.items():
+                if method_permissions is None:
+                    continue
+                required = set(method_permissions)
+                for permission in required:
+                    by_permission.setdefault(permission, list()).append(len(methods))
+                methods.append((handler, method, len(required)))
+        return methods, by_permission
+
     def get_all_permitted_handlers(self, user_permissions: list) -> dict:
         """
-        Returns dict() of all available routes and their method depending on user permissions  
+        Returns dict() of all available routes and their method depending on user permissions. Method is permitted
+        when user has all of it's permissions, so for each user permission we count how many permissions of each
+        method are satisfied. Result is memoized per distinct set of permissions
         :param user_permissions: list of user permissions
         """
-        permitted_handlers = dict()
-        for handler in self.handler_settings.keys():
-            for method in self.handler_settings[handler].keys():
-                method_permissions = self.handler_settings[handler][method]
-                if method_permissions is not None and not (set(method_permissions)-set(user_permissions)):
-                    if not permitted_handlers.get(handler, False):
-                        permitted_handlers[handler] = list()
-                    permitted_handlers[handler].append(method)
-        return permitted_handlers
+        user_permissions = frozenset(user_permissions)
+        permitted_handlers = self._permitted_memo.get(user_permissions)
+        if permitted_handlers is None:
+            if self._index is None:
+                self._index = self._build_index()
+            methods, by_permission = self._index
+            satisfied = [0] * len(methods)
+            for permission in user_permissions:
+                for position in by_permission.get(permission, ()):
+                    satisfied[position] += 1
+            permitted_handlers = dict()
+            for position, (handler, method, required) in enumerate(methods):
+                if satisfied[position] == required:
+                    permitted_handlers.setdefault(handler, list()).append(method)
+            self._permitted_memo.set(user_permissions, permitted_handlers)
+        # copy, so caller can't spoil memoized result
+        return {handler: list(methods) for handler, methods in permitted_handlers.items()}
 
     def get_all_handler_settings(self) -> dict:
         """
@@ -0,0 +1,133 @@
+import sys
+import threading
+import time
+from collections import Counter
+from m2core.bases.base_handler import BaseHandler
+from m2core.utils.error import M2Error
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler of running M2Core process: background thread takes stacks of all other threads each
+    `interval` seconds with `sys._current_frames()`, nothing is added to profiled code, so it's overhead is low enough
+    to profile production workers for some seconds.
+
+    Samples are counted as collapsed stacks (format of `flamegraph.pl` and speedscope), the first frame of each stack
+    is human route of handler found in it, or name of thread for stacks of no handler (IOLoop waiting for events,
+    idle thread pool, etc.):
+
+        /users/{id:int};m2core.m2core:M2Core.user_can.<locals>.decorated;example.handlers:UserHandler.get 42
+
+    Only one profiler runs in process at the same time
+    """
+    _running = threading.Lock()
+
+    def __init__(self, interval: float=0.005):
+        """
+        Constructor
+        :param interval: sampling interval (sec)
+        """
+        self.interval = interval
+        self.samples = Counter()
+        self.count = 0
+        self.started = None
+        self.duration = None
+        self._thread = None
+        self._stopped = threading.Event()
+        # code object -> label of frame
+        self._labels = dict()
+        # code objects of methods, which could be methods of handlers
+        self._methods = set()
+        self._thread_names = dict()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self):
+        """
+        Starts sampling thread, raises `M2Error` if other profiler is already running in process
+        """
+        if not SamplingProfiler._running.acquire(blocking=False):
+            raise M2Error('Profiler is already running in this process')
+        self.started = time.monotonic()
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name='m2core-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        """
+        Stops sampling and returns samples
+        """
+        if self._thread is None:
+            return self.samples
+        self._stopped.set()
+        self._thread.join()
+        self._thread = None
+        self.duration = time.monotonic() - self.started
+        SamplingProfiler._running.release()
+        return self.samples
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stopped.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != own_id:
+                    self.samples[self.collapse(frame, thread_id)] += 1
+            self.count += 1
+
+    def _label(self, frame) -> str:
+        code = frame.f_code
+        label = self._labels.get(code)
+        if label is None:
+            label = '%s:%s' % (frame.f_globals.get('__name__', code.co_filename),
+                               getattr(code, 'co_qualname', code.co_name))
+            # separators of collapsed stacks
+            label = self._labels[code] = label.replace(';', ':').replace(' ', '_')
+            if code.co_argcount and code.co_varnames[0] == 'self':
+                self._methods.add(code)
+        return label
+
+    def _thread_name(self, thread_id: int) -> str:
+        name = self._thread_names.get(thread_id)
+        if name is None:
+            self._thread_names = {thread.ident: '<%s>' % thread.name.replace(';', ':').replace(' ', '_')
+                                  for thread in threading.enumerate()}
+            name = self._thread_names.get(thread_id, '<thread-%s>' % thread_id)
+        return name
+
+    def collapse(self, frame, thread_id: int=None) -> str:
+        """
+        Returns collapsed stack of `frame`: human route of handler (or thread name) and frames from the outermost
+        to `frame`, separated by `;`
+        """
+        labels = list()
+        route = None
+        while frame is not None:
+            labels.append(self._label(frame))
+            if route is None and frame.f_code in self._methods:
+                handler = frame.f_locals.get('self')
+                if isinstance(handler, BaseHandler):
+                    route = handler.human_route
+            frame = frame.f_back
+        labels.append(route.replace(';', ':').replace(' ', '_') if route is not None else
+                      self._thread_name(thread_id))
+        labels.reverse()
+        return ';'.join(labels)
+
+    def collapsed(self, route: str=None) -> str:
+        """
+        Returns samples in collapsed stacks format, the most frequent first
+        :param route: only stacks of this human route
+        """
+        return ''.join('%s %s\n' % (stack, count) for stack, count in self.samples.most_common()
+                       if route is None or stack.split(';', 1)[0] == route)
+
+    def routes(self) -> Counter:
+        """
+        Returns number of samples by human routes (and thread names)
+        """
+        routes = Counter()
+        for stack, count in self.samples.items():
+            routes[stack.split(';', 1)[0]] += count
+        return routes
@@ -0,0 +1,154 @@
+import functools
+import hashlib
+import json
+import threading
+from collections import defaultdict
+from tornado.escape import utf8
+from m2core.utils.cache import LRUCache
+from m2core.utils.error import M2Error
+
+
+@functools.lru_cache(maxsize=1024)
+def _frozen_permissions_key(permissions: frozenset) -> tuple:
+    return tuple(sorted(getattr(p, 'sys_name', str(p)) for p in permissions))
+
+
+def permissions_key(permissions) -> tuple or None:
+    """
+    Returns the same value for equal sets of permissions in any process, keys of frozen sets (i.e. cached users'
+    permissions) are memoized
+    """
+    if permissions is None:
+        return None
+    if type(permissions) is frozenset:
+        return _frozen_permissions_key(permissions)
+    return tuple(sorted(getattr(p, 'sys_name', str(p)) for p in permissions))
+
+
+class ResponseCache:
+    """
+    Cache of serialized `BaseHandler.write_json` responses, see `M2Core.cached_response`. Responses are stored in
+    process-local LRU cache (`local`), in Redis (`redis`) or in both of them - Redis is checked when local cache
+    misses (`both`).
+
+    Every response has tags (i.e. table names of models it's made of). Cache key includes current versions of its
+    tags, so `invalidate` just bumps versions of tags and old responses are never found again. With `redis` and `both`
+    storages tag versions are kept in Redis and invalidation is seen by all processes, with `local` storage - only by
+    current one.
+
+    Cache is created by `M2Core` only if some handler method is decorated with `M2Core.cached_response`, which records
+    its tags in `used_tags`, so `DataMixin` bumps versions only of tables some response is made of
+    """
+    STORAGES = ('local', 'redis', 'both')
+    # whether any handler method is decorated with `M2Core.cached_response`
+    in_use = False
+    # tags of all responses cached by `M2Core.cached_response`
+    used_tags = frozenset()
+
+    def __init__(self, storage: str='local', max_size: int=1024, ttl: float=60, redis_connector=None,
+                 redis_scheme: dict=None):
+        """
+        Constructor
+        :param storage: one of `STORAGES`
+        :param max_size: maximum number of responses in local cache
+        :param ttl: default time to live of responses in seconds
+        :param redis_connector: Redis connection, required by `redis` and `both` storages
+        :param redis_scheme: Redis key mapping
+        """
+        if storage not in ResponseCache.STORAGES:
+            raise M2Error('Unknown response cache storage `%s`, use one of: %s' %
+                          (storage, ', '.join(ResponseCache.STORAGES)))
+        if storage != 'local' and redis_connector is None:
+            raise M2Error('Response cache storage `%s` requires Redis connection' % storage)
+        self.storage = storage
+        self.ttl = ttl
+        self.local = LRUCache(max_size, ttl) if storage != 'redis' else None
+        self._redis = redis_connector if storage != 'local' else None
+        self._redis_scheme = redis_scheme
+        self._versions = defaultdict(int)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def use_tags(cls, tags: tuple):
+        """
+        Records tags of cached responses, called by `M2Core.cached_response` when handler method is decorated
+        """
+        cls.in_use = True
+        cls.used_tags = cls.used_tags | frozenset(tags)
+
+    def _response_key(self, key: str) -> str:
+        return self._redis_scheme['RESPONSE_CACHE']['prefix'] % key
+
+    def _tags_key(self) -> str:
+        return self._redis_scheme['RESPONSE_CACHE_TAGS']['prefix']
+
+    def versions(self, tags: tuple) -> tuple:
+        """
+        Returns current versions of `tags`
+        """
+        if not tags:
+            return ()
+        if self._redis is None:
+            return tuple(self._versions[tag] for tag in tags)
+        return tuple(self._redis.hmget(self._tags_key(), *tags))
+
+    def key(self, route: str, method: str, params: dict, query: dict, permissions, tags: tuple) -> str:
+        """
+        Builds cache key of response
+        :param route: human route
+        :param method: HTTP method
+        :param params: url params
+        :param query: query arguments
+        :param permissions: result of `permissions_key`, i.e. permission set of user, `None` for guests
+        :param tags: tags of response
+        """
+        raw = json.dumps([route, method, params, query, permissions, tags, self.versions(tags)], sort_keys=True,
+                         default=str)
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    def get(self, key: str) -> tuple or None:
+        """
+        Returns (etag, body) of cached response or `None`
+        """
+        if self.local is not None:
+            entry = self.local.get(key)
+            if entry is not None:
+                return entry
+        if self._redis is not None:
+            value = self._redis.get(self._response_key(key))
+            if value is not None:
+                if type(value) is bytes:
+                    value = value.decode()
+                etag, _, body = value.partition('\n')
+                entry = (etag, utf8(body))
+                if self.local is not None:
+                    self.local.set(key, entry)
+                return entry
+        return None
+
+    def set(self, key: str, body: bytes, ttl: float=None) -> str:
+        """
+        Stores response body and returns its strong ETag
+        :param ttl: time to live of response in seconds, `self.ttl` by default
+        """
+        ttl = ttl if ttl is not None else self.ttl
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()
+        if self.local is not None:
+            self.local.set(key, (etag, body), ttl)
+        if self._redis is not None:
+            self._redis.set(self._response_key(key), etag + '\n' + body.decode(), px=int(ttl * 1000))
+        return etag
+
+    def invalidate(self, *tags):
+        """
+        Invalidates all responses with any of `tags`
+        """
+        if self._redis is None:
+            with self._lock:
+                for tag in tags:
+                    self._versions[tag] += 1
+            return
+        pipe = self._redis.pipeline(transaction=False)
+        for tag in tags:
+            pipe.hincrby(self._tags_key(), tag, 1)
+        pipe.execute()
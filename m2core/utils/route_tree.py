@@ -0,0 +1,201 @@
+import re
+from tornado.escape import url_unescape
+from tornado.routing import Router, Rule, PathMatches
+from m2core.utils.url_parser import UrlParser
+
+
+# characters, which make static part of url a regular expression (routes are regular expressions for Tornado)
+REGEX_CHARS = frozenset('.^$*+?{}[]\\|()')
+
+
+def _unquote_bytes(value: str) -> bytes:
+    """
+    The same as Tornado does with path params, handler decodes them in `decode_argument`
+    """
+    return url_unescape(value, encoding=None, plus=False)
+
+
+def _to_str(value: str) -> str or bytes:
+    try:
+        return url_unescape(value, plus=False)
+    except UnicodeDecodeError:
+        # let handler's `decode_argument` respond with 400
+        return _unquote_bytes(value)
+
+
+def _to_float(value: str) -> float or str:
+    try:
+        return float(value)
+    except ValueError:
+        # `float` rule matches i.e. `1,5`, url validator reports it
+        return value
+
+
+COERCERS = {
+    'int': int,
+    'float': _to_float,
+    'string': _to_str,
+    'bool': lambda value: value == '1',
+}
+
+
+class _Node:
+    __slots__ = ('static', 'dynamic', 'route', 'min_route')
+
+    def __init__(self):
+        # static segment -> node
+        self.static = dict()
+        # [(compiled segment regex, node)] for segments with url attributes
+        self.dynamic = []
+        # index of the first route, which ends in this node
+        self.route = None
+        # the least index of routes in this subtree, branches with later routes are skipped if match is found
+        self.min_route = None
+
+
+class _Route:
+    __slots__ = ('handler_cls', 'kwargs', 'coercers')
+
+    def __init__(self, handler_cls, kwargs: dict, coercers: dict):
+        self.handler_cls = handler_cls
+        self.kwargs = kwargs
+        self.coercers = coercers
+
+
+class RouteTree(Router):
+    """
+    Tornado router, which dispatches requests by prefix tree of url segments instead of matching regular expressions
+    of all routes one by one, so dispatch cost doesn't grow with number of routes. Tree is built from parsed human
+    routes (`UrlParser`), segments with url attributes are matched by the same patterns, which `UrlParser.tornado_url`
+    generates. If several routes match - the first added one wins, as in Tornado. Routes, which are regular
+    expressions themselves (i.e. `/static/(.*)`), are matched by Tornado's `PathMatches` in their turn.
+
+    Url params of `typed_handlers` are coerced according to their rules (`int`, `float`, `bool` and unquoted `string`),
+    so handlers receive typed kwargs. Other handlers get params as Tornado gives them
+    """
+    def __init__(self, application, endpoints: list, url_parsers: list, typed_handlers: tuple=()):
+        """
+        Constructor
+        :param application: Tornado application
+        :param endpoints: list of (tornado route, handler class, handler kwargs)
+        :param url_parsers: `UrlParser` of each endpoint
+        :param typed_handlers: base classes of handlers, which accept typed url params
+        """
+        self.application = application
+        self._root = _Node()
+        self._routes = []
+        # [(index, `Rule`)] of routes, which can't be put in tree
+        self._fallback = []
+        for (tornado_route, handler_cls, kwargs), url_parser in zip(endpoints, url_parsers):
+            self.add(url_parser, handler_cls, kwargs, issubclass(handler_cls, typed_handlers))
+
+    def add(self, url_parser: UrlParser, handler_cls, kwargs: dict, typed: bool=False):
+        """
+        Adds route after all existing ones
+        :param url_parser: parsed human route
+        :param handler_cls: handler class
+        :param kwargs: handler kwargs
+        :param typed: coerce url params according to their types
+        """
+        index = len(self._routes)
+        attributes = [attr['instance'] for attr in url_parser.url_attributes]
+        coercers = {attr.name(): COERCERS[attr.params()['attribute_type']] if typed else _unquote_bytes
+                    for attr in attributes}
+        self._routes.append(_Route(handler_cls, kwargs, coercers))
+
+        segments = self._segments(url_parser)
+        if segments is None:
+            self._fallback.append((index, Rule(PathMatches(url_parser.tornado_url()), handler_cls, kwargs)))
+            return
+
+        node = self._root
+        self._visit(node, index)
+        for segment in segments:
+            if type(segment) == str:
+                node = node.static.setdefault(segment, _Node())
+            else:
+                for regex, child in node.dynamic:
+                    if regex.pattern == segment.pattern:
+                        node = child
+                        break
+                else:
+                    child = _Node()
+                    node.dynamic.append((segment, child))
+                    node = child
+            self._visit(node, index)
+        if node.route is None:
+            node.route = index
+
+    @staticmethod
+    def _visit(node: _Node, index: int):
+        if node.min_route is None:
+            node.min_route = index
+
+    @staticmethod
+    def _segments(url_parser: UrlParser) -> list or None:
+        """
+        Splits route to static segments (strings) and regular expressions of segments with url attributes. Returns
+        `None` if route is a regular expression itself
+        """
+        # url attributes are replaced with markers first, so `/` in their params doesn't split them
+        route = url_parser.original_url
+        replacements = dict()
+        for i, attr in enumerate(url_parser.url_attributes):
+            marker = '\x00%s\x00' % i
+            route = route.replace(attr['full_match'], marker, 1)
+            replacements[marker] = attr['instance'].replacement()
+        if REGEX_CHARS.intersection(route):
+            return None
+
+        segments = []
+        for segment in route.split('/'):
+            if '\x00' not in segment:
+                segments.append(segment)
+                continue
+            for marker, replacement in replacements.items():
+                segment = segment.replace(marker, replacement)
+            segments.append(re.compile(segment))
+        return segments
+
+    def _match(self, node: _Node, segments: list, i: int, params: tuple) -> tuple or None:
+        """
+        Returns (route index, url params) of the first route, which matches `segments` starting from `i`
+        """
+        if i == len(segments):
+            return (node.route, params) if node.route is not None else None
+
+        segment = segments[i]
+        found = None
+        child = node.static.get(segment)
+        if child is not None:
+            found = self._match(child, segments, i + 1, params)
+        for regex, child in node.dynamic:
+            if found is not None and child.min_route > found[0]:
+                continue
+            match = regex.fullmatch(segment)
+            if match is not None:
+                candidate = self._match(child, segments, i + 1, params + tuple(match.groupdict().items()))
+                if candidate is not None and (found is None or candidate[0] < found[0]):
+                    found = candidate
+        return found
+
+    def find_handler(self, request, **kwargs):
+        found = self._match(self._root, request.path.split('/'), 0, ())
+        index = found[0] if found is not None else len(self._routes)
+        for fallback_index, rule in self._fallback:
+            if fallback_index > index:
+                break
+            params = rule.matcher.match(request)
+            if params is not None:
+                return self.application.get_handler_delegate(request, rule.target, rule.target_kwargs, **params)
+
+        if found is None:
+            return None
+        route = self._routes[index]
+        coercers = route.coercers
+        return self.application.get_handler_delegate(
+            request,
+            route.handler_cls,
+            route.kwargs,
+            path_kwargs={name: coercers[name](value) for name, value in found[1]}
+        )
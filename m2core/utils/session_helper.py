@@ -1,19 +1,147 @@
+from m2core.utils.cache import LRUCache
 from m2core.utils.data_helper import DataHelper
 from m2core.data_schemes.db_system_scheme import M2Permission
 from m2core.common.options import options
+from m2core.utils.instrumentation import phase
+
+
+# Resolves access token -> user id -> role ids -> permission names in one server-side call. Returns an empty
+# list for unknown token, otherwise user id as first element followed by all permission names of user's roles.
+# Role keys are built inside of the script, so it's not suitable for Redis Cluster
+RESOLVE_USER_SCRIPT = """
+local user_id = redis.call('GET', KEYS[1])
+if not user_id then
+    return {}
+end
+if ARGV[1] ~= '' then
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+end
+local result = {user_id}
+local role_ids = redis.call('SMEMBERS', string.format(ARGV[2], user_id))
+for _, role_id in ipairs(role_ids) do
+    local permissions = redis.call('SMEMBERS', string.format(ARGV[3], role_id))
+    for _, permission in ipairs(permissions) do
+        table.insert(result, permission)
+    end
+end
+return result
+"""
 
 
 class SessionHelper:
     """
     This helper class is used to interact with Redis to get and store user access tokens, permissions and roles
     """
+    RESOLVERS = ('sequential', 'batched', 'script')
+
+    # process-local cache of resolved users by access tokens, see `set_cache`
+    _cache = None
+    # `RESOLVE_USER_SCRIPT` registered once per process, see `_resolve_script`
+    _script = None
+
     def __init__(self, redis_connector, redis_scheme):
         self._current_user = None
         self._current_role_id = None
         self._current_token = None
         self._redis = redis_connector
         self._redis_scheme = redis_scheme
-        self.__inited = False
+        self._inited = False
+
+    @classmethod
+    def set_cache(cls, cache: LRUCache or None):
+        """
+        Sets process-local cache of resolved users (results of `resolve`) during M2Core initialization
+        """
+        cls._cache = cache
+
+    @classmethod
+    def cache(cls) -> LRUCache or None:
+        """
+        Returns process-local cache of resolved users, `None` if caching is disabled
+        """
+        return cls._cache
+
+    @classmethod
+    def apply_invalidation(cls, message: str):
+        """
+        Drops entries from process-local cache according to invalidation message, which is published to
+        `options.session_cache_channel` by any process in case of user's session or permissions change:
+            `token:<access token>` - drop single token
+            `user:<user id>` - drop all tokens of user
+            `all` - drop everything
+        """
+        cache = cls._cache
+        if cache is None:
+            return
+        kind, _, value = message.partition(':')
+        if kind == 'token':
+            cache.pop(value)
+        elif kind == 'user':
+            cache.pop_matching(lambda user: str(user['id']) == value)
+        else:
+            cache.clear()
+
+    @staticmethod
+    def _new_token() -> str:
+        """
+        Generates new random access token
+        """
+        return '%s_%s' % (DataHelper.random_hex_str(8), DataHelper.random_hex_str(32))
+
+    def _token_key(self, token: str) -> str:
+        return self._redis_scheme['ACCESS_TOKENS_BY_HASH']['prefix'] % token
+
+    def _user_roles_key(self, user_id: int) -> str:
+        return self._redis_scheme['USER_ROLES']['prefix'] % user_id
+
+    def _role_permissions_key(self, role_id: int) -> str:
+        return self._redis_scheme['ROLE_PERMISSIONS']['prefix'] % role_id
+
+    def _set_user(self, redis_val, _access_token: str):
+        """
+        Inits current instance with user id taken from Redis and user's access token
+        """
+        self._current_user = int(redis_val) if redis_val else None
+        self._current_token = _access_token
+        self._inited = True
+
+    def _from_cache(self, _access_token: str) -> dict or None:
+        """
+        Inits current instance with cached user's data, returns `None` if user isn't cached
+        """
+        cache = SessionHelper._cache
+        if cache is None:
+            return None
+        cached_user = cache.get(_access_token)
+        if cached_user is None:
+            return None
+        self._set_user(cached_user['id'], _access_token)
+        # copy, so handler can't spoil cached dict
+        return dict(cached_user)
+
+    def _to_cache(self, permissions) -> dict:
+        """
+        Makes user's data dict from current instance and puts it in cache
+        """
+        user = {
+            'id': self.get_user_id(),
+            'access_token': self.get_token(),
+            'permissions': frozenset(permissions)
+        }
+        # only existing users are cached - tokens are random, so nobody asks for unknown token twice
+        cache = SessionHelper._cache
+        if cache is not None and user['id'] is not None:
+            cache.set(user['access_token'], user)
+            return dict(user)
+        return user
+
+    def _invalidate(self, message: str):
+        """
+        Invalidates cached users in current process and publishes invalidation message to other processes
+        """
+        SessionHelper.apply_invalidation(message)
+        if options.session_cache_size > 0:
+            self._redis.publish(options.session_cache_channel, message)
 
     def get_user_id(self) -> None or int:
         """
@@ -40,7 +168,7 @@ class SessionHelper:
         :return: 
         """
         # generate token
-        token = '%s_%s' % (DataHelper.random_hex_str(8), DataHelper.random_hex_str(32))
+        token = self._new_token()
         # store in Redis in access tokens table, and also store it in user's access tokens table
         self._redis.set(
             self._redis_scheme['ACCESS_TOKENS_BY_HASH']['prefix'] % token,
@@ -50,7 +178,7 @@ class SessionHelper:
 
         self._current_token = token
         self._current_user = user_id
-        self.__inited = True
+        self._inited = True
 
         return {
             'access_token': token,
@@ -66,14 +194,15 @@ class SessionHelper:
 
         old_token = self._current_token
         # generate new
-        token = '%s_%s' % (DataHelper.random_hex_str(8), DataHelper.random_hex_str(32))
+        token = self._new_token()
         # store in Redis in access tokens table, and also store it in user's access tokens table
         self._redis.set(
             self._redis_scheme['ACCESS_TOKENS_BY_HASH']['prefix'] % token,
             self.get_user_id(),
             ex=self._redis_scheme['ACCESS_TOKENS_BY_HASH']['ttl'],
         )
-        self.__delete_token(old_token)
+        self._delete_token(old_token)
+        self._invalidate('token:%s' % old_token)
 
         return {
             'access_token': token,
@@ -87,9 +216,10 @@ class SessionHelper:
         """
         self._check_inited()
 
-        self.__delete_token(self._current_token)
+        self._delete_token(self._current_token)
+        self._invalidate('token:%s' % self._current_token)
 
-    def __delete_token(self, token: str):
+    def _delete_token(self, token: str):
         """
         Deletes access token from 2 Redis tables
         :param token: access token to delete
@@ -101,27 +231,37 @@ class SessionHelper:
 
     def dump_role_permissions(self, role_id, permissions):
         """
-        Stores (rewrites) role permissions in Redis
+        Stores (rewrites) role permissions in Redis. Set is replaced by DEL + SADD inside of MULTI, so it costs one
+        round trip for any number of permissions and readers see either old or new set
         """
-        # get existing permissions
-        existing_permissions = self._redis.smembers(self._redis_scheme['ROLE_PERMISSIONS']['prefix'] % role_id)
-        for permission in permissions:
-            if permission not in existing_permissions:
-                self._redis.sadd(self._redis_scheme['ROLE_PERMISSIONS']['prefix'] % role_id, permission)
+        self.dump_roles_permissions({role_id: permissions})
 
-        for permission in existing_permissions:
-            if permission not in permissions:
-                self._redis.srem(self._redis_scheme['ROLE_PERMISSIONS']['prefix'] % role_id, permission)
+    def dump_roles_permissions(self, role_permissions: dict):
+        """
+        Stores (rewrites) permissions of many roles in Redis with one transactional pipeline, so readers never see
+        half-written sets
+        :param role_permissions: mapping role id -> list of permission system names
+        """
+        pipe = self._redis.pipeline(transaction=True)
+        for role_id, permissions in role_permissions.items():
+            key = self._role_permissions_key(role_id)
+            pipe.delete(key)
+            if permissions:
+                pipe.sadd(key, *permissions)
+        pipe.execute()
+        self._invalidate('all')
 
     def dump_user_roles(self, user_id: int, role_ids: list):
         """
         Stores (rewrites) user roles list in Redis
         """
-        # delete all existing roles
-        self._redis.delete(self._redis_scheme['USER_ROLES']['prefix'] % user_id)
-        # and add new ones
+        # delete all existing roles and add new ones atomically, so user never resolves without roles
+        pipe = self._redis.pipeline(transaction=True)
+        pipe.delete(self._user_roles_key(user_id))
         if len(role_ids):
-            self._redis.sadd(self._redis_scheme['USER_ROLES']['prefix'] % user_id, *role_ids)
+            pipe.sadd(self._user_roles_key(user_id), *role_ids)
+        pipe.execute()
+        self._invalidate('user:%s' % user_id)
 
     def get_user_permissions(self):
         """
@@ -134,23 +274,122 @@ class SessionHelper:
             self._redis_scheme['USER_ROLES']['prefix'] % self._current_user
         )
         group_ids = [int(role_id) for role_id in redis_val]
-        all_permissions = set()
+        permission_names = set()
         for group_id in group_ids:
             # get permissions per each role by role id
-            permissions = self._redis.smembers(
+            permission_names |= self._redis.smembers(
                 self._redis_scheme['ROLE_PERMISSIONS']['prefix'] % group_id
             )
-            for p_name in permissions:
-                p = M2Permission.load_by_params(system_name=p_name)
-                if p:
-                    all_permissions.add(p)
-        return all_permissions
+        return self._load_permissions(permission_names)
+
+    @staticmethod
+    def _load_permissions(permission_names) -> set:
+        """
+        Converts permission system names, taken from Redis, to permissions via `M2Permission.index`, so DB is not
+        queried here. Unknown names are skipped
+        :param permission_names: iterable of permission system names
+        """
+        index = M2Permission.index()
+        return {index[p_name] for p_name in permission_names if p_name in index}
+
+    def _token_ttl_arg(self) -> int or None:
+        """
+        Returns TTL which should be set to access token on check or `None` if it shouldn't be refreshed
+        """
+        if options.access_token_update_on_check:
+            return self._redis_scheme['ACCESS_TOKENS_BY_HASH']['ttl']
+        return None
+
+    def resolve(self, _access_token: str, resolver: str=None) -> dict:
+        """
+        Inits current instance with user access token and returns user's data with all his permissions, the same
+        as `init_user` + `get_user_permissions` do, but with selected strategy of talking to Redis:
+            `sequential` - one request per each key (2 + number of user roles round trips)
+            `batched` - token check with TTL refresh (one pipeline), user roles and union of all roles
+                        permissions are taken with 3 round trips not depending on number of roles, each step
+                        needs result of previous one, so they can't be pipelined together
+            `script` - everything is done with single Lua script call (1 round trip)
+        :param _access_token: user's access token
+        :param resolver: one of `SessionHelper.RESOLVERS`, `options.session_resolver` by default
+        :return: dict with `id`, `access_token` and `permissions` keys
+        """
+        cached_user = self._from_cache(_access_token)
+        if cached_user is not None:
+            return cached_user
+
+        resolver = resolver or options.session_resolver
+        if resolver not in SessionHelper.RESOLVERS:
+            raise AttributeError('Unknown session resolver `%s`, use one of: %s' %
+                                 (resolver, ', '.join(SessionHelper.RESOLVERS)))
+        with phase('redis'):
+            if resolver == 'sequential':
+                self.init_user(_access_token)
+                permissions = self.get_user_permissions()
+            elif resolver == 'batched':
+                permissions = self._resolve_batched(_access_token)
+            else:
+                permissions = self._resolve_scripted(_access_token)
+
+        return self._to_cache(permissions)
+
+    def _resolve_batched(self, _access_token: str) -> set:
+        """
+        Resolves user and permission names with 3 round trips: GET and EXPIRE of token in one pipeline, SMEMBERS of
+        user roles and SUNION of roles permissions
+        """
+        token_key = self._redis_scheme['ACCESS_TOKENS_BY_HASH']['prefix'] % _access_token
+        ttl = self._token_ttl_arg()
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.get(token_key)
+        if ttl is not None:
+            pipe.expire(token_key, ttl)
+        self._set_user(pipe.execute()[0], _access_token)
+        if self._current_user is None:
+            return set()
+
+        role_ids = self._redis.smembers(self._redis_scheme['USER_ROLES']['prefix'] % self._current_user)
+        if not role_ids:
+            return set()
+        permission_names = self._redis.sunion(
+            *[self._redis_scheme['ROLE_PERMISSIONS']['prefix'] % int(role_id) for role_id in role_ids]
+        )
+        return self._load_permissions(permission_names)
+
+    def _resolve_scripted(self, _access_token: str) -> set:
+        """
+        Resolves user and permission names with single Lua script call
+        """
+        ttl = self._token_ttl_arg()
+        result = self._resolve_script()(
+            keys=[self._redis_scheme['ACCESS_TOKENS_BY_HASH']['prefix'] % _access_token],
+            args=[
+                ttl if ttl is not None else '',
+                self._redis_scheme['USER_ROLES']['prefix'],
+                self._redis_scheme['ROLE_PERMISSIONS']['prefix'],
+            ],
+            client=self._redis
+        )
+
+        self._set_user(result[0] if result else None, _access_token)
+        return self._load_permissions(set(result[1:]))
+
+    def _resolve_script(self):
+        """
+        Returns `RESOLVE_USER_SCRIPT` registered in client of the first caller. `Script` object is reused by all
+        instances of helper class (sync and async clients have different ones), so it's registered once per process
+        and loaded to server by the first call only. Call it with `client=self._redis`
+        """
+        cls = type(self)
+        script = cls.__dict__.get('_script')
+        if script is None:
+            script = cls._script = self._redis.register_script(RESOLVE_USER_SCRIPT)
+        return script
 
     def _check_inited(self):
         """
         Check if instance was inited with user's data or not
         """
-        if not self.__inited:
+        if not self._inited:
             raise Exception('Session is not inited')
 
     def init_user(self, _access_token: str):
@@ -166,6 +405,173 @@ class SessionHelper:
             self._redis.expire(self._redis_scheme['ACCESS_TOKENS_BY_HASH']['prefix'] % _access_token,
                                self._redis_scheme['ACCESS_TOKENS_BY_HASH']['ttl'])
 
-        self._current_user = int(redis_val) if redis_val else None
-        self._current_token = _access_token
-        self.__inited = True
+        self._set_user(redis_val, _access_token)
+
+
+class AsyncSessionHelper(SessionHelper):
+    """
+    The same as `SessionHelper`, but works with `redis.asyncio` client, so all methods which talk to Redis are
+    coroutines and don't block IOLoop:
+
+        session = AsyncSessionHelper(redis_connector, redis_scheme)
+        user = await session.resolve(access_token)
+    """
+    async def generate_token(self, user_id: int) -> dict:
+        """
+        Generates token per specified user, stores it in Redis and returns generated token with expiration info
+        """
+        token = self._new_token()
+        await self._redis.set(self._token_key(token), user_id,
+                              ex=self._redis_scheme['ACCESS_TOKENS_BY_HASH']['ttl'])
+        self._set_user(user_id, token)
+
+        return {
+            'access_token': token,
+            'expire': self._redis_scheme['ACCESS_TOKENS_BY_HASH']['ttl']
+        }
+
+    async def update_token(self) -> dict:
+        """
+        Updates token - delete old one, generates new and stores it in Redis
+        """
+        self._check_inited()
+
+        old_token = self._current_token
+        token = self._new_token()
+        await self._redis.set(self._token_key(token), self.get_user_id(),
+                              ex=self._redis_scheme['ACCESS_TOKENS_BY_HASH']['ttl'])
+        await self._delete_token(old_token)
+        await self._invalidate('token:%s' % old_token)
+
+        return {
+            'access_token': token,
+            'expire': await self._redis.ttl(self._token_key(token)),
+            'user_id': self.get_user_id()
+        }
+
+    async def logout(self):
+        """
+        Logouts user by it's access token (other access tokens are still valid)
+        """
+        self._check_inited()
+
+        await self._delete_token(self._current_token)
+        await self._invalidate('token:%s' % self._current_token)
+
+    async def _delete_token(self, token: str):
+        self._check_inited()
+
+        await self._redis.delete(self._token_key(token))
+
+    async def _invalidate(self, message: str):
+        SessionHelper.apply_invalidation(message)
+        if options.session_cache_size > 0:
+            await self._redis.publish(options.session_cache_channel, message)
+
+    async def dump_role_permissions(self, role_id, permissions):
+        """
+        Stores (rewrites) role permissions in Redis with one transactional pipeline
+        """
+        await self.dump_roles_permissions({role_id: permissions})
+
+    async def dump_roles_permissions(self, role_permissions: dict):
+        """
+        Stores (rewrites) permissions of many roles in Redis with one transactional pipeline
+        """
+        pipe = self._redis.pipeline(transaction=True)
+        for role_id, permissions in role_permissions.items():
+            key = self._role_permissions_key(role_id)
+            pipe.delete(key)
+            if permissions:
+                pipe.sadd(key, *permissions)
+        await pipe.execute()
+        await self._invalidate('all')
+
+    async def dump_user_roles(self, user_id: int, role_ids: list):
+        """
+        Stores (rewrites) user roles list in Redis
+        """
+        pipe = self._redis.pipeline(transaction=True)
+        pipe.delete(self._user_roles_key(user_id))
+        if len(role_ids):
+            pipe.sadd(self._user_roles_key(user_id), *role_ids)
+        await pipe.execute()
+        await self._invalidate('user:%s' % user_id)
+
+    async def get_user_permissions(self):
+        """
+        Returns all user permissions based on it's roles
+        """
+        self._check_inited()
+
+        role_ids = await self._redis.smembers(self._user_roles_key(self._current_user))
+        permission_names = set()
+        for role_id in role_ids:
+            permission_names |= await self._redis.smembers(self._role_permissions_key(int(role_id)))
+        return self._load_permissions(permission_names)
+
+    async def init_user(self, _access_token: str):
+        """
+        Init current instance with user access token
+        """
+        redis_val = await self._redis.get(self._token_key(_access_token))
+        if options.access_token_update_on_check:
+            await self._redis.expire(self._token_key(_access_token),
+                                     self._redis_scheme['ACCESS_TOKENS_BY_HASH']['ttl'])
+        self._set_user(redis_val, _access_token)
+
+    async def resolve(self, _access_token: str, resolver: str=None) -> dict:
+        """
+        Coroutine version of `SessionHelper.resolve`
+        """
+        cached_user = self._from_cache(_access_token)
+        if cached_user is not None:
+            return cached_user
+
+        resolver = resolver or options.session_resolver
+        if resolver not in SessionHelper.RESOLVERS:
+            raise AttributeError('Unknown session resolver `%s`, use one of: %s' %
+                                 (resolver, ', '.join(SessionHelper.RESOLVERS)))
+        with phase('redis'):
+            if resolver == 'sequential':
+                await self.init_user(_access_token)
+                permissions = await self.get_user_permissions()
+            elif resolver == 'batched':
+                permissions = await self._resolve_batched(_access_token)
+            else:
+                permissions = await self._resolve_scripted(_access_token)
+
+        return self._to_cache(permissions)
+
+    async def _resolve_batched(self, _access_token: str) -> set:
+        token_key = self._token_key(_access_token)
+        ttl = self._token_ttl_arg()
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.get(token_key)
+        if ttl is not None:
+            pipe.expire(token_key, ttl)
+        self._set_user((await pipe.execute())[0], _access_token)
+        if self._current_user is None:
+            return set()
+
+        role_ids = await self._redis.smembers(self._user_roles_key(self._current_user))
+        if not role_ids:
+            return set()
+        permission_names = await self._redis.sunion(
+            *[self._role_permissions_key(int(role_id)) for role_id in role_ids]
+        )
+        return self._load_permissions(permission_names)
+
+    async def _resolve_scripted(self, _access_token: str) -> set:
+        ttl = self._token_ttl_arg()
+        result = await self._resolve_script()(
+            keys=[self._token_key(_access_token)],
+            args=[
+                ttl if ttl is not None else '',
+                self._redis_scheme['USER_ROLES']['prefix'],
+                self._redis_scheme['ROLE_PERMISSIONS']['prefix'],
+            ],
+            client=self._redis
+        )
+        self._set_user(result[0] if result else None, _access_token)
+        return self._load_permissions(set(result[1:]))
@@ -2,12 +2,13 @@ from unittest.mock import patch
 from m2core.utils.session_helper import SessionHelper
 from m2core.utils.data_helper import DataHelper
 from m2core import M2Core
-from contextlib import ContextDecorator
+from contextlib import ContextDecorator, contextmanager
 from tornado import httpclient
 from tornado.escape import json_decode
 from tornado.httputil import HTTPHeaders
 from tornado.testing import AsyncHTTPTestCase
 from m2core.common.options import options
+from m2core.utils.instrumentation import Instrumentation
 import json
 import logging
 
@@ -142,6 +143,9 @@ class M2CoreAsyncHTTPTestCase(AsyncHTTPTestCase):
         ssl_options=None
 
     """
+    # fail test if request executes the same SQL statement more than `options.sql_repeat_threshold` times
+    fail_on_repeated_queries = True
+
     def init_m2core(self):
         raise NotImplemented('You must implement method which returns M2Core instance')
 
@@ -150,6 +154,62 @@ class M2CoreAsyncHTTPTestCase(AsyncHTTPTestCase):
         options.debug = False
         return self.m2core.run_for_test()
 
+    def setUp(self):
+        # records of finished requests, see `Instrumentation`
+        self.finished_requests = list()
+        Instrumentation.subscribe(self.finished_requests.append)
+        super(M2CoreAsyncHTTPTestCase, self).setUp()
+
+    def tearDown(self):
+        Instrumentation.unsubscribe(self.finished_requests.append)
+        super(M2CoreAsyncHTTPTestCase, self).tearDown()
+
+    def fetch(self, path: str, raise_error: bool=False, **kwargs):
+        """
+        Fetches `path` and fails test if request executed the same SQL statement more than
+        `options.sql_repeat_threshold` times (N+1 queries), unless `fail_on_repeated_queries` is disabled
+        """
+        first = len(self.finished_requests)
+        response = super(M2CoreAsyncHTTPTestCase, self).fetch(path, raise_error=raise_error, **kwargs)
+        if self.fail_on_repeated_queries and options.sql_repeat_threshold:
+            for record in self.finished_requests[first:]:
+                repeated = {statement: count for statement, count in record['queries'].items()
+                            if count > options.sql_repeat_threshold}
+                if repeated:
+                    self.fail('%s %s executed the same SQL statement too many times (N+1 queries?):\n%s' % (
+                        record['method'], record['route'], _format_queries(repeated)))
+        return response
+
+    @contextmanager
+    def assertQueries(self, max_queries: int=None, max_repeats: int=None):
+        """
+        Asserts SQL query budget of every request finished inside of block. Requires `options.instrumentation`:
+
+            with self.assertQueries(max_queries=2, max_repeats=1) as requests:
+                self.fetch_json('/users/1')
+            self.assertEqual(1, len(requests))
+
+        :param max_queries: maximal number of SQL statements executed by request
+        :param max_repeats: maximal number of executions of the same statement by request
+        """
+        if not options.instrumentation:
+            raise AssertionError('SQL queries are counted only with `options.instrumentation` enabled')
+        first = len(self.finished_requests)
+        requests = list()
+        yield requests
+        requests.extend(self.finished_requests[first:])
+        for record in requests:
+            queries = record['queries']
+            total = sum(queries.values())
+            if max_queries is not None and total > max_queries:
+                self.fail('%s %s executed %s SQL statements, budget is %s:\n%s' % (
+                    record['method'], record['route'], total, max_queries, _format_queries(queries)))
+            if max_repeats is not None:
+                repeated = {statement: count for statement, count in queries.items() if count > max_repeats}
+                if repeated:
+                    self.fail('%s %s executed the same SQL statement more than %s times:\n%s' % (
+                        record['method'], record['route'], max_repeats, _format_queries(repeated)))
+
     def fetch_bytes(self, url: str, method: str= 'GET', expected_codes=None, data=None, user_permissions=None,
                     **kwargs) -> bytes:
         """
@@ -247,3 +307,8 @@ class M2CoreAsyncHTTPTestCase(AsyncHTTPTestCase):
         #                      headers={'user-agent': 'DeliveryBoy Unittests'})
         #
         # id = json_decode(data.content)['data']['id']
+
+
+def _format_queries(queries: dict) -> str:
+    return '\n'.join('%5s x %s' % (count, statement) for statement, count in
+                      sorted(queries.items(), key=lambda item: -item[1]))
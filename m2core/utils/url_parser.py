@@ -1,6 +1,6 @@
 import re
 from voluptuous import Schema, Required, Coerce, Boolean, Length, All, Range, In
-from voluptuous.error import Error
+from voluptuous.error import Error, Invalid, MultipleInvalid, CoerceInvalid, BooleanInvalid
 from m2core.utils.voluptuous_checkers import NotNone
 
 
@@ -109,6 +109,44 @@ class UrlParserAttr:
         if self._attr_type == 'string':
             return self._string_validator()
 
+    def fast_validator(self):
+        """
+        Generates plain Python validator for current attribute if it has simple rule (type without params). It accepts
+        value and error path, returns coerced value and raises the same errors with the same messages as `validator`
+        does, but without `voluptuous` overhead. For rules with params returns `None`
+        """
+        if self._len_limit is not None or self._second_param is not None:
+            return None
+
+        not_none_msg = '<%s> should be not None' % self._attr_name
+
+        if self._attr_type == 'bool':
+            def validate(value, path: list):
+                if value is None or (type(value) == str and value == ''):
+                    raise Error(not_none_msg)
+                if isinstance(value, str):
+                    lowered = value.lower()
+                    if lowered in ('1', 'true', 'yes', 'on', 'enable'):
+                        return True
+                    if lowered in ('0', 'false', 'no', 'off', 'disable'):
+                        return False
+                    raise BooleanInvalid('expected boolean', path)
+                return bool(value)
+            return validate
+
+        coerce_type = UrlParserAttr.ATTR_TYPES[self._attr_type]
+        coerce_msg = '<%s> should be of [%s] type' % \
+                     (self._attr_name, 'str' if self._attr_type == 'string' else self._attr_type)
+
+        def validate(value, path: list):
+            if value is None or (type(value) == str and value == ''):
+                raise Error(not_none_msg)
+            try:
+                return coerce_type(value)
+            except (ValueError, TypeError):
+                raise CoerceInvalid(coerce_msg, path)
+        return validate
+
     def replacement(self):
         """
         Generates replacement to make final url path for Tornado
@@ -333,6 +371,9 @@ class UrlParser:
         self.original_url = url
         self.url_attributes = []
         self._full_match = ''
+        # voluptuous schema and validation function are built on first use, see `validator_schema` and `validate`
+        self._schema = None
+        self._validate = None
         self.__parse()
 
     def __parse(self):
@@ -356,10 +397,58 @@ class UrlParser:
         return result
 
     def validator_schema(self):
-        result = dict()
+        """
+        Returns `voluptuous` schema of all url attributes, it's built once per route
+        """
+        schema = self._schema
+        if schema is None:
+            result = dict()
+            for attr in self.url_attributes:
+                result.update(attr['instance'].validator())
+            schema = self._schema = Schema(result)
+        return schema
+
+    def validate(self, params: dict) -> dict:
+        """
+        Validates parsed url params and returns coerced ones. If all attributes have simple rules - plain Python
+        validators are used, otherwise (or if params have missing or extra keys) - `validator_schema`. Errors are the
+        same in both cases
+        :param params: parsed url params
+        """
+        validate = self._validate
+        if validate is None:
+            validate = self._validate = self._compile_validator()
+        return validate(params)
+
+    def _compile_validator(self):
+        """
+        Builds validation function for `validate`
+        """
+        validators = dict()
         for attr in self.url_attributes:
-            result.update(attr['instance'].validator())
-        return Schema(result)
+            fast_validator = attr['instance'].fast_validator()
+            if fast_validator is None:
+                return self.validator_schema()
+            validators[attr['instance'].name()] = fast_validator
+        schema = self.validator_schema()
+        keys = validators.keys()
+
+        def validate(params: dict) -> dict:
+            if type(params) is not dict or params.keys() != keys:
+                # schema reports missing and extra keys
+                return schema(params)
+            result = dict()
+            errors = []
+            for key, value in params.items():
+                try:
+                    result[key] = validators[key](value, [key])
+                except Invalid as e:
+                    e.error_type = 'dictionary value'
+                    errors.append(e)
+            if errors:
+                raise MultipleInvalid(errors)
+            return result
+        return validate
 
     def __repr__(self):
         return self.original_url
@@ -0,0 +1,144 @@
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from tornado.ioloop import IOLoop
+from m2core.bases.base_handler import BaseHandler
+
+
+logger = logging.getLogger(__name__)
+
+# functions of SQLAlchemy dialects, which send statement to DB (it's their `statement` argument)
+_SQL_FUNCTIONS = frozenset(('do_execute', 'do_executemany', 'do_execute_no_params'))
+
+
+class BlockingWatchdog:
+    """
+    Detects IOLoop blocked longer than `threshold` seconds, i.e. by blocking DB queries of `DataMixin` or Redis
+    requests of `SessionHelper` in handlers. IOLoop updates heartbeat every `threshold / 4` seconds, background
+    thread checks it and, when it's late, captures stack of IOLoop thread with human route of handler, SQL statement
+    and Redis command found in it. Nothing is done in IOLoop besides heartbeat, so it's cheap enough for production.
+
+    Reports of the same place (route and the innermost frame) are logged and put to ring buffer not more often than
+    once per `report_interval` seconds, the rest of them are only counted in the last report
+    """
+    def __init__(self, threshold: float=0.1, buffer_size: int=100, report_interval: float=60):
+        """
+        Constructor
+        :param threshold: IOLoop blocked for longer time is reported (sec)
+        :param buffer_size: number of the last reports kept in `reports`
+        :param report_interval: minimal interval between reports of the same place (sec)
+        """
+        self.threshold = threshold
+        self.interval = threshold / 4
+        self.report_interval = report_interval
+        self._reports = deque(maxlen=buffer_size)
+        # place -> (time of the last report, report)
+        self._reported = dict()
+        self._beat = time.monotonic()
+        self._current = None
+        self._io_loop = None
+        self._loop_thread_id = None
+        self._handle = None
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def start(self):
+        """
+        Starts heartbeat in current IOLoop and watchdog thread
+        """
+        self._io_loop = IOLoop.current()
+        self._loop_thread_id = threading.get_ident()
+        self._stopped.clear()
+        self._heartbeat()
+        self._thread = threading.Thread(target=self._watch, name='m2core-watchdog', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._handle is not None:
+            self._io_loop.remove_timeout(self._handle)
+            self._handle = None
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _heartbeat(self):
+        self._beat = time.monotonic()
+        self._handle = self._io_loop.call_later(self.interval, self._heartbeat)
+
+    def _watch(self):
+        while not self._stopped.wait(self.interval):
+            blocked = time.monotonic() - self._beat - self.interval
+            if blocked > self.threshold:
+                if self._current is None:
+                    self._current = self._report(blocked)
+                elif self._current is not False:
+                    self._current['blocked'] = blocked
+            elif self._current is not None:
+                # IOLoop is alive again
+                self._current = None
+
+    def _report(self, blocked: float) -> dict or bool:
+        """
+        Captures stack of IOLoop thread and stores report, unless the same place was reported recently. Returns
+        report or `False` if it's suppressed
+        """
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return False
+        report = inspect_stack(frame)
+        place = (report['route'], report['stack'][-1] if report['stack'] else None)
+        now = time.monotonic()
+        last = self._reported.get(place)
+        if last is not None and now - last[0] < self.report_interval:
+            last[1]['suppressed'] += 1
+            return False
+
+        report.update({'time': time.time(), 'blocked': blocked, 'suppressed': 0})
+        if len(self._reported) >= 1000:
+            self._reported = {k: v for k, v in self._reported.items() if now - v[0] < self.report_interval}
+        self._reported[place] = (now, report)
+        self._reports.append(report)
+        logger.warning('IOLoop is blocked for %.3f sec in %s (SQL: %s, Redis: %s)\n%s', blocked,
+                       report['route'] or 'no handler', report['sql'], report['redis'], ''.join(report['stack']))
+        return report
+
+    def reports(self) -> list:
+        """
+        Returns the last reports: dicts with `time` of detection, `blocked` (sec, updated until IOLoop is released),
+        `route`, `sql`, `redis`, `stack` (formatted frames, the innermost is the last) and number of `suppressed`
+        reports of the same place since it
+        """
+        return list(self._reports)
+
+
+def inspect_stack(frame) -> dict:
+    """
+    Formats stack from `frame` and finds human route of handler, SQL statement and Redis command in it
+    """
+    route = sql = command = None
+    for f, lineno in traceback.walk_stack(frame):
+        name = f.f_code.co_name
+        try:
+            f_locals = f.f_locals
+        except Exception:
+            continue
+        if route is None and isinstance(f_locals.get('self'), BaseHandler):
+            route = f_locals['self'].human_route
+        if sql is None and name in _SQL_FUNCTIONS and isinstance(f_locals.get('statement'), str):
+            sql = f_locals['statement']
+        if command is None and f.f_globals.get('__name__', '').startswith('redis.'):
+            if name == 'execute_command' and f_locals.get('args'):
+                # only name of command, keys could contain access tokens
+                command = str(f_locals['args'][0])
+            elif name == 'execute' and hasattr(f_locals.get('self'), 'command_stack'):
+                command = 'PIPELINE of %s commands' % len(f_locals['self'].command_stack)
+    return {
+        'route': route,
+        'sql': sql,
+        'redis': command,
+        'stack': traceback.format_list(traceback.extract_stack(frame)),
+    }